@@ -3,7 +3,8 @@ Annalist application hooks
 (cf. https://docs.djangoproject.com/en/dev/ref/applications/)
 
 The main purpose of this is to log settings values to the loig file, 
-after the log file configuration has been applied.
+after the log file configuration has been applied.  Field renderers are 
+also prepared here, so that the first request does not wait for them.
 """
 
 __author__      = "Graham Klyne (GK@ACM.ORG)"
@@ -31,6 +32,9 @@ class AnnalistConfig(AppConfig):
         log.info("DB PATH:          "+settings.DATABASES['default']['NAME'])
         log.info("ALLOWED_HOSTS:    "+",".join(settings.ALLOWED_HOSTS))
         log.info("LOGGING_FILE:     "+settings.LOGGING_FILE)
+        # Compile field renderer templates before the first request is handled
+        from annalist.views.fields.render_utils import warm_up_renderers
+        warm_up_renderers()
         return
 
 # End.
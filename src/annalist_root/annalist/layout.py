@@ -71,6 +71,9 @@ SITE_COLL_VIEW          = "c/%(id)s/"
 SITE_COLL_PATH          = "c/%(id)s"
 COLL_META_FILE          = "_annalist_collection/coll_meta.jsonld"
 COLL_PROV_FILE          = "_annalist_collection/coll_prov.jsonld"
+COLL_INDEX_FILE         = "_annalist_collection/entity_index.sqlite3"
+COLL_LOCK_FILE          = "_annalist_collection/entity_update.lock"
+COLL_RENAME_JOURNAL     = "_annalist_collection/type_rename.journal"
 META_COLL_REF           = "../"
 
 COLL_TYPE_VIEW          = "d/_type/%(id)s/"
@@ -131,6 +134,7 @@ TYPEDATA_ENTITY_VIEW    = "%(id)s/"
 TYPEDATA_ENTITY_PATH    = "%(id)s"
 ENTITY_DATA_FILE        = "entity-data.jsonld"
 ENTITY_PROV_FILE        = "entity-prov.jsonld"
+ENTITY_ID_COUNTER_FILE  = ".last_entity_id"
 DATA_ENTITY_REF         = "./"
 
 # and more...
@@ -110,5 +110,9 @@ INVALID_TYPE_RENAME         = "Renaming of Annalist built-in types is not suppor
 CREATE_ENTITY_FAILED        = "Problem creating/updating entity %s/%s (see log for more info)"
 RENAME_ENTITY_FAILED        = "Problem renaming entity %s/%s to %s/%s (see log for more info)"
 RENAME_TYPE_FAILED          = "Problem renaming type %s to %s (see log for more info)"
+RENAME_TYPE_INCOMPLETE      = "Type %s not completely renamed to %s"
+RENAME_TYPE_ENTITIES_EXIST  = "Entities of type %s already exist with ids %s: the corresponding entities of type %s have not been moved"
+ENTITY_CHANGED              = "Entity changed by another user"
+ENTITY_UPDATE_CONFLICT      = "Entity %s/%s has been updated or removed since it was displayed for editing: save again to replace those changes with the values shown, or cancel and re-open the entity to see them"
 
 # End.
@@ -11,6 +11,9 @@ A user is represented in a collectionm by:
 
 The ID and URI must be matched by the authenticated issuer of an HTTP request for the
 permissionms to be applied.  Other fields are cosmetic.
+
+User permissions determined for a request are held in a process-wide cache, which is
+cleared whenever a user record is saved or removed by the current process.
 """
 
 __author__      = "Graham Klyne (GK@ACM.ORG)"
@@ -21,6 +24,7 @@ import os
 import os.path
 import urlparse
 import shutil
+import threading
 
 import logging
 log = logging.getLogger(__name__)
@@ -33,6 +37,7 @@ from annalist.identifiers       import ANNAL
 from annalist                   import util
 from annalist.models.entity     import Entity
 from annalist.models.entitydata import EntityData
+from annalist.models.entitycache import file_status
 
 class AnnalistUser(EntityData):
 
@@ -61,4 +66,110 @@ class AnnalistUser(EntityData):
         log.debug("AnnalistUser %s: uri %s, alt %s"%(type_id, self._entityurl, self._entityalturi))
         return
 
+    def _save(self):
+        """
+        Save user record, and discard any cached user permissions.
+        """
+        super(AnnalistUser, self)._save()
+        user_permissions_cache.clear()
+        return
+
+    @classmethod
+    def remove(cls, parent, entityid, use_altpath=False):
+        """
+        Remove user record, and discard any cached user permissions.
+        """
+        err = super(AnnalistUser, cls).remove(parent, entityid, use_altpath=use_altpath)
+        user_permissions_cache.clear()
+        return err
+
+#   -------------------------------------------------------------------------------------------
+#
+#   User permissions cache
+#
+#   -------------------------------------------------------------------------------------------
+
+def user_file_dependencies(site, collection, user_ids):
+    """
+    Returns a list of (path, status) pairs for the files from which permissions
+    for any of the indicated user ids may be read, in the indicated collection 
+    (if any) or site-wide.  This should be called before the user records are read.
+    """
+    deps = []
+    for user_id in user_ids:
+        users = [AnnalistUser(site, user_id, use_altpath=True)]
+        if collection:
+            users.append(AnnalistUser(collection, user_id, altparent=site))
+        for u in users:
+            for (d, p) in (u._dir_path(), u._alt_dir_path()):
+                if p:
+                    deps.append((p, file_status(p)))
+    return deps
+
+class UserPermissionsCache(object):
+    """
+    Process-wide cache of user permissions records, keyed by collection, user
+    id and user URI.
+
+    Each record is saved with the status of the user record files from which it 
+    was determined, and is discarded if any of these files are created, updated 
+    or removed.  Cached records are shared, and must not be updated.
+    """
+
+    def __init__(self, size):
+        """
+        Initialize a new cache.
+
+        size        is the maximum number of permissions records held in the cache.
+                    Zero disables caching.
+        """
+        self._size   = size
+        self._lock   = threading.Lock()
+        self._perms  = {}
+        return
+
+    def get(self, key):
+        """
+        Returns a permissions record saved for the indicated key, or None.
+        """
+        with self._lock:
+            entry = self._perms.get(key, None)
+        if entry is None:
+            return None
+        (dependencies, user_perms) = entry
+        for (path, status) in dependencies:
+            if file_status(path) != status:
+                with self._lock:
+                    self._perms.pop(key, None)
+                return None
+        return user_perms
+
+    def put(self, key, user_perms, dependencies):
+        """
+        Save a permissions record for the indicated key.
+
+        key         is a (collection directory, user_id, user_uri) tuple.
+        user_perms  is the user permissions record to be saved.
+        dependencies is a list of (path, status) values for the user record files
+                    consulted, from `user_file_dependencies`.
+        """
+        if not self._size:
+            return
+        with self._lock:
+            if len(self._perms) >= self._size:
+                self._perms.clear()
+            self._perms[key] = (dependencies, user_perms)
+        return
+
+    def clear(self):
+        """
+        Discard all saved permissions records.
+        """
+        with self._lock:
+            self._perms.clear()
+        return
+
+#   Cache used for all user permissions determined by this process
+user_permissions_cache = UserPermissionsCache(getattr(settings, "USER_PERMISSIONS_CACHE_SIZE", 1000))
+
 # End.
@@ -19,6 +19,8 @@ import os
 import os.path
 import urlparse
 import shutil
+import json
+import errno
 
 import logging
 log = logging.getLogger(__name__)
@@ -31,10 +33,14 @@ from annalist.identifiers           import RDF, RDFS, ANNAL
 from annalist                       import util
 
 from annalist.models.entity         import Entity
+from annalist.models.entityindex    import EntityIndex
+from annalist.models.entitycache    import entity_value_cache, entity_dir_changes
 from annalist.models.annalistuser   import AnnalistUser
 from annalist.models.recordtype     import RecordType
 from annalist.models.recordview     import RecordView
 from annalist.models.recordlist     import RecordList
+from annalist.models.recordtypedata import RecordTypeData
+from annalist.models.entitydata     import EntityData
 
 class Collection(Entity):
 
@@ -53,7 +59,10 @@ class Collection(Entity):
         coll_id     the collection identifier for the collection
         """
         super(Collection, self).__init__(parentsite, coll_id)
-        self._parentsite = parentsite
+        self._parentsite  = parentsite
+        self._entityindex = EntityIndex(self._entitydir)
+        if os.path.exists(self._type_rename_journal()):
+            self._resume_type_rename()
         return
 
     # Site
@@ -64,6 +73,83 @@ class Collection(Entity):
         """
         return self._parentsite
 
+    # Entity index
+
+    def _child_index(self):
+        """
+        Returns the index of entities stored in the current collection.
+        """
+        return self._entityindex
+
+    def rebuild_index(self):
+        """
+        Discard the collection entity index, so that it is rebuilt from the
+        stored entity files.
+        """
+        self._entityindex.rebuild()
+        return
+
+    def get_generation(self, dirpath=None):
+        """
+        Returns a generation counter that is increased whenever an entity in the 
+        collection, or in the indicated directory of entities (or a directory
+        within it), is created, updated or removed by Annalist (in any process), 
+        or None if the generation cannot be determined.
+
+        dirpath     is a directory containing entities (e.g. as returned by 
+                    `_child_dirs`), or a directory containing such directories,
+                    or None to obtain the generation for the entire collection.
+        """
+        return self._entityindex.get_generation(dirpath)
+
+    def get_metadata_generation(self):
+        """
+        Returns a generation counter that is increased whenever the collection 
+        metadata, or any type, view, list, field, group, user or enumerated value
+        definition in the collection, is changed.
+        """
+        return self.get_generation(self._metadata_dir())
+
+    def _metadata_dir(self):
+        return os.path.join(self._entitydir, os.path.dirname(layout.COLL_META_FILE))
+
+    def entity_update_lock(self, blocking=True):
+        """
+        Returns a context manager that excludes other threads and processes
+        updating entities in the collection using this lock while the body of
+        a `with` statement is executed.  This is used to check that an entity
+        is unchanged before it is updated.  The lock is also taken when any 
+        entity in the collection is saved or removed.
+
+        blocking    is False if the lock is to be taken only if it is immediately 
+                    available (see `util.file_lock`).
+        """
+        lockpath = os.path.join(self._entitydir, layout.COLL_LOCK_FILE)
+        util.ensure_dir(os.path.dirname(lockpath))
+        return util.file_lock(lockpath, blocking=blocking)
+
+    def _entity_update_lock(self):
+        """
+        Returns a context manager that excludes other updates to the collection 
+        metadata while the body of a `with` statement is executed.
+        """
+        return self.entity_update_lock()
+
+    def _child_update_lock(self):
+        """
+        Returns a context manager that excludes other updates to entities in the
+        collection while the body of a `with` statement is executed.
+        """
+        return self.entity_update_lock()
+
+    def _save(self):
+        """
+        Save collection metadata, and note the change in the collection generation.
+        """
+        super(Collection, self)._save()
+        self._entityindex.entities_changed(self._metadata_dir())
+        return
+
     # User permissions
 
     def create_user_permissions(self, user_id, user_uri,
@@ -160,6 +246,149 @@ class Collection(Entity):
         s = RecordType.remove(self, type_id)
         return s
 
+    def rename_type(self, old_type_id, new_type_id):
+        """
+        Complete renaming of a type whose new type description has been saved, 
+        by moving all entities of the old type to the new type, then removing 
+        the old type description.
+
+        The directory containing entities of the old type is renamed in a single
+        operation, then the type id (and the type URI, if changed) recorded in 
+        each entity is updated.  The rename is recorded in a journal file before
+        any changes are made, so that a rename that is interrupted (e.g. by a 
+        system crash) is completed when the collection is next accessed.
+
+        An entity of the old type is not moved if an entity with the same id 
+        already exists for the new type, in which case that entity, and the old
+        type description, are left in place.
+
+        old_type_id     local identifier of the type being renamed.
+        new_type_id     new local identifier for the type.
+
+        Returns a list of ids of entities that are not moved.
+        """
+        old_type = self.get_type(old_type_id)
+        new_type = self.get_type(new_type_id)
+        journal  = (
+            { 'old_type_id':    old_type_id
+            , 'new_type_id':    new_type_id
+            , 'old_type_uri':   old_type and old_type.get(ANNAL.CURIE.uri, None)
+            , 'new_type_uri':   new_type and new_type.get(ANNAL.CURIE.uri, None)
+            })
+        with self.entity_update_lock():
+            util.replace_file(self._type_rename_journal(), 
+                lambda journal_io: json.dump(journal, journal_io),
+                durability="dir"
+                )
+            not_moved = self._complete_type_rename(journal)
+        return not_moved
+
+    def _type_rename_journal(self):
+        return os.path.join(self._entitydir, layout.COLL_RENAME_JOURNAL)
+
+    def _resume_type_rename(self):
+        """
+        Complete an interrupted type rename, unless it has since been completed 
+        by another process.  Errors are logged, and the rename is attempted 
+        again when the collection is next accessed.
+
+        Nothing is done if the collection update lock is held, as the journal
+        is present while a rename is in progress:  an interrupted rename is
+        resumed when the collection is accessed after the lock is released.
+        """
+        journalpath = self._type_rename_journal()
+        try:
+            with self.entity_update_lock(blocking=False) as locked:
+                if not locked:
+                    return
+                try:
+                    with open(journalpath, "r") as f:
+                        journal = json.load(f)
+                except IOError, e:
+                    if e.errno != errno.ENOENT:
+                        raise
+                    return
+                log.warning(
+                    "Collection._resume_type_rename: %s, type %s to %s"%
+                    (self._entityid, journal['old_type_id'], journal['new_type_id'])
+                    )
+                self._complete_type_rename(journal)
+        except (IOError, OSError, ValueError), e:
+            log.error("Collection._resume_type_rename: %s, %s"%(journalpath, e))
+        return
+
+    def _complete_type_rename(self, journal):
+        """
+        Perform the changes for a type rename recorded in the supplied journal, 
+        then remove the journal file.  Changes already made are skipped, so this 
+        can be used to resume an interrupted rename.
+
+        Returns a list of ids of entities that are not moved because an entity
+        with the same id exists for the new type.
+        """
+        old_type_id  = journal['old_type_id']
+        new_type_id  = journal['new_type_id']
+        old_type_uri = journal['old_type_uri']
+        new_type_uri = journal['new_type_uri']
+        new_typedata = RecordTypeData(self, new_type_id)
+        olddir = os.path.normpath(RecordTypeData(self, old_type_id)._entitydir)
+        newdir = os.path.normpath(new_typedata._entitydir)
+        # Move entity directories to new type
+        not_moved = []
+        if os.path.isdir(olddir):
+            if not os.path.exists(newdir):
+                os.rename(olddir, newdir)
+            else:
+                for entity_id in os.listdir(olddir):
+                    if util.valid_id(entity_id):
+                        tgt = os.path.join(newdir, entity_id)
+                        if os.path.exists(tgt):
+                            log.warning(
+                                "Collection._complete_type_rename: %s/%s exists, %s/%s not moved"%
+                                (new_type_id, entity_id, old_type_id, entity_id)
+                                )
+                            not_moved.append(entity_id)
+                            continue
+                        os.rename(os.path.join(olddir, entity_id), tgt)
+                if not not_moved:
+                    util.removetree(olddir)
+        # Update type id and URI in each moved entity, one entity at a time
+        durability = getattr(settings, "ENTITY_WRITE_DURABILITY", "file")
+        for entity_id in (os.listdir(newdir) if os.path.isdir(newdir) else []):
+            if not util.valid_id(entity_id):
+                continue
+            entity    = EntityData(new_typedata, entity_id)
+            (_, body) = entity._dir_path()
+            try:
+                with open(body, "r") as f:
+                    values = json.load(util.strip_comments(f))
+            except (IOError, ValueError), e:
+                log.warning("Collection._complete_type_rename: %s, %s"%(body, e))
+                continue
+            if values.get(ANNAL.CURIE.type_id, None) == new_type_id:
+                continue
+            values[ANNAL.CURIE.type_id] = new_type_id
+            values[ANNAL.CURIE.url]     = entity.get_view_url_path()
+            types = values.get('@type', None)
+            if old_type_uri and new_type_uri and isinstance(types, list):
+                values['@type'] = [ new_type_uri if t == old_type_uri else t for t in types ]
+            util.replace_file(body, 
+                lambda entity_io: json.dump(values, entity_io, indent=2, separators=(',', ': ')),
+                durability=durability
+                )
+        # Moved entities are re-read when next accessed through the index or caches
+        for d in (olddir, newdir):
+            self._entityindex.remove_entity(d)
+            entity_value_cache.invalidate_tree(d)
+            entity_dir_changes.entity_changed(d)
+        if os.path.isdir(newdir):
+            RecordTypeData.create(self, new_type_id, {})
+        # Remove old type description, unless entities of the old type remain
+        if RecordType.exists(self, old_type_id) and not not_moved:
+            self.remove_type(old_type_id)
+        os.remove(self._type_rename_journal())
+        return not_moved
+
     # Record views
 
     def views(self, include_alt=True):
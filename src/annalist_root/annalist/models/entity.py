@@ -26,10 +26,14 @@ log = logging.getLogger(__name__)
 from django.conf                import settings
 
 from annalist                   import util
+from annalist                   import layout
 from annalist.exceptions        import Annalist_Error
 from annalist.identifiers       import ANNAL
 
-from annalist.models.entityroot import EntityRoot
+from annalist.models.entityroot  import EntityRoot, COMPUTED_FIELD_IDS
+from annalist.models.entityindex import entity_matches_terms
+from annalist.models.entitycache import entity_value_cache, entity_dir_changes, entity_dir_cache
+from annalist.models.entityloader import load_concurrently
 
 #   -------------------------------------------------------------------------------------------
 #
@@ -49,7 +53,6 @@ class Entity(EntityRoot):
     _entitypath     = None          # Relative path from parent to entity (template)
     _entityfile     = None          # Relative reference to body file from entity
     _entityref      = None          # Relative reference to entity from body file
-    _last_id        = None          # Last ID allocated
 
     def __init__(self, parent, entityid, altparent=None, idcheck=True, use_altpath=False):
         """
@@ -82,6 +85,7 @@ class Entity(EntityRoot):
             self._entityuseuri = None   # URI not known until entity is created or accessed
             log.debug("Entity.__init__: entity alt URI %s, entity alt dir %s"%(self._entityalturi, self._entityaltdir))
         self._entityid = entityid
+        self._parent   = parent
         log.debug("Entity.__init__: entity_id %s, type_id %s"%(self._entityid, self.get_type_id()))
         return
 
@@ -98,13 +102,46 @@ class Entity(EntityRoot):
 
     @classmethod
     def allocate_new_id(cls, parent):
-        if cls._last_id is None:
-            cls._last_id = 1
-        while True:
-            newid = "%08d"%cls._last_id
-            if not cls.exists(parent, newid):
-                break
-            cls._last_id += 1
+        """
+        Allocates and returns a numeric identifier for a new entity of the given 
+        class belonging to the given parent.
+
+        The last identifier allocated is saved in a counter file in the directory
+        containing the parent's entities of this class, which is locked while it 
+        is updated, so that different processes allocate different identifiers.
+        Where there is no counter file, allocation continues from the highest 
+        numeric identifier of any existing entity.  An identifier is not re-used 
+        if no entity is created with it.  If the directory does not exist, the 
+        first identifier is returned and nothing is created or recorded: the 
+        directory is created when an entity is saved.
+
+        cls         is the class of the entity for which an identifier is allocated.
+        parent      is the parent from which the new entity is descended.
+        """
+        (entitydir, _) = parent._child_dirs(cls, None)
+        if not os.path.isdir(entitydir):
+            return "%08d"%1
+        counterpath = os.path.join(entitydir, layout.ENTITY_ID_COUNTER_FILE)
+        with util.file_lock(counterpath):
+            fd = os.open(counterpath, os.O_RDWR | os.O_CREAT, 0666)
+            with os.fdopen(fd, "r+") as counter:
+                last_id = counter.read().strip()
+                if last_id.isdigit():
+                    last_id = int(last_id)
+                else:
+                    last_id = max(
+                        [ int(eid) 
+                          for (eid, is_dir, _) in entity_dir_cache.scan(entitydir, cls._entityfile) 
+                          if is_dir and eid.isdigit() 
+                        ] or [0])
+                while True:
+                    last_id += 1
+                    newid = "%08d"%last_id
+                    if not cls.exists(parent, newid):
+                        break
+                counter.seek(0)
+                counter.truncate()
+                counter.write("%d\n"%last_id)
         return newid
 
     @classmethod
@@ -150,6 +187,32 @@ class Entity(EntityRoot):
         log.debug("Entity.path: %s"%(p))
         return p
 
+    def _entity_index(self):
+        """
+        Returns an index in which the current entity is recorded, or None.
+        """
+        return self._parent._child_index()
+
+    def _child_index(self):
+        """
+        Returns an index in which children of the current entity are recorded, or None.
+        """
+        return self._parent._child_index()
+
+    def _entity_update_lock(self):
+        """
+        Returns a context manager that excludes other updates to the entity
+        while the body of a `with` statement is executed.
+        """
+        return self._parent._child_update_lock()
+
+    def _child_update_lock(self):
+        """
+        Returns a context manager that excludes other updates to children of
+        the current entity while the body of a `with` statement is executed.
+        """
+        return self._parent._child_update_lock()
+
     # Create and access functions
 
     def child_entity_ids(self, cls, altparent=None):
@@ -163,29 +226,78 @@ class Entity(EntityRoot):
                     alternate relative path, or None if only potential child IDs of the
                     current entity are returned.
         """
-        for i in self._children(cls, altparent=altparent):
-            if cls.exists(self, i, altparent=altparent):
+        index   = self._child_index()
+        eids    = index and index.entity_ids(self, cls)
+        bodies  = self._child_bodies(cls, altparent=altparent)
+        if eids is None:
+            for i in self._children(cls, altparent=altparent):
+                if i in bodies:
+                    yield i
+        else:
+            for i in self._alt_children(cls, altparent, eids):
+                if i in bodies:
+                    yield i
+            for i in eids:
                 yield i
         return
 
-    def child_entities(self, cls, altparent=None):
+    def child_entities(self, cls, altparent=None, terms=None, conditions=None):
         """
         Iterates over child entities of an indicated class.
         The supplied class is used to determine a subdirectory to be scanned, 
         and to instantiate and load data for the entities found.
 
+        Where available, entity values are obtained from the collection's 
+        entity index rather than by reading each entity file.
+
         cls         is a subclass of Entity indicating the type of children to
                     iterate over.
         altparent   is an alternative parent entity to be checked using the class's
                     alternate relative path, or None if only potential child IDs of the
                     current entity are returned.
+        terms       if supplied, is a list of search terms, each of which must be a 
+                    prefix of some word in the string values of a returned entity 
+                    (see `entityindex.search_terms`).
+        conditions  if supplied, is a list of field value conditions that are used,
+                    where the entity index is available, to exclude entities whose
+                    stored values do not satisfy them (see `EntityIndex.entity_values`).
+                    Entities that do not satisfy the conditions may still be returned.
         """
-        for i in self._children(cls, altparent=altparent):
-            e = cls.load(self, i, altparent=altparent)
-            if e:
+        if conditions:
+            # Values supplied by `set_values` are not stored
+            conditions = [ c for c in conditions if c[0] not in COMPUTED_FIELD_IDS ]
+        index   = self._child_index()
+        evals   = index and index.entity_values(self, cls, terms=terms, conditions=conditions)
+        if evals is None:
+            for e in cls.load_many(self, self._children(cls, altparent=altparent), altparent=altparent):
+                if e and (not terms or entity_matches_terms(e.get_values(), terms)):
+                    yield e
+        else:
+            # Main entities that do not match the search terms are not excluded here,
+            # but cls.load prefers the main entity so they fail the terms test below.
+            alt_ids = self._alt_children(cls, altparent, [ eid for (eid, _) in evals ])
+            for e in cls.load_many(self, alt_ids, altparent=altparent):
+                if e and (not terms or entity_matches_terms(e.get_values(), terms)):
+                    yield e
+            for (i, v) in evals:
+                e = cls._child_init(self, i, altparent=altparent)
+                e.set_values(v)
                 yield e
         return
 
+    def _alt_children(self, cls, altparent, exclude):
+        """
+        Iterates over candidate child identifiers in the alternative parent
+        directory that are not in a supplied list of main child identifiers.
+        """
+        _, alt_dir = self._child_dirs(cls, altparent)
+        if alt_dir:
+            exclude = set(exclude)
+            for (f, is_dir, _) in entity_dir_cache.scan(alt_dir, cls._entityfile):
+                if is_dir and f not in exclude:
+                    yield f
+        return
+
     @classmethod
     def _child_init(cls, parent, entityid, altparent=None, use_altpath=False):
         """
@@ -250,6 +362,29 @@ class Entity(EntityRoot):
             e = None
         return e
 
+    @classmethod
+    def load_many(cls, parent, entityids, altparent=None):
+        """
+        Iterate over entities with given identifiers belonging to some given parent.
+
+        The entity files are read and parsed concurrently, using a bounded pool of
+        threads, which can substantially reduce the time taken to read many entities
+        when the storage has significant latency.
+
+        cls         is the class of the entities to be loaded
+        parent      is the parent from which the entities are descended.
+        entityids   is a list or iterator of local identifiers for the entities.
+        altparent   is an alternative parent entity to search for the loaded entities, 
+                    using the alternative path for the entity type.
+
+        Returns an iterator over instances of the indicated class with data loaded 
+        from Annalist storage, in the same order as the supplied identifiers, with 
+        None for any identifier for which there is no entity.
+        """
+        def load_entity(entityid):
+            return cls.load(parent, entityid, altparent=altparent)
+        return load_concurrently(load_entity, entityids)
+
     @classmethod
     def exists(cls, parent, entityid, altparent=None, use_altpath=False):
         """
@@ -286,18 +421,24 @@ class Entity(EntityRoot):
         Returns None on success, or a status value indicating a reason for value.
         """
         log.debug("Colllection.remove: id %s"%(entityid))
-        e = cls.load(parent, entityid, use_altpath=use_altpath)
-        if e:
-            d = e._entitydir
-            # Extra check to guard against accidentally deleting wrong thing
-            if cls._entitytype in e['@type'] and d.startswith(parent._entitydir):
-                shutil.rmtree(d)
+        with parent._child_update_lock():
+            e = cls.load(parent, entityid, use_altpath=use_altpath)
+            if e:
+                d = e._entitydir
+                # Extra check to guard against accidentally deleting wrong thing
+                if cls._entitytype in e['@type'] and d.startswith(parent._entitydir):
+                    shutil.rmtree(d)
+                    entity_value_cache.invalidate_tree(d)
+                    entity_dir_changes.entity_changed(d)
+                    index = e._entity_index()
+                    if index:
+                        index.remove_entity(d)
+                else:
+                    log.error("Expected type_id: %s, got %s"%(cls._entitytypeid, e[ANNAL.CURIE.type_id]))
+                    log.error("Expected dirbase: %s, got %s"%(parent._entitydir, d))
+                    raise Annalist_Error("Entity %s unexpected type %s or path %s"%(entityid, e[ANNAL.CURIE.type_id], d))
             else:
-                log.error("Expected type_id: %s, got %s"%(cls._entitytypeid, e[ANNAL.CURIE.type_id]))
-                log.error("Expected dirbase: %s, got %s"%(parent._entitydir, d))
-                raise Annalist_Error("Entity %s unexpected type %s or path %s"%(entityid, e[ANNAL.CURIE.type_id], d))
-        else:
-            return Annalist_Error("Entity %s not found"%(entityid))
+                return Annalist_Error("Entity %s not found"%(entityid))
         return None
 
 # End.
@@ -0,0 +1,314 @@
+"""
+In-process cache of entity values read from Annalist storage.
+
+Entity definitions such as record types, views, lists and fields are read
+many times while handling a single request.  This module provides a bounded
+least-recently-used cache of the values parsed from entity files, so that
+repeated reads of an unchanged file avoid re-reading and re-parsing it.
+
+Cache entries are validated against the file's status (modification and change
+times, size and inode) each time they are used, so changes made by other
+processes are seen.  Entries are also discarded explicitly when entities are
+saved or removed.
+
+A second cache holds the lists of entity identifiers found in each directory of 
+entities, which are validated against the directory status and a count of 
+entity changes made by this process.
+
+Values returned from the cache are copies, so a caller that updates the values
+it receives cannot affect the cached values or the values seen by other callers.
+"""
+
+__author__      = "Graham Klyne (GK@ACM.ORG)"
+__copyright__   = "Copyright 2014, G. Klyne"
+__license__     = "MIT (http://opensource.org/licenses/MIT)"
+
+import os
+import os.path
+import time
+import hashlib
+import threading
+from collections                import OrderedDict
+
+import logging
+log = logging.getLogger(__name__)
+
+from django.conf                import settings
+
+from annalist                   import util
+
+#   A directory listing is cached only if the directory modification time is at 
+#   least this many seconds old, so that changes made within the timestamp 
+#   resolution of the file system are not missed.
+DIR_SETTLE      = 2.0
+
+#   -------------------------------------------------------------------------------------------
+#
+#   Helper functions
+#
+#   -------------------------------------------------------------------------------------------
+
+def copy_values(values):
+    """
+    Returns a copy of a JSON-style value structure, in which each dictionary and
+    list is copied.  (This is much faster than `copy.deepcopy`.)
+
+    >>> v = { 'a': [ {'b': 1} ], 'c': "s" }
+    >>> c = copy_values(v)
+    >>> c == v
+    True
+    >>> c['a'][0]['b'] = 2
+    >>> v['a'][0]['b']
+    1
+    """
+    if isinstance(values, dict):
+        return dict( (k, copy_values(v)) for (k, v) in values.iteritems() )
+    if isinstance(values, list):
+        return [ copy_values(v) for v in values ]
+    return values
+
+def file_status(path):
+    """
+    Returns a value that changes whenever the indicated file is updated or 
+    replaced, or None if the file cannot be accessed.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_ctime, st.st_size, st.st_ino)
+
+def file_version(status):
+    """
+    Returns a version string for a file with the indicated status (from 
+    `file_status`), or None if there is no file.
+
+    Entity files are replaced rather than updated in place, so the version 
+    changes whenever an entity is saved, and it can be obtained without 
+    reading the file content.
+    """
+    if status is None:
+        return None
+    return hashlib.sha1(repr(status)).hexdigest()[:20]
+
+#   -------------------------------------------------------------------------------------------
+#
+#   EntityValueCache
+#
+#   -------------------------------------------------------------------------------------------
+
+class EntityValueCache(object):
+    """
+    Bounded LRU cache of values parsed from entity files, keyed by file path.
+    """
+
+    def __init__(self, size):
+        """
+        Initialize a new cache.
+
+        size        is the maximum number of entries held in the cache.
+                    Zero disables caching.
+        """
+        self._size   = size
+        self._lock   = threading.Lock()
+        self._cache  = OrderedDict()
+        self.hits    = 0
+        self.misses  = 0
+        return
+
+    def get(self, path, status):
+        """
+        Returns a copy of the values cached for the indicated file, or None if
+        there are no cached values for the file in its current state.
+
+        path        is the path of the file whose values are returned.
+        status      is the current status of the file, from `file_status`.
+        """
+        if not self._size or status is None:
+            return None
+        path = os.path.normpath(path)
+        with self._lock:
+            entry = self._cache.pop(path, None)
+            if entry and entry[0] == status:
+                self._cache[path] = entry      # Move to most-recently-used position
+                self.hits += 1
+                return copy_values(entry[1])
+            self.misses += 1
+        return None
+
+    def put(self, path, status, values):
+        """
+        Save a copy of the values parsed from the indicated file.
+
+        path        is the path of the file from which the values were read.
+        status      is the status of the file, from `file_status`, obtained 
+                    before the file was read.  (If the file is updated while it 
+                    is being read, the cached values are then not used.)
+        values      are the values parsed from the file.
+        """
+        if not self._size or status is None:
+            return
+        path = os.path.normpath(path)
+        with self._lock:
+            self._cache.pop(path, None)
+            self._cache[path] = (status, copy_values(values))
+            while len(self._cache) > self._size:
+                self._cache.popitem(last=False)
+        return
+
+    def invalidate(self, path):
+        """
+        Discard any values cached for the indicated file.
+        """
+        with self._lock:
+            self._cache.pop(os.path.normpath(path), None)
+        return
+
+    def invalidate_tree(self, dirpath):
+        """
+        Discard any values cached for files in or below the indicated directory.
+        """
+        prefix = os.path.normpath(dirpath)+os.sep
+        with self._lock:
+            for path in [ p for p in self._cache if p.startswith(prefix) ]:
+                del self._cache[path]
+        return
+
+    def clear(self):
+        """
+        Discard all cached values, and reset the cache hit and miss counters.
+        """
+        with self._lock:
+            self._cache.clear()
+            self.hits   = 0
+            self.misses = 0
+        return
+
+    def stats(self):
+        """
+        Returns a dictionary of cache statistics.
+        """
+        return (
+            { 'size':       len(self._cache)
+            , 'max_size':   self._size
+            , 'hits':       self.hits
+            , 'misses':     self.misses
+            })
+
+#   -------------------------------------------------------------------------------------------
+#
+#   EntityDirChanges
+#
+#   -------------------------------------------------------------------------------------------
+
+class EntityDirChanges(object):
+    """
+    Counts changes made by the current process to entities in each directory 
+    of entities.  
+
+    Creating or removing an entity also updates the modification time of the 
+    containing directory, which is seen by other processes, but updating an
+    existing entity does not.  A cache of values derived from the entities in 
+    a directory can use the change count to detect updates made by this process.
+    """
+
+    def __init__(self):
+        self._lock   = threading.Lock()
+        self._counts = {}
+        return
+
+    def entity_changed(self, entitydir):
+        """
+        Note a change to the entity stored in the indicated entity directory.
+        """
+        dirpath = os.path.dirname(os.path.normpath(entitydir))
+        with self._lock:
+            self._counts[dirpath] = self._counts.get(dirpath, 0) + 1
+        return
+
+    def change_count(self, dirpath):
+        """
+        Returns a count of changes to entities in the indicated directory.
+        """
+        return self._counts.get(os.path.normpath(dirpath), 0)
+
+#   -------------------------------------------------------------------------------------------
+#
+#   EntityDirCache
+#
+#   -------------------------------------------------------------------------------------------
+
+class EntityDirCache(object):
+    """
+    Bounded LRU cache of entity directory listings, keyed by directory path and
+    entity body file name.
+
+    Each listing is a list of (entity_id, is_dir, has_body) tuples, obtained by
+    a single pass over the directory, and is re-used while the directory status
+    and the count of changes made by this process to entities in the directory
+    are unchanged.
+    """
+
+    def __init__(self, size):
+        """
+        Initialize a new cache.
+
+        size        is the maximum number of directory listings held in the cache.
+                    Zero disables caching.
+        """
+        self._size   = size
+        self._lock   = threading.Lock()
+        self._cache  = OrderedDict()
+        return
+
+    def scan(self, dirpath, entityfile):
+        """
+        Returns a list of (entity_id, is_dir, has_body) tuples for valid entity 
+        identifiers in the indicated directory, or an empty list if the directory
+        does not exist.
+
+        dirpath     is the path of a directory containing entity directories.
+        entityfile  is the body file name, relative to an entity directory,
+                    whose presence indicates that an entity exists.
+        """
+        status = file_status(dirpath)
+        if status is None:
+            return []
+        key   = (os.path.normpath(dirpath), entityfile)
+        state = (status, entity_dir_changes.change_count(dirpath))
+        with self._lock:
+            entry = self._cache.pop(key, None)
+            if entry and entry[0] == state:
+                self._cache[key] = entry      # Move to most-recently-used position
+                return entry[1]
+        entries = []
+        for f in os.listdir(dirpath):
+            if util.valid_id(f):
+                p        = os.path.join(dirpath, f)
+                has_body = bool(entityfile) and os.path.isfile(os.path.join(p, entityfile))
+                entries.append((f, has_body or os.path.isdir(p), has_body))
+        if self._size and (time.time() - status[0]) >= DIR_SETTLE:
+            with self._lock:
+                self._cache[key] = (state, entries)
+                while len(self._cache) > self._size:
+                    self._cache.popitem(last=False)
+        return entries
+
+    def clear(self):
+        """
+        Discard all cached directory listings.
+        """
+        with self._lock:
+            self._cache.clear()
+        return
+
+#   Cache used for all entity values read by this process
+entity_value_cache = EntityValueCache(getattr(settings, "ENTITY_CACHE_SIZE", 1000))
+
+#   Changes to entities made by this process
+entity_dir_changes = EntityDirChanges()
+
+#   Cache used for all entity directory listings read by this process
+entity_dir_cache = EntityDirCache(getattr(settings, "ENTITY_DIR_CACHE_SIZE", 1000))
+
+# End.
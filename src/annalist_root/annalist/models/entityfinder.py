@@ -11,10 +11,19 @@ import logging
 log = logging.getLogger(__name__)
 
 import re
-from pyparsing import Word, QuotedString, Literal, Group, Empty, StringEnd, ParseException
+import heapq
+import threading
+from pyparsing import Word, QuotedString, Literal, Keyword, Group, Empty, StringEnd, ParseException
+from pyparsing import MatchFirst, infixNotation, opAssoc
 from pyparsing import alphas, alphanums
 
+from django.conf                    import settings
+
+from annalist.identifiers           import ANNAL
+
 from annalist.models.recordtypedata import RecordTypeData
+from annalist.models.entityref      import EntityRef, load_entity_refs
+from annalist.models.entityindex    import search_terms, number_value
 from annalist.models.entitytypeinfo import EntityTypeInfo, get_built_in_type_ids
 
 #   -------------------------------------------------------------------
@@ -29,8 +38,19 @@ def order_entity_key(entity):
 
         sorted(entities, order_entity_key)
     """
-    type_id   = entity.get_type_id() 
-    entity_id = entity.get_id()
+    return order_entity_id_key(entity.get_type_id(), entity.get_id())
+
+def order_entity_id_key(type_id, entity_id):
+    """
+    Function returns sort key for ordering entities by type and entity id, given
+    just the type and entity identifiers.  The entity itself is not needed, so 
+    entities can be ordered without reading their values.
+
+    >>> order_entity_id_key("_type", "type1") < order_entity_id_key("type1", "_entity1")
+    True
+    >>> order_entity_id_key("type1", "_entity1") < order_entity_id_key("type1", "entity1")
+    True
+    """
     key = ( 0 if type_id.startswith('_')   else 1, type_id, 
             0 if entity_id.startswith('_') else 1, entity_id
           )
@@ -41,19 +61,37 @@ def order_entity_key(entity):
 #   EntityFinder
 #   -------------------------------------------------------------------
 
+#   Entity fields that can be accessed from an EntityRef without reading the entity
+REF_FIELD_IDS = frozenset([ANNAL.CURIE.id, ANNAL.CURIE.type_id])
+
 class EntityFinder(object):
     """
     Logic for enumerting entities matching a supplied type, selector and/or search string.
     """
 
-    def __init__(self, coll, selector=None):
+    def __init__(self, coll, selector=None, search_substring=None):
         """
         Initialize entity finder for collection and selector.
+
+        coll                is the collection whose entities are found.
+        selector            is a selector expression (see `EntitySelector`) that
+                            returned entities must satisfy, or None.
+        search_substring    if True, a search string must appear exactly as a 
+                            substring of some entity value.  Otherwise, each word 
+                            of a search string is matched, without regard to case,
+                            against the start of words appearing in entity values,
+                            which allows the search to use the collection entity 
+                            index.  If not specified, the `SEARCH_SUBSTRING` setting
+                            is used.
         """
         super(EntityFinder, self).__init__()
         self._coll     = coll
         self._site     = coll.get_site()
         self._selector = EntitySelector(selector)
+        self._search_substring = (
+            getattr(settings, "SEARCH_SUBSTRING", True) if search_substring is None 
+            else search_substring
+            )
         return
 
     def get_collection_type_ids(self):
@@ -68,41 +106,86 @@ class EntityFinder(object):
             yield t
         return
 
-    def get_type_entities(self, type_id, user_permissions, scope):
+    def get_type_entities(self, type_id, user_permissions, scope, terms=None, conditions=None):
         """
         Iterate over entities from collection matching the supplied type.
 
         'scope' is used to determine the extend of data top be included in the listing:
         a value of 'all' means that site-wide entyioties are icnluded in the listing.
         Otherwise only collection entities are included.        
+
+        'terms', if supplied, is a list of search terms that must be matched by 
+        returned entities.
+
+        'conditions', if supplied, is a list of field value conditions that may be 
+        used to exclude entities that cannot be selected (see 
+        `EntitySelector.index_conditions`).
         """
         entitytypeinfo = EntityTypeInfo(self._site, self._coll, type_id)
         include_sitedata = (scope == "all")
-        for e in entitytypeinfo.enum_entities(user_permissions, usealtparent=include_sitedata):
+        for e in entitytypeinfo.enum_entities(
+                user_permissions, usealtparent=include_sitedata, terms=terms,
+                conditions=conditions
+                ):
             yield e
         return
 
-    def get_all_types_entities(self, types, user_permissions, scope):
+    def get_all_types_entities(self, types, user_permissions, scope, terms=None, conditions=None):
         """
         Iterate mover all entities of all types from a supplied type iterator
         """
         assert user_permissions is not None
         for t in types:
-            for e in self.get_type_entities(t, user_permissions, scope):
+            for e in self.get_type_entities(
+                    t, user_permissions, scope, terms=terms, conditions=conditions
+                    ):
                 yield e
         return
 
-    def get_base_entities(self, type_id=None, user_permissions=None, scope=None):
+    def get_type_entity_refs(self, type_id, user_permissions, scope):
+        """
+        Iterate over references to entities from collection matching the supplied 
+        type (see `EntityRef`).  Entity values are not read.
+        """
+        entitytypeinfo = EntityTypeInfo(self._site, self._coll, type_id)
+        include_sitedata = (scope == "all")
+        for eid in entitytypeinfo.enum_entity_ids(
+                usealtparent=include_sitedata, user_perms=user_permissions
+                ):
+            yield EntityRef(entitytypeinfo, eid)
+        return
+
+    def get_base_entity_refs(self, type_id=None, user_permissions=None, scope=None):
+        """
+        Iterate over references to base entities from collection, matching the 
+        supplied type id if supplied.
+        """
+        if type_id:
+            type_ids = [type_id]
+        else:
+            assert user_permissions is not None
+            type_ids = self.get_collection_type_ids()
+        for t in type_ids:
+            for ref in self.get_type_entity_refs(t, user_permissions, scope):
+                yield ref
+        return
+
+    def get_base_entities(self, 
+        type_id=None, user_permissions=None, scope=None, terms=None, conditions=None
+        ):
         """
         Iterate over base entities from collection, matching the supplied type id if supplied.
 
         If a type_id is supplied, site data values are included.
         """
         if type_id:
-            return self.get_type_entities(type_id, user_permissions, scope)
+            return self.get_type_entities(
+                type_id, user_permissions, scope, terms=terms, conditions=conditions
+                )
         else:
             return self.get_all_types_entities(
-                self.get_collection_type_ids(), user_permissions, scope
+                self.get_collection_type_ids(), user_permissions, scope, 
+                terms=terms, conditions=conditions
                 )
         return
 
@@ -122,25 +205,65 @@ class EntityFinder(object):
         Get list of entities of the specified type, matching search term and visible to 
         supplied user permissions.
         """
+        terms = None
+        if search and not self._search_substring:
+            terms = search_terms(search)
+        conditions = self._selector.index_conditions(context)
         entities = self._selector.filter(
-            self.get_base_entities(type_id, user_permissions, scope), context=context
+            self.get_base_entities(
+                type_id, user_permissions, scope, terms=terms, conditions=conditions
+                ), 
+            context=context
             )
-        if search:
+        if search and not terms:
             entities = self.search_entities(entities, search)
         return entities
 
     def get_entities_sorted(self, 
-        user_permissions=None, type_id=None, scope=None, context={}, search=None
+        user_permissions=None, type_id=None, scope=None, context={}, search=None,
+        offset=0, limit=None
         ):
         """
         Get sorted list of entities of the specified type, matching search term and 
         visible to supplied user permissions.
+
+        If `offset` and/or `limit` are supplied, only the corresponding part of the 
+        sorted list is returned:  `offset` entities are skipped, and at most `limit` 
+        entities are returned.
+
+        When a limit is supplied, only the first `offset+limit` entities are retained 
+        while sorting.  If, further, there is no search term and any selector refers 
+        only to entity and type identifiers, entities are selected and ordered using
+        references that do not read entity values, and values are read only for the 
+        entities that are returned.
         """
-        entities = self.get_entities(
-            user_permissions, type_id=type_id, scope=scope, 
-            context=context, search=search
+        if limit is None:
+            entities = sorted(
+                self.get_entities(
+                    user_permissions, type_id=type_id, scope=scope, 
+                    context=context, search=search
+                    ),
+                key=order_entity_key
+                )
+            return entities[offset:] if offset else entities
+        if not search and self._selector.entity_field_ids() <= REF_FIELD_IDS:
+            entity_refs = heapq.nsmallest(offset+limit, 
+                self._selector.filter(
+                    self.get_base_entity_refs(type_id, user_permissions, scope),
+                    context=context
+                    ),
+                key=order_entity_key
+                )
+            entities = load_entity_refs(entity_refs[offset:])
+            return [ e for e in entities if e ]
+        entities = heapq.nsmallest(offset+limit, 
+            self.get_entities(
+                user_permissions, type_id=type_id, scope=scope, 
+                context=context, search=search
+                ),
+            key=order_entity_key
             )
-        return sorted(entities, key=order_entity_key)
+        return entities[offset:]
 
     @classmethod
     def entity_contains(cls, e, search):
@@ -165,6 +288,212 @@ class EntityFinder(object):
             return False
         return True
 
+#   -------------------------------------------------------------------
+#   Selector grammar
+#   -------------------------------------------------------------------
+
+#   Comparison operators, and keywords that cannot be used as unquoted literal values
+SELECTOR_COMPARISONS = ("==", "!=", "in", "startswith", "<=", ">=", "<", ">")
+SELECTOR_KEYWORDS    = ("in", "startswith", "and", "or", "not")
+
+def selector_grammar():
+    """
+    Returns a pyparsing grammar for entity selector expressions (see
+    `EntitySelector.parse_selector`).  The grammar returns a single token, 
+    which is a dictionary describing the selector predicate.
+    """
+    def comparison(tokens):
+        val1, comp, val2 = tokens
+        return (
+            { 'val1': selector_value_desc(val1.asList())
+            , 'comp': comp
+            , 'val2': selector_value_desc(val2.asList())
+            })
+    def boolean_op(tokens):
+        t = tokens[0]
+        if t[0] == "not":
+            return { 'op': "not", 'args': [t[1]] }
+        return { 'op': t[1], 'args': list(t[0::2]) }
+    p_keyword  = MatchFirst([ Keyword(k) for k in SELECTOR_KEYWORDS ])
+    p_name     = Word(alphas+"_", alphanums+"_")
+    p_id       = Word(alphanums+"_@", alphanums+"_-.~:/?#@!$&'()*+,;=)")
+    p_val      = ( Group( Literal("[") + p_id + Literal("]") )
+                 | Group( p_name + Literal("[") + p_id + Literal("]") )
+                 | Group( QuotedString('"', "\\") )
+                 | Group( QuotedString("'", "\\") )
+                 | Group( ~p_keyword + p_id )
+                 )
+    p_comp     = MatchFirst(
+        [ Keyword(c) if c.isalpha() else Literal(c) for c in SELECTOR_COMPARISONS ]
+        )
+    p_compare  = ( p_val + p_comp + p_val ).setParseAction(comparison)
+    p_expr     = infixNotation(p_compare,
+        [ (Keyword("not"), 1, opAssoc.RIGHT, boolean_op)
+        , (Keyword("and"), 2, opAssoc.LEFT,  boolean_op)
+        , (Keyword("or"),  2, opAssoc.LEFT,  boolean_op)
+        ])
+    p_selector = ( p_expr + StringEnd() )
+    return p_selector
+
+def selector_value_desc(val_list):
+    """
+    Returns a dictionary describing a value in a selector comparison, given the
+    list of tokens matched for the value.
+    """
+    if len(val_list) == 1:
+        return { 'type': 'literal', 'name': None,        'field_id': None,        'value': val_list[0] }
+    elif val_list[0] == '[':
+        return { 'type': 'entity',  'name': None,        'field_id': val_list[1], 'value': None }
+    elif val_list[1] == '[':
+        return { 'type': 'context', 'name': val_list[0], 'field_id': val_list[2], 'value': None }
+    else:
+        return { 'type': 'unknown', 'name': None,        'field_id': None,        'value': None }
+
+#   The selector grammar is constructed once, when this module is loaded, and
+#   parsed selectors are saved for re-use, keyed by selector string.
+SELECTOR_GRAMMAR        = selector_grammar()
+SELECTOR_CACHE_SIZE     = 1000
+selector_parse_lock     = threading.Lock()
+selector_parse_cache    = {}
+
+#   -------------------------------------------------------------------
+#   Selector predicate functions
+#   -------------------------------------------------------------------
+
+#   Estimated selectivity of comparisons, used to order the clauses of a 
+#   selector:  lower values are expected to select fewer entities.
+COMPARISON_COST = (
+    { "==":         1
+    , "in":         2
+    , "startswith": 3
+    , "<":          4
+    , "<=":         4
+    , ">":          4
+    , ">=":         4
+    , "!=":         8
+    })
+
+#   Comparison with operands exchanged
+COMPARISON_CONVERSE = (
+    { "==": "==", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<=" })
+
+RANGE_COMPARISONS = (
+    { "<":  lambda v1, v2: v1 <  v2
+    , "<=": lambda v1, v2: v1 <= v2
+    , ">":  lambda v1, v2: v1 >  v2
+    , ">=": lambda v1, v2: v1 >= v2
+    })
+
+def predicate_cost(pred):
+    """
+    Returns an estimate of the selectivity of a selector predicate:  lower values
+    are expected to select fewer entities.
+
+    >>> p = EntitySelector.parse_selector
+    >>> predicate_cost(p("[p:a] == 'a'")) < predicate_cost(p("[p:a] != 'a'"))
+    True
+    >>> predicate_cost(p("[p:a] in view[v:a]")) > predicate_cost(p("'a' in [p:a]"))
+    True
+    >>> predicate_cost(p("[p:a] == 'a' and [p:b] != 'b'"))
+    1
+    """
+    if 'op' in pred:
+        costs = [ predicate_cost(a) for a in pred['args'] ]
+        if pred['op'] == "and":
+            return min(costs)
+        if pred['op'] == "or":
+            return sum(costs)
+        return COMPARISON_COST["!="]
+    cost = COMPARISON_COST[pred['comp']]
+    if pred['comp'] == "in" and pred['val1']['type'] == "entity":
+        # Entities with no value for the field are also selected
+        cost += 1
+    return cost
+
+def compare_range(op, v1, v2):
+    """
+    Compare values for a range comparison.  If either value is a number, or a 
+    string that represents a number, both are compared as numbers.  Otherwise,
+    both must be strings, which are compared as strings (e.g. ISO8601 dates).
+
+    >>> compare_range("<", "9", "10")
+    True
+    >>> compare_range(">=", "2015-01-10", "2015-01-09")
+    True
+    >>> compare_range(">", "abc", "10")
+    False
+    >>> compare_range("<", None, "a")
+    False
+    """
+    n1 = number_value(v1)
+    n2 = number_value(v2)
+    if n1 is not None or n2 is not None:
+        if n1 is None or n2 is None:
+            return False
+        return RANGE_COMPARISONS[op](n1, n2)
+    if isinstance(v1, (str, unicode)) and isinstance(v2, (str, unicode)):
+        return RANGE_COMPARISONS[op](v1, v2)
+    return False
+
+def predicate_conditions(pred, context):
+    """
+    Returns a list of field value conditions (see `EntityIndex.entity_values`)
+    that are satisfied by any entity selected by the supplied predicate in the 
+    supplied context.
+    """
+    if 'op' in pred:
+        if pred['op'] == "and":
+            return (
+                [ c for a in sorted(pred['args'], key=predicate_cost) 
+                    for c in predicate_conditions(a, context) 
+                ])
+        if pred['op'] == "or":
+            # A disjunction of "in" conditions on the same field is an "in" condition
+            conds = [ predicate_conditions(a, context) for a in pred['args'] ]
+            if all( len(c) == 1 and c[0][1] in ("in", "in_or_missing") for c in conds ):
+                if len(set( c[0][0] for c in conds )) == 1:
+                    op = "in" if all( c[0][1] == "in" for c in conds ) else "in_or_missing"
+                    vals = []
+                    for c in conds:
+                        vals.extend( v for v in c[0][2] if v not in vals )
+                    return [ (conds[0][0][0], op, vals) ]
+        return []
+    comp = pred['comp']
+    v1   = pred['val1']
+    v2   = pred['val2']
+    if v1['type'] == "entity" and v2['type'] in ("literal", "context"):
+        field_id = v1['field_id']
+        value    = EntitySelector.selector_value(v2, context)
+        if comp == "in":
+            if not isinstance(value, list):
+                value = [value]
+            return (
+                [ ( field_id, "in_or_missing"
+                  , [ v for v in value if isinstance(v, (str, unicode)) and v ]
+                ) ])
+        if comp == "startswith":
+            if isinstance(value, (str, unicode)) and value:
+                return [ (field_id, "startswith", value) ]
+            return []
+    elif v2['type'] == "entity" and v1['type'] in ("literal", "context"):
+        field_id = v2['field_id']
+        value    = EntitySelector.selector_value(v1, context)
+        if comp == "in":
+            comp = "=="
+        comp = COMPARISON_CONVERSE.get(comp, None)
+    else:
+        return []
+    if comp == "==":
+        if isinstance(value, (str, unicode)) and value:
+            return [ (field_id, "in", [value]) ]
+    elif comp in RANGE_COMPARISONS:
+        num = number_value(value)
+        if num is not None:
+            return [ (field_id, comp, num) ]
+        if isinstance(value, (str, unicode)):
+            return [ (field_id, comp, value) ]
+    return []
+
 #   -------------------------------------------------------------------
 #   EntitySelector
 #   -------------------------------------------------------------------
@@ -213,10 +542,40 @@ class EntitySelector(object):
     True
     >>> EntitySelector(f12).select_entity(e, c)
     False
+
+    Boolean combinations, and other comparisons:
+
+    >>> f13 = "[p:a] == '1' and 'foo:bar' in [@type]"
+    >>> f14 = "[p:a] == '2' or [p:b] == '2'"
+    >>> f15 = "not ([p:a] == '1' or [p:b] == '1')"
+    >>> f16 = "[p:a] != '1'"
+    >>> f17 = "[p:a] < '10' and [p:c] >= '3'"
+    >>> f18 = "[@id] startswith 'http://example.com/'"
+    >>> f19 = "[p:d] > '2015-01-01'"
+    >>> EntitySelector(f13).select_entity(e, c)
+    True
+    >>> EntitySelector(f14).select_entity(e, c)
+    True
+    >>> EntitySelector(f15).select_entity(e, c)
+    False
+    >>> EntitySelector(f16).select_entity(e, c)
+    False
+    >>> EntitySelector(f17).select_entity(e, c)
+    True
+    >>> EntitySelector(f18).select_entity({ '@id': 'http://example.com/a' }, c)
+    True
+    >>> EntitySelector(f19).select_entity({ 'p:d': '2015-02-01' }, c)
+    True
+    >>> EntitySelector(f19).select_entity({ 'p:d': '2014-12-31' }, c)
+    False
     """
     def __init__(self, selector):
         # Returns None if no filter is applied, otherwise a predcicate function
-        self._selector = self.compile_selector_filter(selector)
+        self._selector  = self.compile_selector_filter(selector)
+        self._field_ids = self.selector_entity_field_ids(selector)
+        self._predicate = (
+            None if selector in {None, "", "ALL"} else self.parse_selector(selector)
+            )
         return
 
     def filter(self, entities, context=None):
@@ -243,6 +602,12 @@ class EntitySelector(object):
                 yield e
         return
 
+    def entity_field_ids(self):
+        """
+        Returns a set of the entity field ids used by the selector.
+        """
+        return self._field_ids
+
     def select_entity(self, entity, context={}):
         """
         Apply selector to an entity, and returns True if the entity is selected
@@ -251,16 +616,86 @@ class EntitySelector(object):
             return self._selector(entity, context)
         return True
 
+    def get_predicate(self):
+        """
+        Returns the structure of the selector predicate, as returned by `parse_selector`,
+        or None if all entities are selected.  The value returned must not be updated.
+        """
+        return self._predicate
+
+    def index_conditions(self, context):
+        """
+        Returns a list of conditions on stored entity field values that are satisfied 
+        by every entity selected in the supplied context, which can be applied by an
+        entity index (see `EntityIndex.entity_values`) to avoid reading entities that
+        cannot be selected.  Entities found using these conditions must still be 
+        tested using the selector.
+
+        Each condition is a tuple (field_id, op, operand).  Conditions from the 
+        clauses of a conjunction are returned with the most selective first.  An 
+        empty list is returned if the selector cannot be expressed in this way.
+
+        >>> c = { 'view': { 'v:a': 'a', 'v:b': ['b', 'c'] } }
+        >>> EntitySelector("[p:a] in view[v:b]").index_conditions(c)
+        [('p:a', 'in_or_missing', ['b', 'c'])]
+        >>> EntitySelector("[p:a] in view[v:c]").index_conditions(c)
+        [('p:a', 'in_or_missing', [])]
+        >>> EntitySelector("[p:a] == view[v:a]").index_conditions(c)
+        [('p:a', 'in', ['a'])]
+        >>> EntitySelector("'foo:bar' in [@type]").index_conditions(c)
+        [('@type', 'in', ['foo:bar'])]
+        >>> EntitySelector("[p:b] > '2015' and [p:a] == 'a'").index_conditions(c)
+        [('p:a', 'in', ['a']), ('p:b', '>', 2015.0)]
+        >>> EntitySelector("'2015-01-01' <= [p:b] and [p:c] startswith 'x'").index_conditions(c)
+        [('p:c', 'startswith', 'x'), ('p:b', '>=', '2015-01-01')]
+        >>> EntitySelector("[p:a] == 'a' or [p:a] in view[v:b]").index_conditions(c)
+        [('p:a', 'in_or_missing', ['a', 'b', 'c'])]
+        >>> EntitySelector("[p:a] == 'a' or [p:b] == 'b'").index_conditions(c)
+        []
+        >>> EntitySelector("not [p:a] == 'a'").index_conditions(c)
+        []
+        >>> EntitySelector("[p:a] == [p:b]").index_conditions(c)
+        []
+        >>> EntitySelector("ALL").index_conditions(c)
+        []
+        """
+        if not self._predicate:
+            return []
+        return predicate_conditions(self._predicate, context)
+
+    @classmethod
+    def selector_value(cls, selval, context):
+        """
+        Returns the value of a literal or context value from a parsed selector.
+        """
+        if selval['type'] == "literal":
+            return selval['value']
+        name = selval['name']
+        if context and name in context and context[name]:
+            return context[name].get(selval['field_id'], None)
+        return None
+
     @classmethod  #@@ @staticmethod, no cls?
     def parse_selector(cls, selector):
         """
-        Parse a selector and return list of tokens
+        Parse a selector and return a dictionary describing the selector predicate.
 
         Selector formats:
             ALL (or blank)              match any entity
             <val1> == <val2>            values are same
+            <val1> != <val2>            values are not the same
             <val1> in <val2>            second value is list containing 1st value, 
                                         or values are same, or val1 is None.
+            <val1> startswith <val2>    values are strings, and val1 starts with val2
+            <val1> < <val2>             values are both numbers (or strings that are
+            <val1> <= <val2>            numbers), compared numerically, or are both 
+            <val1> > <val2>             other strings (e.g. ISO8601 dates), compared
+            <val1> >= <val2>            as strings.
+            not <sel>                   selector is not satisfied
+            <sel1> and <sel2>           both selectors are satisfied
+            <sel1> or <sel2>            either selector is satisfied
+            ( <sel> )                   grouping:  "not" binds more tightly than "and",
+                                        which binds more tightly than "or".
 
             <val1> and <val2> may be:
 
@@ -268,6 +703,9 @@ class EntitySelector(object):
             <name>[<field-id>]          refers to field of context value, or None if the
                                         indicated context value or field is not defined.
             "<string>"                  literal string value.  Quotes within are escaped.
+            <field-id>                  literal string value (e.g. a CURIE or a number).
+                                        A keyword used as a literal value, or a 
+                                        value followed by ")", must be quoted.
 
         <field_id> values are URIs or CURIEs, using characters defined by RFC3986,
         except "[" and "]"
@@ -278,37 +716,97 @@ class EntitySelector(object):
            gen-delims    = ":" / "/" / "?" / "#" / "[" / "]" / "@"
            sub-delims    = "!" / "$" / "&" / "'" / "(" / ")"
                          / "*" / "+" / "," / ";" / "="
+
+        A comparison is described by a dictionary with keys 'val1', 'comp' and 'val2'.
+        A boolean combination is described by a dictionary with keys 'op' ("not", 
+        "and" or "or") and 'args' (a list of the combined predicates).
+
+        Parsed selectors are saved and re-used:  the value returned is shared, and
+        must not be updated.
+
+        >>> EntitySelector.parse_selector("[p:a] in view[v:b]") == (
+        ...     { 'val1': { 'type': 'entity',  'name': None,   'field_id': 'p:a', 'value': None }
+        ...     , 'comp': 'in'
+        ...     , 'val2': { 'type': 'context', 'name': 'view', 'field_id': 'v:b', 'value': None }
+        ...     })
+        True
+        >>> EntitySelector.parse_selector("[p:a] in view[v:b]") is EntitySelector.parse_selector("[p:a] in view[v:b]")
+        True
+        >>> p = EntitySelector.parse_selector("not [p:a] == 'a' and ([p:b] > '1' or [p:c] != 'c')")
+        >>> (p['op'], p['args'][0]['op'], p['args'][1]['op'], p['args'][1]['args'][1]['comp'])
+        ('and', 'not', 'or', '!=')
+        >>> EntitySelector.parse_selector("[p:a] == and") is None
+        True
         """
-        def get_value(val_list):
-            if len(val_list) == 1:
-                return { 'type': 'literal', 'name': None,        'field_id': None,        'value': val_list[0] }
-            elif val_list[0] == '[':
-                return { 'type': 'entity',  'name': None,        'field_id': val_list[1], 'value': None }
-            elif val_list[1] == '[':
-                return { 'type': 'context', 'name': val_list[0], 'field_id': val_list[2], 'value': None }
-            else:
-                return { 'type': 'unknown', 'name': None,        'field_id': None,        'value': None }
-        p_name     = Word(alphas+"_", alphanums+"_")
-        p_id       = Word(alphas+"_@", alphanums+"_-.~:/?#@!$&'()*+,;=)")
-        p_val      = ( Group( Literal("[") + p_id + Literal("]") )
-                     | Group( p_name + Literal("[") + p_id + Literal("]") )
-                     | Group( QuotedString('"', "\\") )
-                     | Group( QuotedString("'", "\\") )
-                     | Group( p_id )
-                     )
-        p_comp     = ( Literal("==") | Literal("in") )
-        p_selector = ( p_val + p_comp + p_val + StringEnd() )
-        try:
-            resultlist = p_selector.parseString(selector).asList()
-        except ParseException:
-            return None
-        resultdict = {}
-        if resultlist:
-            resultdict['val1'] = get_value(resultlist[0])
-            resultdict['comp'] = resultlist[1]
-            resultdict['val2'] = get_value(resultlist[2])
+        with selector_parse_lock:
+            if selector in selector_parse_cache:
+                return selector_parse_cache[selector]
+            try:
+                resultdict = SELECTOR_GRAMMAR.parseString(selector)[0]
+            except ParseException:
+                resultdict = None
+            if len(selector_parse_cache) >= SELECTOR_CACHE_SIZE:
+                selector_parse_cache.clear()
+            selector_parse_cache[selector] = resultdict
         return resultdict
 
+    @classmethod
+    def selector_values(cls, selector):
+        """
+        Iterates over the value descriptions in the comparisons of a selector.
+        """
+        def pred_values(pred):
+            if 'op' in pred:
+                for a in pred['args']:
+                    for v in pred_values(a):
+                        yield v
+            else:
+                yield pred['val1']
+                yield pred['val2']
+            return
+        if selector in {None, "", "ALL"}:
+            return []
+        sel = cls.parse_selector(selector)
+        return pred_values(sel) if sel else []
+
+    @classmethod
+    def selector_entity_field_ids(cls, selector):
+        """
+        Returns a set of entity field ids referenced by a selector.
+
+        >>> sorted(EntitySelector.selector_entity_field_ids("[annal:id] in view[v:ids]"))
+        ['annal:id']
+        >>> sorted(EntitySelector.selector_entity_field_ids("[p:a] == [p:b]"))
+        ['p:a', 'p:b']
+        >>> sorted(EntitySelector.selector_entity_field_ids("[p:a] == 'a' or not [p:c] == 'c'"))
+        ['p:a', 'p:c']
+        >>> EntitySelector.selector_entity_field_ids("ALL")
+        set([])
+        """
+        return set(
+            v['field_id'] for v in cls.selector_values(selector) if v['type'] == "entity"
+            )
+
+    @classmethod
+    def selector_context_fields(cls, selector):
+        """
+        Returns a sorted list of (name, field_id) pairs for context values
+        referenced by a selector.  Selection of entities by a selector depends
+        on the display context only through these values.
+
+        >>> EntitySelector.selector_context_fields("[annal:field_entity_type] in entity[annal:record_type]") == (
+        ...     [('entity', 'annal:record_type')] )
+        True
+        >>> EntitySelector.selector_context_fields("[p:a] == [p:b]")
+        []
+        >>> EntitySelector.selector_context_fields("ALL")
+        []
+        """
+        return sorted(set(
+            (v['name'], v['field_id']) for v in cls.selector_values(selector) 
+                if v['type'] == "context"
+            ))
+
     @classmethod  #@@TODO: @staticmethod, no cls?
     def compile_selector_filter(cls, selector):
         """
@@ -316,18 +814,11 @@ class EntitySelector(object):
 
         Returns None if no selection is performed; i.e. all possible entities are selected.
 
-        Selector formats:
-            ALL (or blank)              match any entity
-            <val1> == <val2>            values are same
-            <val1> in <val2>            second value is list containing 1st value, 
-                                        or values are same, or val1 is None.
-
-            <val1> and <val2> may be:
+        See `parse_selector` for a description of selector formats.
 
-            [<field-id>]                refers to field in entity under test
-            <name>[<field-id>]          refers to field of context value, or None if the
-                                        indicated context value or field is not defined.
-            "<string>"                  literal string value.  Quotes within are escaped.
+        The clauses of a conjunction are tested in order of estimated selectivity, 
+        most selective first, and those of a disjunction in the reverse order, and 
+        testing stops as soon as the result is determined.
         """
         def get_entity(field_id):
             "Get field from entity tested by filter"
@@ -366,6 +857,11 @@ class EntitySelector(object):
                 return v1f(e, c) == v2f(e, c)
             return match_eq_f
         #
+        def match_ne(v1f, v2f):
+            def match_ne_f(e, c):
+                return v1f(e, c) != v2f(e, c)
+            return match_ne_f
+        #
         def match_in(v1f, v2f):
             def match_in_f(e, c):
                 v1 = v1f(e, c)
@@ -376,19 +872,67 @@ class EntitySelector(object):
                 return v1 == v2
             return match_in_f
         #
+        def match_startswith(v1f, v2f):
+            def match_startswith_f(e, c):
+                v1 = v1f(e, c)
+                v2 = v2f(e, c)
+                return (
+                    isinstance(v1, (str, unicode)) and isinstance(v2, (str, unicode)) and 
+                    v1.startswith(v2)
+                    )
+            return match_startswith_f
+        #
+        def match_range(comp, v1f, v2f):
+            def match_range_f(e, c):
+                return compare_range(comp, v1f(e, c), v2f(e, c))
+            return match_range_f
+        #
+        def match_not(pf):
+            def match_not_f(e, c):
+                return not pf(e, c)
+            return match_not_f
+        #
+        def match_and(pfs):
+            def match_and_f(e, c):
+                return all( pf(e, c) for pf in pfs )
+            return match_and_f
+        #
+        def match_or(pfs):
+            def match_or_f(e, c):
+                return any( pf(e, c) for pf in pfs )
+            return match_or_f
+        #
+        def compile_pred(pred):
+            if 'op' in pred:
+                args = sorted(pred['args'], key=predicate_cost)
+                if pred['op'] == "not":
+                    return match_not(compile_pred(args[0]))
+                if pred['op'] == "and":
+                    return match_and([ compile_pred(a) for a in args ])
+                if pred['op'] == "or":
+                    return match_or([ compile_pred(a) for a in reversed(args) ])
+                raise ValueError("Unrecognized selector operator (%s)"%pred['op'])
+            v1f  = get_val_f(pred['val1'])
+            v2f  = get_val_f(pred['val2'])
+            comp = pred['comp']
+            if comp == "==":
+                return match_eq(v1f, v2f)
+            if comp == "!=":
+                return match_ne(v1f, v2f)
+            if comp == "in":
+                return match_in(v1f, v2f)
+            if comp == "startswith":
+                return match_startswith(v1f, v2f)
+            if comp in RANGE_COMPARISONS:
+                return match_range(comp, v1f, v2f)
+            raise ValueError("Unrecognized selector comparison (%s)"%comp)
+        #
         if selector in {None, "", "ALL"}:
             return None
         sel = cls.parse_selector(selector)
         if not sel:
             raise ValueError("Unrecognized selector syntax (%s)"%selector)
-        v1f = get_val_f(sel['val1'])
-        v2f = get_val_f(sel['val2'])
-        if sel['comp'] == "==":
-            return match_eq(v1f, v2f)
-        if sel['comp'] == "in":
-            return match_in(v1f, v2f)
-        # Drop through: raise error
-        raise ValueError("Unrecognized entity selector (%s)"%selector)
+        return compile_pred(sel)
 
 if __name__ == "__main__":
     import doctest
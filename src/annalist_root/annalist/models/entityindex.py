@@ -0,0 +1,813 @@
+"""
+Persistent index of entities stored in an Annalist collection.
+
+The index is an SQLite database kept alongside the collection metadata,
+and holds a copy of the stored values of each entity descended from the
+collection, keyed by the directory that contains the entity and the entity
+id.  It allows entities of a given type to be enumerated without listing
+directories and reading every entity file, which is what dominates the
+cost of displaying a list of entities in a large collection.
+
+The index also records the words that appear in each entity's string values,
+so that entities matching a list of search terms can be selected without
+examining the values of every entity of a type, and the values of each entity 
+field, so that conditions derived from a list selector (see `EntitySelector`) 
+can be applied by the index.
+
+The index also keeps generation counters for the collection, and for each
+directory (and each directory prefix; e.g. "d", or "_annalist_collection") 
+containing entities, which are increased whenever an entity in the collection
+or directory is saved or removed, or is found to have been added or removed 
+by other means.  A generation counter allows a cache of values derived from
+collection data to be validated with a single query.  The counters start 
+from a value based on the time at which the index is created, so they continue 
+to increase if the index is rebuilt.
+
+The entity files remain the definitive record:  the index is updated when
+entities are saved or removed, and each directory of entities is re-scanned
+when its modification time shows that entities may have been added or removed
+by other means.  The index also records the version (see `entitycache.file_version`)
+of each entity file from which values are recorded.  Each process checks the
+files of a directory of entities when values for the directory are first 
+retrieved, and again only when the directory's generation counter shows that
+it has been updated since it was last checked, and re-reads any entity whose 
+file has changed (e.g. following a manual edit, or a restore from backup).  
+An entity file changed by other means while the index is in use is therefore
+not re-read until the directory is next updated, the process is restarted, or 
+the index is rebuilt.  The index file can be deleted at any time (see `rebuild`), 
+in which case it is repopulated from the entity files as they are accessed.
+"""
+
+__author__      = "Graham Klyne (GK@ACM.ORG)"
+__copyright__   = "Copyright 2014, G. Klyne"
+__license__     = "MIT (http://opensource.org/licenses/MIT)"
+
+import os
+import os.path
+import re
+import time
+import json
+import errno
+import sqlite3
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+from annalist                   import layout
+from annalist                   import util
+from annalist.identifiers       import RDFS, ANNAL
+
+from annalist.models.entitycache  import file_status, file_version
+from annalist.models.entityloader import load_concurrently
+
+#   Index format version: the index is discarded and rebuilt if this does not
+#   match the version recorded in the index file.
+INDEX_VERSION   = 6
+
+#   A directory modification time is trusted only if it is at least this many
+#   seconds old when recorded, to allow for coarse file system timestamps:
+#   a directory updated within the same timestamp interval as an earlier scan
+#   would otherwise appear to be unchanged.
+MTIME_SETTLE    = 2.0
+
+#   String field values are truncated to this length when recorded in the index.
+FIELD_VALUE_MAX = 256
+
+#   Maximum number of values in a field value condition
+FIELD_VALUES_MAX = 256
+
+INDEX_SCHEMA    = (
+    [ """CREATE TABLE entities
+        ( type_dir      TEXT NOT NULL
+        , entity_id     TEXT NOT NULL
+        , type_id       TEXT
+        , label         TEXT
+        , entity_values TEXT NOT NULL
+        , file_version  TEXT
+        , PRIMARY KEY (type_dir, entity_id)
+        )"""
+    , """CREATE TABLE dirs
+        ( dir           TEXT NOT NULL PRIMARY KEY
+        , mtime         REAL
+        )"""
+    , """CREATE TABLE terms
+        ( term          TEXT NOT NULL
+        , type_dir      TEXT NOT NULL
+        , entity_id     TEXT NOT NULL
+        )"""
+    , "CREATE INDEX terms_term ON terms (type_dir, term)"
+    , "CREATE INDEX terms_entity ON terms (type_dir, entity_id)"
+    , """CREATE TABLE field_values
+        ( type_dir      TEXT NOT NULL
+        , entity_id     TEXT NOT NULL
+        , field_id      TEXT NOT NULL
+        , value         TEXT
+        , num_value     REAL
+        )"""
+    , "CREATE INDEX field_values_value ON field_values (type_dir, field_id, value)"
+    , "CREATE INDEX field_values_number ON field_values (type_dir, field_id, num_value)"
+    , "CREATE INDEX field_values_entity ON field_values (type_dir, entity_id)"
+    , """CREATE TABLE generations
+        ( key           TEXT NOT NULL PRIMARY KEY
+        , generation    INTEGER NOT NULL
+        )"""
+    , """CREATE TABLE index_info
+        ( name          TEXT NOT NULL PRIMARY KEY
+        , value
+        )"""
+    ])
+
+WORD_RE         = re.compile(r"\w+", re.UNICODE)
+
+#   Index connections, held for each thread and keyed by index file name:
+#   each value is a pair of connection and index file inode number.
+_connections    = threading.local()
+
+#   Generation counters of entity directories whose files have been checked by 
+#   the current process, keyed by index file name and directory.
+_checked_generations = {}
+
+#   -------------------------------------------------------------------------------------------
+#
+#   Search term functions
+#
+#   -------------------------------------------------------------------------------------------
+
+def search_terms(search):
+    """
+    Returns a list of search terms (lower case words) from a supplied search string.
+
+    >>> search_terms(u"Some  search-string")
+    [u'some', u'search', u'string']
+    >>> search_terms("--")
+    []
+    """
+    return WORD_RE.findall(search.lower())
+
+def entity_terms(values):
+    """
+    Returns a set of indexed terms for the supplied entity values.  Terms are 
+    the words that appear in string values of the entity.
+
+    >>> sorted(entity_terms({ 'p:a': 'Entity one', 'p:b': ['not', 'indexed'], 'p:c': 'ONE two' }))
+    ['entity', 'one', 'two']
+    """
+    terms = set()
+    for val in values.itervalues():
+        if isinstance(val, (str, unicode)):
+            terms.update(search_terms(val))
+    return terms
+
+def entity_matches_terms(values, terms):
+    """
+    Returns True if every one of the supplied search terms is a prefix of 
+    some term of the supplied entity values.
+
+    >>> e = { 'p:a': 'Entity one', 'p:b': 'Two' }
+    >>> entity_matches_terms(e, ['ent', 'two'])
+    True
+    >>> entity_matches_terms(e, ['one', 'three'])
+    False
+    >>> entity_matches_terms(e, ['tity'])
+    False
+    """
+    eterms = entity_terms(values)
+    for t in terms:
+        if not any( et.startswith(t) for et in eterms ):
+            return False
+    return True
+
+def number_value(val):
+    """
+    Returns the numeric value of a number, or of a string that represents a 
+    number, as a float, or None if the supplied value is not a number.
+
+    >>> number_value(3)
+    3.0
+    >>> number_value(" -2.5 ")
+    -2.5
+    >>> number_value("2015-01-01") is None
+    True
+    >>> number_value(True) is None
+    True
+    >>> number_value("nan") is None
+    True
+    """
+    if isinstance(val, bool):
+        return None
+    if isinstance(val, (int, long, float)):
+        num = float(val)
+    elif isinstance(val, (str, unicode)):
+        try:
+            num = float(val)
+        except ValueError:
+            return None
+    else:
+        return None
+    if num != num or num in (float("inf"), float("-inf")):
+        return None
+    return num
+
+def entity_field_values(values):
+    """
+    Returns a list of (field_id, value, num_value) tuples recorded in the index for 
+    the supplied entity values.  
+    
+    A tuple is recorded for each string value, with the string (truncated to 
+    FIELD_VALUE_MAX characters) and its numeric value, if any, and for each 
+    string in a list value.  A tuple with value None is recorded for each field 
+    with a value that is not a string, so that such fields are distinguished 
+    from fields that are not present, with the numeric value of a number.  
+    Fields with empty values are not recorded.
+
+    >>> sorted(entity_field_values({ 'p:a': 'one', 'p:b': ['two', 'three', {}], 'p:c': '', 'p:d': 1, 'p:e': '2' }))
+    [('p:a', 'one', None), ('p:b', None, None), ('p:b', 'three', None), ('p:b', 'two', None), ('p:d', None, 1.0), ('p:e', '2', 2.0)]
+    """
+    fvals = []
+    for (field_id, val) in values.iteritems():
+        if val is None or (isinstance(val, (str, unicode, list, dict)) and not val):
+            continue
+        if isinstance(val, (str, unicode)):
+            fvals.append((field_id, val[:FIELD_VALUE_MAX], number_value(val)))
+            continue
+        fvals.append((field_id, None, number_value(val)))
+        if isinstance(val, list):
+            fvals.extend(
+                (field_id, v, None) for v in set(
+                    v[:FIELD_VALUE_MAX] for v in val if isinstance(v, (str, unicode)) and v
+                    )
+                )
+    return fvals
+
+def condition_sql(type_dir, condition):
+    """
+    Returns an SQL expression and parameter list for a field value condition
+    applied to entities in the indicated directory, or None if the condition 
+    cannot be applied.
+
+    The expression is satisfied by every entity whose stored values satisfy 
+    the condition, but may also be satisfied by some entities that do not.
+    (Conditions on string values are applied to the truncated values.)
+    """
+    (field_id, op, operand) = condition
+    if op in ("in", "in_or_missing"):
+        if len(operand) > FIELD_VALUES_MAX:
+            return None
+        values = list(set( v[:FIELD_VALUE_MAX] for v in operand ))
+        match  = ("value IN (%s)"%(", ".join("?"*len(values))) if values else "0", values)
+        if op == "in_or_missing":
+            match = ("value IS NULL OR "+match[0], match[1])
+    elif op == "startswith":
+        prefix = operand[:FIELD_VALUE_MAX]
+        if not prefix:
+            return None
+        match  = ("value >= ? AND value < ?", [prefix, prefix[:-1]+unichr(ord(prefix[-1])+1)])
+    elif op in ("<", "<=", ">", ">="):
+        if isinstance(operand, float):
+            match = ("num_value %s ?"%(op,), [operand])
+        else:
+            # Numeric values are not compared with strings.  Truncated values are
+            # compared with the truncated operand, so strict comparisons must 
+            # allow equality.
+            match = (
+                "num_value IS NULL AND value %s= ?"%(op[0],), 
+                [operand[:FIELD_VALUE_MAX]]
+                )
+    else:
+        return None
+    select = (
+        "entity_id IN (SELECT entity_id FROM field_values"+
+        " WHERE type_dir = ? AND field_id = ? AND (%s))"%(match[0],)
+        )
+    if op == "in_or_missing":
+        return (
+            "(entity_id NOT IN (SELECT entity_id FROM field_values"+
+            " WHERE type_dir = ? AND field_id = ?) OR "+select+")",
+            [type_dir, field_id, type_dir, field_id] + match[1]
+            )
+    return (select, [type_dir, field_id] + match[1])
+
+#   -------------------------------------------------------------------------------------------
+#
+#   EntityIndex
+#
+#   -------------------------------------------------------------------------------------------
+
+class EntityIndex(object):
+    """
+    Index of entities stored within a given base directory (i.e. a collection).
+
+    Directories are recorded relative to the base directory, so the index
+    remains valid if the collection data is moved or copied elsewhere.
+    """
+
+    def __init__(self, basedir):
+        """
+        Initialize an entity index object.  The index file is not accessed
+        until it is needed.
+
+        basedir     is the base directory of the collection whose entities
+                    are indexed.
+        """
+        self._basedir   = os.path.normpath(basedir)
+        self._indexpath = os.path.join(self._basedir, layout.COLL_INDEX_FILE)
+        return
+
+    def __repr__(self):
+        return "EntityIndex: %s"%(self._indexpath)
+
+    # Index access functions
+
+    def entity_values(self, parent, cls, terms=None, conditions=None):
+        """
+        Returns a list of (entity_id, values) pairs for entities of a given class
+        that are stored in the main (not alternative) child directory of the
+        supplied parent.  The values returned are as stored in the entity file.
+
+        If search terms are supplied, only entities for which every search term
+        is a prefix of a word appearing in the entity's values are returned.
+
+        If field value conditions are supplied, only entities whose stored values
+        may satisfy every condition are returned.  Each condition is a tuple
+        (field_id, op, operand), where op is one of:
+
+            "in"                the field has one of the string values in the operand
+                                list, or contains one in a list value.
+            "in_or_missing"     as "in", or the field is absent or empty, or has a 
+                                value that is not a string.
+            "startswith"        the field has a string value starting with the operand.
+            "<", "<=", ">", ">=" the field value compares with the operand as 
+                                indicated:  numerically if the operand is a float, 
+                                otherwise as strings.
+
+        (See `EntitySelector.index_conditions`.)
+
+        Returns None if the child directory is not covered by the index, or the
+        index cannot be used, in which case the caller should scan for entities.
+
+        parent      is the parent entity whose children are enumerated.
+        cls         is a subclass of Entity indicating the type of children to
+                    be enumerated.
+        terms       is a list of search terms, as returned by `search_terms`, or None.
+        conditions  is a list of field value conditions, or None.
+        """
+        rows = self._query_entities(parent, cls, "entity_id, entity_values", terms, conditions)
+        if rows is None:
+            return None
+        return [ (eid, json.loads(v)) for (eid, v) in rows ]
+
+    def entity_ids(self, parent, cls):
+        """
+        Returns a list of entity ids for entities of a given class that are
+        stored in the main (not alternative) child directory of the supplied
+        parent, or None if the index cannot be used.  Entity values are not
+        retrieved from the index.
+        """
+        rows = self._query_entities(parent, cls, "entity_id", None, refresh=False)
+        if rows is None:
+            return None
+        return [ eid for (eid,) in rows ]
+
+    def _query_entities(self, parent, cls, columns, terms, conditions=None, refresh=True):
+        """
+        Returns a list of rows containing the indicated columns for entities of a 
+        given class that are stored in the main child directory of the supplied 
+        parent and match any supplied search terms and field value conditions, 
+        or None if the index cannot be used.
+
+        If `refresh` is True, and the directory has been updated since its entity
+        files were last checked by the current process, index entries for entities
+        whose files have changed are first updated from the entity files.
+        """
+        childdir, _ = parent._child_dirs(cls, None)
+        reldir      = self._reldir(childdir)
+        if reldir is None:
+            return None
+        try:
+            conn = self._connect()
+            with conn:
+                mtime = self._dir_mtime(childdir)
+                if mtime is None:
+                    if self._remove_dir(conn, reldir):
+                        self._next_generation(conn, os.path.dirname(reldir), removed=reldir)
+                    return []
+                if mtime != self._get_dir_mtime(conn, reldir):
+                    self._scan_dir(conn, parent, cls, childdir, reldir, mtime)
+                if refresh and not self._is_checked(conn, reldir):
+                    self._refresh_dir(conn, parent, cls, reldir)
+                query  = "SELECT %s FROM entities WHERE type_dir = ?"%(columns,)
+                params = [reldir]
+                for t in (terms or []):
+                    query  += (
+                        " AND entity_id IN (SELECT entity_id FROM terms"+
+                        " WHERE type_dir = ? AND term >= ? AND term < ?)"
+                        )
+                    params += [reldir, t, t[:-1]+unichr(ord(t[-1])+1)]
+                for c in (conditions or []):
+                    csql = condition_sql(reldir, c)
+                    if csql:
+                        query  += " AND "+csql[0]
+                        params += csql[1]
+                rows = conn.execute(query, params).fetchall()
+        except sqlite3.Error, e:
+            log.warning("EntityIndex._query_entities: %s, %s"%(self._indexpath, e))
+            return None
+        return rows
+
+    def get_generation(self, dirpath=None):
+        """
+        Returns the generation counter for the indicated directory, or for all 
+        entities in the index, or None if the index cannot be used.  The value
+        returned is increased whenever an entity in or below the directory is 
+        saved or removed.
+
+        dirpath     is a directory containing entities (e.g. as returned by 
+                    `_child_dirs`), or a directory containing such directories,
+                    or None to obtain the generation for the entire collection.
+        """
+        key = "" if dirpath is None else self._reldir(dirpath)
+        if key is None:
+            return None
+        try:
+            conn = self._connect()
+            g = self._get_generation(conn, key)
+        except sqlite3.Error, e:
+            log.warning("EntityIndex.get_generation: %s, %s"%(self._indexpath, e))
+            return None
+        return g
+
+    # Index update functions
+
+    def entities_changed(self, dirpath):
+        """
+        Note a change to entities in the indicated directory that is not otherwise
+        recorded in the index (e.g. to the collection metadata), so that the
+        generation counters for the directory and the collection are increased.
+        """
+        reldir = self._reldir(dirpath)
+        if reldir is None:
+            return
+        try:
+            conn = self._connect()
+            with conn:
+                self._next_generation(conn, reldir)
+        except sqlite3.Error, e:
+            log.error("EntityIndex.entities_changed: %s, %s"%(self._indexpath, e))
+            self.rebuild()
+        return
+
+    def save_entity(self, entitydir, values, version=None):
+        """
+        Record saved values for an entity.
+
+        entitydir   is the directory in which the entity is stored.
+        values      are the entity values as written to the entity file.
+        version     is the version of the entity file as written (see 
+                    `entitycache.file_version`), or None, in which case the
+                    entity is re-read when its directory is next accessed.
+        """
+        reldir = self._reldir(entitydir)
+        if reldir is None:
+            return
+        (type_dir, entity_id) = os.path.split(reldir)
+        try:
+            conn = self._connect()
+            with conn:
+                existing = conn.execute(
+                    "SELECT 1 FROM entities WHERE type_dir = ? AND entity_id = ?",
+                    (type_dir, entity_id)
+                    ).fetchone()
+                self._put_entity(conn, type_dir, entity_id, values, version)
+                self._next_generation(conn, type_dir)
+                if not existing:
+                    # Directory content has changed: re-check on next access
+                    self._set_dir_mtime(conn, type_dir, None)
+        except sqlite3.Error, e:
+            log.error("EntityIndex.save_entity: %s, %s"%(self._indexpath, e))
+            self.rebuild()
+        return
+
+    def remove_entity(self, entitydir):
+        """
+        Remove an entity, and any entities stored beneath it, from the index.
+
+        entitydir   is the directory in which the removed entity was stored.
+        """
+        reldir = self._reldir(entitydir)
+        if reldir is None:
+            return
+        (type_dir, entity_id) = os.path.split(reldir)
+        try:
+            conn = self._connect()
+            with conn:
+                self._del_entity(conn, type_dir, entity_id)
+                self._remove_dir(conn, reldir)
+                self._next_generation(conn, type_dir, removed=reldir)
+                self._set_dir_mtime(conn, type_dir, None)
+        except sqlite3.Error, e:
+            log.error("EntityIndex.remove_entity: %s, %s"%(self._indexpath, e))
+            self.rebuild()
+        return
+
+    def rebuild(self):
+        """
+        Discard the index content.  The index is subsequently repopulated from
+        the stored entity files as each directory of entities is accessed.
+        """
+        for key in _checked_generations.keys():
+            if key[0] == self._indexpath:
+                _checked_generations.pop(key, None)
+        try:
+            os.remove(self._indexpath)
+        except OSError, e:
+            if e.errno != errno.ENOENT:
+                log.error("EntityIndex.rebuild: %s, %s"%(self._indexpath, e))
+        return
+
+    # Helper functions
+
+    def _reldir(self, path):
+        """
+        Returns directory path relative to the index base directory, or None if
+        the supplied path is not within the base directory.
+        """
+        path = os.path.normpath(path)
+        if not path.startswith(self._basedir+os.sep):
+            return None
+        return path[len(self._basedir)+1:]
+
+    def _connect(self):
+        """
+        Returns a connection to the index database, (re)creating the index tables 
+        if needed.  A connection is opened once for each thread, and is re-opened
+        if the index file is removed or replaced.
+        """
+        conns = _connections.__dict__.setdefault("conns", {})
+        (conn, ino) = conns.get(self._indexpath, (None, None))
+        if conn:
+            if ino == self._index_ino():
+                return conn
+            conn.close()
+            del conns[self._indexpath]
+        util.ensure_dir(os.path.dirname(self._indexpath))
+        conn = sqlite3.connect(self._indexpath, timeout=30)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != INDEX_VERSION:
+            with conn:
+                for (table,) in conn.execute(
+                        "SELECT name FROM sqlite_master WHERE type = 'table'"
+                        ).fetchall():
+                    conn.execute("DROP TABLE %s"%(table,))
+                for stmt in INDEX_SCHEMA:
+                    conn.execute(stmt)
+                conn.execute(
+                    "INSERT INTO index_info (name, value) VALUES ('generation_base', ?)",
+                    (int(time.time()*1000),)
+                    )
+                conn.execute("PRAGMA user_version = %d"%(INDEX_VERSION,))
+        conns[self._indexpath] = (conn, self._index_ino())
+        return conn
+
+    def _index_ino(self):
+        """
+        Returns the device and inode numbers of the index file, or None if it does 
+        not exist.  While a connection is open, the inode of the file to which it
+        is connected cannot be re-used, even if the file is removed.
+        """
+        try:
+            st = os.stat(self._indexpath)
+            return (st.st_dev, st.st_ino)
+        except OSError, e:
+            if e.errno != errno.ENOENT:
+                raise
+        return None
+
+    def _get_generation(self, conn, key):
+        r = conn.execute(
+            "SELECT generation FROM generations WHERE key = ?", (key,)
+            ).fetchone()
+        if r is None:
+            r = conn.execute(
+                "SELECT value FROM index_info WHERE name = 'generation_base'"
+                ).fetchone()
+        return r and r[0]
+
+    def _is_checked(self, conn, reldir):
+        """
+        Returns True if the entity files of the indicated directory have been 
+        checked by the current process since the directory was last updated.
+        """
+        checked = _checked_generations.get((self._indexpath, reldir), None)
+        return checked is not None and checked == self._get_generation(conn, reldir)
+
+    def _set_checked(self, conn, reldir):
+        """
+        Note that the entity files of the indicated directory have been checked.
+        """
+        _checked_generations[(self._indexpath, reldir)] = self._get_generation(conn, reldir)
+        return
+
+    def _dir_mtime(self, path):
+        """
+        Returns modification time of directory, or None if it does not exist.
+        """
+        try:
+            return os.stat(path).st_mtime
+        except OSError, e:
+            if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                raise
+        return None
+
+    def _get_dir_mtime(self, conn, reldir):
+        r = conn.execute("SELECT mtime FROM dirs WHERE dir = ?", (reldir,)).fetchone()
+        return r and r[0]
+
+    def _set_dir_mtime(self, conn, reldir, mtime):
+        if mtime is not None and mtime > time.time() - MTIME_SETTLE:
+            mtime = None
+        if mtime == self._get_dir_mtime(conn, reldir):
+            # Leave index file unchanged when nothing has changed
+            return
+        conn.execute(
+            "INSERT OR REPLACE INTO dirs (dir, mtime) VALUES (?, ?)",
+            (reldir, mtime)
+            )
+        return
+
+    def _remove_dir(self, conn, reldir):
+        """
+        Remove all index entries for entities in or below a given directory.
+
+        Returns True if any entries were removed.
+        """
+        prefix  = reldir+os.sep
+        removed = 0
+        for table in ("entities", "terms", "field_values"):
+            removed += conn.execute(
+                "DELETE FROM %s WHERE type_dir = ? OR substr(type_dir, 1, ?) = ?"%(table,),
+                (reldir, len(prefix), prefix)
+                ).rowcount
+        removed += conn.execute(
+            "DELETE FROM dirs WHERE dir = ? OR substr(dir, 1, ?) = ?",
+            (reldir, len(prefix), prefix)
+            ).rowcount
+        return removed > 0
+
+    def _next_generation(self, conn, reldir, removed=None):
+        """
+        Increase the generation counters for the indicated directory, for each 
+        directory that contains it, and for the collection.
+
+        removed     if supplied, is a removed directory, for which any existing 
+                    counters for directories in or below it are also increased.
+
+        Updates made by the current process do not cause the directory's entity 
+        files to be checked again.
+        """
+        checked = self._is_checked(conn, reldir)
+        keys = [""]
+        path = ""
+        for d in (reldir.split(os.sep) if reldir else []):
+            path = os.path.join(path, d)
+            keys.append(path)
+        conn.executemany(
+            "INSERT OR IGNORE INTO generations (key, generation) "+
+            "SELECT ?, value FROM index_info WHERE name = 'generation_base'",
+            [ (k,) for k in keys ]
+            )
+        conn.executemany(
+            "UPDATE generations SET generation = generation + 1 WHERE key = ?",
+            [ (k,) for k in keys ]
+            )
+        if removed is not None:
+            prefix = removed+os.sep
+            conn.execute(
+                "UPDATE generations SET generation = generation + 1 "+
+                "WHERE key = ? OR substr(key, 1, ?) = ?",
+                (removed, len(prefix), prefix)
+                )
+        if checked:
+            self._set_checked(conn, reldir)
+        return
+
+    def _put_entity(self, conn, type_dir, entity_id, values, version):
+        def string_value(field_id):
+            v = values.get(field_id, None)
+            return v if isinstance(v, (str, unicode)) else None
+        conn.execute(
+            "INSERT OR REPLACE INTO entities "+
+            "(type_dir, entity_id, type_id, label, entity_values, file_version) "+
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ( type_dir, entity_id
+            , string_value(ANNAL.CURIE.type_id)
+            , string_value(RDFS.CURIE.label)
+            , json.dumps(values)
+            , version
+            ))
+        conn.execute(
+            "DELETE FROM terms WHERE type_dir = ? AND entity_id = ?",
+            (type_dir, entity_id)
+            )
+        conn.executemany(
+            "INSERT INTO terms (term, type_dir, entity_id) VALUES (?, ?, ?)",
+            [ (t, type_dir, entity_id) for t in entity_terms(values) ]
+            )
+        conn.execute(
+            "DELETE FROM field_values WHERE type_dir = ? AND entity_id = ?",
+            (type_dir, entity_id)
+            )
+        conn.executemany(
+            "INSERT INTO field_values (type_dir, entity_id, field_id, value, num_value) "+
+            "VALUES (?, ?, ?, ?, ?)",
+            [ (type_dir, entity_id, f, v, n) for (f, v, n) in entity_field_values(values) ]
+            )
+        return
+
+    def _del_entity(self, conn, type_dir, entity_id):
+        """
+        Remove index entries for an entity.
+
+        Returns True if the entity was recorded in the index.
+        """
+        removed = 0
+        for table in ("entities", "terms", "field_values"):
+            removed += conn.execute(
+                "DELETE FROM %s WHERE type_dir = ? AND entity_id = ?"%(table,),
+                (type_dir, entity_id)
+                ).rowcount
+        return removed > 0
+
+    def _scan_dir(self, conn, parent, cls, childdir, reldir, mtime):
+        """
+        Bring index entries for a directory into line with the directory content.
+        Entities already in the index are not re-read (see `_refresh_dir`).
+        """
+        log.debug("EntityIndex._scan_dir: %s"%(childdir))
+        found   = set( f for f in os.listdir(childdir) if util.valid_id(f) )
+        indexed = self._get_file_versions(conn, reldir)
+        removed = set(indexed) - found
+        for eid in removed:
+            self._del_entity(conn, reldir, eid)
+        added   = self._load_entities(conn, parent, cls, reldir, 
+            [ eid for eid in found if eid not in indexed ]
+            )
+        if added or removed:
+            # Entities added or removed by other means
+            self._next_generation(conn, reldir)
+        self._set_dir_mtime(conn, reldir, mtime)
+        return
+
+    def _refresh_dir(self, conn, parent, cls, reldir):
+        """
+        Re-read index entries for entities in a directory whose files have changed.
+        """
+        log.debug("EntityIndex._refresh_dir: %s"%(reldir))
+        indexed = self._get_file_versions(conn, reldir)
+        if self._reload_changed(conn, parent, cls, reldir, indexed):
+            # Entities updated by other means
+            self._next_generation(conn, reldir)
+        self._set_checked(conn, reldir)
+        return
+
+    def _get_file_versions(self, conn, reldir):
+        """
+        Returns a dictionary of file versions recorded for entities in a directory,
+        keyed by entity id.
+        """
+        return dict(conn.execute(
+            "SELECT entity_id, file_version FROM entities WHERE type_dir = ?", (reldir,)
+            ))
+
+    def _reload_changed(self, conn, parent, cls, reldir, indexed):
+        """
+        Re-read entities whose file versions differ from those recorded in the index.
+
+        Returns True if any entities are updated.
+        """
+        changed = [ eid for (eid, v) in indexed.iteritems()
+                    if v is None or v != file_version(file_status(cls.path(parent, eid))) 
+                  ]
+        return self._load_entities(conn, parent, cls, reldir, changed)
+
+    def _load_entities(self, conn, parent, cls, reldir, entity_ids):
+        """
+        Read and record values for the indicated entities in a directory.  Entities
+        that cannot be read are removed from the index.
+
+        Returns True if any index entries are updated.
+        """
+        def load_values(eid):
+            e = cls._child_init(parent, eid)
+            v = e._load_values()
+            return (eid, v, e.get_version())
+        updated = False
+        for (eid, v, version) in load_concurrently(load_values, sorted(entity_ids)):
+            if v:
+                self._put_entity(conn, reldir, eid, v, version)
+                updated = True
+            elif self._del_entity(conn, reldir, eid):
+                updated = True
+        return updated
+
+# End.
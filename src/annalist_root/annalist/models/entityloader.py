@@ -0,0 +1,59 @@
+"""
+Concurrent reading of entities from Annalist storage.
+
+Reading many entity files one after another leaves the storage and processor 
+mostly idle, especially when storage latency is high (e.g. on a network 
+filesystem).  This module provides a bounded pool of threads that is used to 
+read and parse entity files concurrently, returning results in a deterministic 
+order.
+"""
+
+__author__      = "Graham Klyne (GK@ACM.ORG)"
+__copyright__   = "Copyright 2014, G. Klyne"
+__license__     = "MIT (http://opensource.org/licenses/MIT)"
+
+import threading
+from multiprocessing.pool       import ThreadPool
+
+import logging
+log = logging.getLogger(__name__)
+
+from django.conf                import settings
+
+_load_pool      = None
+_load_pool_lock = threading.Lock()
+
+def entity_load_pool():
+    """
+    Returns a pool of threads used to read entities concurrently, creating it 
+    when first used, or None if entities are to be read sequentially.
+
+    The number of threads is given by setting `ENTITY_LOAD_THREADS`.
+    """
+    global _load_pool
+    with _load_pool_lock:
+        threads = getattr(settings, "ENTITY_LOAD_THREADS", 8)
+        if _load_pool is None and threads > 1:
+            log.debug("entity_load_pool: %d threads"%(threads,))
+            _load_pool = ThreadPool(threads)
+    return _load_pool
+
+def load_concurrently(load_fn, items):
+    """
+    Returns an iterator over the results of applying a supplied function to
+    each of a list of items, using the entity load thread pool.  Results are
+    returned in the same order as the supplied items.
+
+    load_fn     is a function that reads a single entity (or entity values).
+    items       is a list or iterator of values to which the function is applied.
+
+    >>> list(load_concurrently(lambda i: i*i, range(20))) == [ i*i for i in range(20) ]
+    True
+    """
+    items = list(items)
+    pool  = entity_load_pool()
+    if pool is None or len(items) < 2:
+        return ( load_fn(i) for i in items )
+    return pool.imap(load_fn, items, chunksize=8)
+
+# End.
@@ -0,0 +1,133 @@
+"""
+Lightweight reference to a stored entity, whose values are read only when needed.
+
+An entity reference carries the type id and entity id of an entity, and can
+be used in place of an entity when entities are selected and ordered by their
+identifiers alone, e.g. when sorting a long list of entities to find the entries
+displayed on one page.  The entity values are read the first time any other
+property of the entity is accessed.
+"""
+
+__author__      = "Graham Klyne (GK@ACM.ORG)"
+__copyright__   = "Copyright 2014, G. Klyne"
+__license__     = "MIT (http://opensource.org/licenses/MIT)"
+
+import itertools
+
+import logging
+log = logging.getLogger(__name__)
+
+from annalist.identifiers       import ANNAL
+
+#   -------------------------------------------------------------------------------------------
+#
+#   EntityRef
+#
+#   -------------------------------------------------------------------------------------------
+
+class EntityRef(object):
+    """
+    Reference to an entity of a given type, presenting a (read-only) subset of the
+    entity interface used for selecting and ordering entities.
+    """
+
+    __slots__ = ("_typeinfo", "_entityid", "_entity", "_loaded")
+
+    def __init__(self, typeinfo, entity_id):
+        """
+        Initialize a new entity reference.
+
+        typeinfo    is an EntityTypeInfo object for the type of the referenced entity.
+        entity_id   is the local identifier (slug) of the referenced entity.
+        """
+        self._typeinfo = typeinfo
+        self._entityid = entity_id
+        self._entity   = None
+        self._loaded   = False
+        return
+
+    def __repr__(self):
+        return "EntityRef: type_id %s, entity_id %s"%(self.get_type_id(), self._entityid)
+
+    def get_id(self):
+        return self._entityid
+
+    def get_type_id(self):
+        return self._typeinfo.type_id
+
+    def get_path(self):
+        """
+        Return path of the (main) file that holds the referenced entity.
+        """
+        return self._typeinfo.entityclass.path(self._typeinfo.entityparent, self._entityid)
+
+    def is_loaded(self):
+        """
+        Returns True if values have been read for the referenced entity.
+        """
+        return self._loaded
+
+    def get_entity(self):
+        """
+        Returns the referenced entity with alias fields instantiated, reading
+        it if needed, or None if the entity does not exist.
+        """
+        if not self._loaded:
+            log.debug("EntityRef.get_entity: %s/%s"%(self.get_type_id(), self._entityid))
+            self._entity = self._typeinfo.get_entity_with_aliases(self._entityid)
+            self._loaded = True
+        return self._entity
+
+    # Entity value access: identifier values are returned without reading the entity
+
+    def get(self, key, default):
+        """
+        Equivalent to dict.get() function
+        """
+        if key == ANNAL.CURIE.id:
+            return self._entityid
+        if key == ANNAL.CURIE.type_id:
+            return self.get_type_id()
+        e = self.get_entity()
+        return e.get(key, default) if e else default
+
+    def __getitem__(self, k):
+        v = self.get(k, KeyError)
+        if v is KeyError:
+            raise KeyError(k)
+        return v
+
+    def __contains__(self, k):
+        return self.get(k, KeyError) is not KeyError
+
+    def __iter__(self):
+        e = self.get_entity()
+        if e:
+            for k in e:
+                yield k
+        return
+
+#   -------------------------------------------------------------------------------------------
+#
+#   Helper functions
+#
+#   -------------------------------------------------------------------------------------------
+
+def load_entity_refs(entity_refs):
+    """
+    Reads the entities for a list of entity references, and returns a list 
+    of the entities (with None for any entity that does not exist), in the 
+    same order as the references.  
+
+    Consecutive references to entities of the same type are read concurrently.
+    """
+    entities = []
+    for (typeinfo, refs) in itertools.groupby(entity_refs, key=lambda ref: ref._typeinfo):
+        refs = list(refs)
+        for (ref, e) in zip(refs, typeinfo.load_many([ ref.get_id() for ref in refs ])):
+            ref._entity = e
+            ref._loaded = True
+            entities.append(e)
+    return entities
+
+# End.
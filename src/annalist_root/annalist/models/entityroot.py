@@ -29,6 +29,14 @@ from annalist               import util
 from annalist.exceptions    import Annalist_Error
 from annalist.identifiers   import ANNAL, RDF
 
+from annalist.models.entitycache import entity_value_cache, entity_dir_changes, entity_dir_cache
+from annalist.models.entitycache import file_status, file_version
+
+#   Entity fields whose values are supplied by `set_values` if they are not stored
+COMPUTED_FIELD_IDS = frozenset(
+    [ANNAL.CURIE.id, ANNAL.CURIE.type_id, ANNAL.CURIE.type, ANNAL.CURIE.url]
+    )
+
 #   -------------------------------------------------------------------------------------------
 #
 #   EntityRoot
@@ -71,6 +79,7 @@ class EntityRoot(object):
         self._entitydir     = entitydir if entitydir.endswith("/") else entitydir + "/"
         self._entityalturl  = None
         self._entityaltdir  = None
+        self._entityversion = None
         self._entityuseurl  = self._entityurl
         self._values        = None
         log.debug("EntityRoot.__init__: entity URI %s, entity dir %s"%(self._entityurl, self._entitydir))
@@ -91,6 +100,14 @@ class EntityRoot(object):
     def get_type_id(self):
         return self._entitytypeid
 
+    def get_version(self):
+        """
+        Returns a version string for the stored entity data from which the current 
+        entity values were read, or to which they were last saved, or None if the 
+        values have not been read from or saved to storage.
+        """
+        return self._entityversion
+
     def get_url(self, baseurl=""):
         """
         Get fully qualified URL referred to supplied base.
@@ -238,27 +255,46 @@ class EntityRoot(object):
         if not fullpath.startswith(os.path.join(settings.BASE_DATA_DIR, "annalist_site")):
             raise ValueError("Attempt to create entity file outside Annalist site tree")
         # Create directory (if needed) and save data
-        util.ensure_dir(body_dir)
         values = self._values.copy()
         values['@id']   = self._entityref
         values['@type'] = self._get_types(values.get('@type', None))
         # @TODO: is this next needed?  Put logic in set_values?
         if self._entityid:
             values[ANNAL.CURIE.id] = self._entityid
-        with open(fullpath, "wt") as entity_io:
-            json.dump(values, entity_io, indent=2, separators=(',', ': '))
+        with self._entity_update_lock():
+            util.ensure_dir(body_dir)
+            util.replace_file(fullpath, 
+                lambda entity_io: json.dump(values, entity_io, indent=2, separators=(',', ': ')),
+                durability=getattr(settings, "ENTITY_WRITE_DURABILITY", "file")
+                )
+            self._entityversion = file_version(file_status(fullpath))
+            entity_value_cache.invalidate(fullpath)
+            entity_dir_changes.entity_changed(self._entitydir)
+            index = self._entity_index()
+            if index:
+                index.save_entity(self._entitydir, values, self._entityversion)
         self._entityuseurl  = self._entityurl
         return
 
     def _load_values(self):
         """
         Read current entity from Annalist storage, and return entity body
+
+        Values read are cached, and re-used while the entity file is unchanged.
+        The version of the stored data is also noted (see `get_version`).
         """
         body_file = self._exists_path()
         if body_file:
+            status = file_status(body_file)
+            self._entityversion = file_version(status)
+            values = entity_value_cache.get(body_file, status)
+            if values is not None:
+                return values
             try:
                 with open(body_file, "r") as f:
-                    return json.load(util.strip_comments(f))
+                    values = json.load(util.strip_comments(f))
+                entity_value_cache.put(body_file, status, values)
+                return values
             except IOError, e:
                 if e.errno != errno.ENOENT:
                     raise
@@ -269,6 +305,33 @@ class EntityRoot(object):
                 return { "@error": body_file }
         return None
 
+    def _entity_index(self):
+        """
+        Returns an index in which the current entity is recorded, or None.
+        """
+        return None
+
+    def _child_index(self):
+        """
+        Returns an index in which children of the current entity are recorded,
+        or None if child entities are located by scanning their directories.
+        """
+        return None
+
+    def _entity_update_lock(self):
+        """
+        Returns a context manager that excludes other updates to the entity
+        while the body of a `with` statement is executed.
+        """
+        return util.no_lock()
+
+    def _child_update_lock(self):
+        """
+        Returns a context manager that excludes other updates to children of
+        the current entity while the body of a `with` statement is executed.
+        """
+        return util.no_lock()
+
     def _child_dirs(self, cls, altparent):
         """
         Returns a pair of directories that may contain child entities.
@@ -302,17 +365,35 @@ class EntityRoot(object):
         """
         coll_dir, site_dir = self._child_dirs(cls, altparent)
         assert "%" not in coll_dir, "_entitypath/_entityaltpath template variable interpolation may be in filename part only"
-        site_files = []
-        coll_files = []
-        if site_dir and os.path.isdir(site_dir):
-            site_files = os.listdir(site_dir)
-        if os.path.isdir(coll_dir):
-            coll_files = os.listdir(coll_dir)
-        for fil in [ f for f in site_files if f not in coll_files] + coll_files:
-            if util.valid_id(fil):
-                yield fil
+        coll_ids = [ f for (f, is_dir, _) in entity_dir_cache.scan(coll_dir, cls._entityfile) if is_dir ]
+        site_ids = []
+        if site_dir:
+            coll_set = set(coll_ids)
+            site_ids = (
+                [ f for (f, is_dir, _) in entity_dir_cache.scan(site_dir, cls._entityfile) 
+                    if is_dir and f not in coll_set 
+                ])
+        for fil in site_ids + coll_ids:
+            yield fil
         return
 
+    def _child_bodies(self, cls, altparent=None):
+        """
+        Returns a set of candidate child identifiers for which an entity body file 
+        is present, using the same directory scans as `_children`.
+
+        cls         is a subclass of Entity indicating the type of children to
+                    be located.
+        altparent   is an alternative parent entity to be checked using the class's
+                    alternate relative path, or None if only potential child IDs of the
+                    current entity are returned.
+        """
+        bodies = set()
+        for d in self._child_dirs(cls, altparent):
+            if d:
+                bodies.update( f for (f, _, has_body) in entity_dir_cache.scan(d, cls._entityfile) if has_body )
+        return bodies
+
     def __iter__(self):
         """
         Return entity value keys
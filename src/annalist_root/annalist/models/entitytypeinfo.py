@@ -23,6 +23,7 @@ from annalist.models.recordfield    import RecordField
 from annalist.models.recordenum     import RecordEnumFactory
 from annalist.models.recordtypedata import RecordTypeData
 from annalist.models.entitydata     import EntityData
+from annalist.models.entityloader   import load_concurrently
 
 ENTITY_MESSAGES = (
     { 'parent_heading':         message.RECORD_TYPE_ID
@@ -269,6 +270,15 @@ class EntityTypeInfo(object):
             log.warning("EntityTypeInfo.__init__: RecordType %s not found"%type_id)
         return
 
+    def get_generation(self):
+        """
+        Returns a generation counter that is increased whenever an entity of the
+        type described by the current object is created, updated or removed in 
+        the current collection, or None (see `Collection.get_generation`).
+        """
+        typedir, _ = self.entityparent._child_dirs(self.entityclass, None)
+        return self.entitycoll.get_generation(typedir)
+
     def parent_exists(self):
         """
         Test for existence of parent entity for the current type.
@@ -331,9 +341,8 @@ class EntityTypeInfo(object):
                 entity = self.entityclass(self.entityparent, entity_id)
                 entity_initial_values = self.get_initial_entity_values(entity_id)
                 entity.set_values(entity_initial_values)
-            elif self.entityclass.exists(
-                    self.entityparent, entity_id, altparent=self.entityaltparent
-                    ):
+            else:
+                # Returns None if entity does not exist
                 entity = self.entityclass.load(self.entityparent, entity_id, altparent=self.entityaltparent)
         return entity
 
@@ -348,8 +357,26 @@ class EntityTypeInfo(object):
         in the value returned.
         """
         entity = self.get_entity(entity_id, action=action)
-        # Fill in field aliases
-        if entity and ANNAL.CURIE.field_aliases in self.recordtype:
+        if entity:
+            self._fill_aliases(entity)
+        return entity
+
+    def load_many(self, entity_ids):
+        """
+        Iterate over entities of the current type with the supplied identifiers,
+        reading them concurrently (see `Entity.load_many`).  Field aliases defined 
+        in the associated record type are populated in the values returned.
+
+        Entities are returned in the same order as the supplied identifiers, with 
+        None for any identifier that is invalid or for which there is no entity.
+        """
+        return load_concurrently(self.get_entity_with_aliases, entity_ids)
+
+    def _fill_aliases(self, entity):
+        """
+        Populate field aliases defined in the associated record type.
+        """
+        if self.recordtype and ANNAL.CURIE.field_aliases in self.recordtype:
             for alias in self.recordtype[ANNAL.CURIE.field_aliases]:
                 tgt = alias[ANNAL.CURIE.alias_target]
                 src = alias[ANNAL.CURIE.alias_source]
@@ -357,12 +384,17 @@ class EntityTypeInfo(object):
                     entity[tgt] = entity.get(src, "")
         return entity
 
-    def enum_entity_ids(self, usealtparent=False):
+    def enum_entity_ids(self, usealtparent=False, user_perms=None):
         """
         Iterate over entity identifiers in collection with current type.
 
         usealtparent    is True if site-wide entities are to be included.
+        user_perms      if supplied, are user permissions that must allow listing 
+                        of entities of the current type for any ids to be returned.
         """
+        if (user_perms and 
+            self.permissions_map['list'] not in user_perms[ANNAL.CURIE.user_permissions]):
+            return
         altparent = self.entityaltparent if usealtparent else None
         if self.entityparent:
             for eid in self.entityparent.child_entity_ids(
@@ -373,21 +405,34 @@ class EntityTypeInfo(object):
             log.warning("EntityTypeInfo.enum_entity_ids: missing entityparent; type_id %s"%(self.type_id))
         return
 
-    def enum_entities(self, user_perms=None, usealtparent=False):
+    def enum_entities(self, user_perms=None, usealtparent=False, terms=None, conditions=None):
         """
         Iterate over entities in collection with current type.
         Returns entities with alias fields instantiated.
 
         usealtparent    is True if site-wide entities are to be included.
+        terms           if supplied, is a list of search terms that must each
+                        match the start of some word in a returned entity.
+        conditions      if supplied, is a list of field value conditions that may
+                        be used to exclude entities that cannot be selected (see
+                        `Entity.child_entities`).  Entities that do not satisfy the
+                        conditions may still be returned.
         """
         if (not user_perms or 
             self.permissions_map['list'] in user_perms[ANNAL.CURIE.user_permissions]):
             altparent = self.entityaltparent if usealtparent else None
+            if conditions and self.recordtype and ANNAL.CURIE.field_aliases in self.recordtype:
+                # Alias fields are not stored, so cannot be used to exclude entities
+                alias_targets = set(
+                    alias[ANNAL.CURIE.alias_target] 
+                    for alias in self.recordtype[ANNAL.CURIE.field_aliases]
+                    )
+                conditions = [ c for c in conditions if c[0] not in alias_targets ]
             if self.entityparent:
-                for eid in self.entityparent.child_entity_ids(
+                for e in self.entityparent.child_entities(
                         self.entityclass, 
-                        altparent=altparent):
-                    yield self.get_entity_with_aliases(eid)
+                        altparent=altparent, terms=terms, conditions=conditions):
+                    yield self._fill_aliases(e)
             else:
                 log.warning("EntityTypeInfo.enum_entities: missing entityparent; type_id %s"%(self.type_id))
         return
@@ -0,0 +1,97 @@
+"""
+Micro-benchmark for rendering field values using bound_field.
+
+This is not run as part of the normal test suite.  To run it:
+
+    python manage.py test --settings=annalist_site.settings.runtests \\
+        annalist.tests.benchmark_bound_field
+
+The time per cell is reported for (a) creating a `bound_field` value and
+reading the attributes used by a list cell template, and (b) rendering a
+cell using the field value view template.
+"""
+
+__author__      = "Graham Klyne (GK@ACM.ORG)"
+__copyright__   = "Copyright 2014, G. Klyne"
+__license__     = "MIT (http://opensource.org/licenses/MIT)"
+
+import sys
+import timeit
+
+import logging
+log = logging.getLogger(__name__)
+
+from django.test                                import TestCase
+from django.template                            import Context
+
+from annalist.views.fields.bound_field          import bound_field
+from annalist.views.fields.render_placement     import get_placement_classes
+from annalist.views.fields.render_utils         import get_colview_renderer
+
+#   -----------------------------------------------------------------------------
+#
+#   Test data
+#
+#   -----------------------------------------------------------------------------
+
+field_desc = (
+    { 'field_id':               "Entity_label"
+    , 'field_property_uri':     "rdfs:label"
+    , 'field_render_type':      "Text"
+    , 'field_placement':        get_placement_classes("small:0,12;medium:6,6")
+    , 'field_choice_links':     None
+    })
+
+entity_vals = (
+    { 'entity_id':              "entity1"
+    , 'entity_type_id':         "testtype"
+    , 'entity_link':            "/testsite/c/testcoll/d/testtype/entity1/"
+    , "rdfs:label":             "Entity <1> label"
+    })
+
+extra_vals = (
+    { 'request_url':            "/testsite/c/testcoll/l/"
+    , 'continuation_url':       "/testsite/c/testcoll/"
+    })
+
+#   -----------------------------------------------------------------------------
+#
+#   Benchmark
+#
+#   -----------------------------------------------------------------------------
+
+class BoundFieldBenchmark(TestCase):
+    """
+    Report the time taken to render list cells using bound_field values.
+    """
+
+    count = 10000
+
+    def report(self, label, seconds):
+        sys.stderr.write(
+            "\n%-40s %8.2f us/cell"%(label, seconds*1000000.0/self.count)
+            )
+        return
+
+    def test_bound_field_attributes(self):
+        def cell():
+            f = bound_field(field_desc, entity_vals, context_extra_values=extra_vals)
+            return (
+                f.field_placement, f.field_value, f.field_value, f.field_value,
+                f.entity_link_continuation
+                )
+        self.report("bound_field attribute access", timeit.timeit(cell, number=self.count))
+        return
+
+    def test_bound_field_render_cell(self):
+        renderer = get_colview_renderer("Text")
+        context  = Context({})
+        def cell():
+            f = bound_field(field_desc, entity_vals, context_extra_values=extra_vals)
+            with context.push(field=f):
+                return renderer.render(context)
+        self.assertIn("Entity &lt;1&gt; label", cell())
+        self.report("bound_field cell rendering", timeit.timeit(cell, number=self.count))
+        return
+
+# End.
@@ -812,6 +812,25 @@ class AuthorizationTest(AnnalistTestCase):
         self.assertEqual(self.delete_data_confirmed().status_code,  403)
         return
 
+    def test_user_permissions_updated(self):
+        self.login_user("user_view")
+        self.assertEqual(self.list_data().status_code,              200)
+        self.assertEqual(self.edit_data().status_code,              403)
+        # Update user permissions; cached permissions are discarded
+        AnnalistUser.create(self.testcoll, "user_view", 
+            annalistuser_create_values(
+                coll_id="testcoll", user_id="user_view",
+                user_name="Admin User",
+                user_uri="mailto:user_view@%s"%TestHost, 
+                user_permissions=["VIEW", "UPDATE"]
+                )
+            )
+        self.assertEqual(self.edit_data().status_code,              302)
+        # Remove user permissions; default permissions are used
+        AnnalistUser.remove(self.testcoll, "user_view")
+        self.assertEqual(self.edit_data().status_code,              403)
+        return
+
     # Test permissions effect on entity lists
 
     def test_list_all(self):
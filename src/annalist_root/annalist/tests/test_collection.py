@@ -9,6 +9,7 @@ __license__     = "MIT (http://opensource.org/licenses/MIT)"
 import os
 import json
 import unittest
+import threading
 
 import logging
 log = logging.getLogger(__name__)
@@ -20,12 +21,16 @@ from django.contrib.auth.models     import User
 from django.test                    import TestCase # cf. https://docs.djangoproject.com/en/dev/topics/testing/tools/#assertions
 from django.test.client             import Client
 
+from utils.SuppressLoggingContext   import SuppressLogging
+
 from annalist.identifiers           import RDF, RDFS, ANNAL
 from annalist                       import layout
 from annalist.models.site           import Site
 from annalist.models.collection     import Collection
 from annalist.models.annalistuser   import AnnalistUser
 from annalist.models.recordtype     import RecordType
+from annalist.models.recordtypedata import RecordTypeData
+from annalist.models.entitydata     import EntityData
 
 from annalist.views.collection      import CollectionEditView
 
@@ -61,7 +66,7 @@ from entity_testlistdata            import (
     recordlist_create_values, recordlist_read_values,
     )
 from entity_testentitydata          import (
-    entitydata_list_all_url
+    entitydata_list_all_url, entitydata_create_values
     )
 from entity_testsitedata            import (
     get_site_types, get_site_types_sorted,
@@ -232,6 +237,125 @@ class CollectionTest(AnnalistTestCase):
         self.assertTrue(RecordType.exists(self.testcoll, "Default_type", self.testsite))
         return
 
+    def _create_type_data(self, type_id, type_uri, entity_ids):
+        type_values = dict(recordtype_create_values("testcoll", type_id), **{ANNAL.CURIE.uri: type_uri})
+        self.testcoll.add_type(type_id, type_values)
+        typedata = RecordTypeData.create(self.testcoll, type_id, {})
+        for entity_id in entity_ids:
+            EntityData.create(typedata, entity_id, 
+                entitydata_create_values(entity_id, type_id=type_id, typeuri=type_uri)
+                )
+        return typedata
+
+    def _check_renamed_type_data(self, entity_ids):
+        self.assertFalse(RecordType.exists(self.testcoll, "type1"))
+        self.assertFalse(RecordTypeData.exists(self.testcoll, "type1"))
+        self.assertFalse(os.path.exists(self.testcoll._type_rename_journal()))
+        d2 = RecordTypeData.load(self.testcoll, "type2")
+        self.assertEqual(d2[ANNAL.CURIE.id], "type2")
+        self.assertEqual(set(d2.child_entity_ids(EntityData)), set(entity_ids))
+        for entity_id in entity_ids:
+            e = EntityData.load(d2, entity_id)
+            self.assertEqual(e[ANNAL.CURIE.type_id], "type2")
+            self.assertEqual(e["@type"], ["annal:EntityData", "test:type2"])
+        return
+
+    def test_rename_type(self):
+        self._create_type_data("type1", "test:type1", ["entity1", "entity2"])
+        self.testcoll.add_type("type2", dict(self.type2_add, **{ANNAL.CURIE.uri: "test:type2"}))
+        self.testcoll.rename_type("type1", "type2")
+        self._check_renamed_type_data(["entity1", "entity2"])
+        return
+
+    def test_rename_type_conflict(self):
+        # Existing entities of the new type are not replaced
+        self._create_type_data("type1", "test:type1", ["entity1", "entity2"])
+        d2 = RecordTypeData.create(self.testcoll, "type2", {})
+        e2 = EntityData.create(d2, "entity2", 
+            entitydata_create_values("entity2", type_id="type2", typeuri="test:type2")
+            )
+        e2[RDFS.CURIE.label] = "Existing entity2"
+        e2._save()
+        self.testcoll.add_type("type2", dict(self.type2_add, **{ANNAL.CURIE.uri: "test:type2"}))
+        with SuppressLogging(logging.WARNING):
+            not_moved = self.testcoll.rename_type("type1", "type2")
+        self.assertEqual(not_moved, ["entity2"])
+        self.assertFalse(os.path.exists(self.testcoll._type_rename_journal()))
+        self.assertEqual(set(d2.child_entity_ids(EntityData)), {"entity1", "entity2"})
+        self.assertEqual(EntityData.load(d2, "entity2")[RDFS.CURIE.label], "Existing entity2")
+        self.assertEqual(EntityData.load(d2, "entity1")[ANNAL.CURIE.type_id], "type2")
+        d1 = RecordTypeData.load(self.testcoll, "type1")
+        self.assertEqual(list(d1.child_entity_ids(EntityData)), ["entity2"])
+        self.assertTrue(RecordType.exists(self.testcoll, "type1"))
+        return
+
+    def test_rename_type_resume(self):
+        # Simulate crash after moving entity directory and updating one entity
+        d1 = self._create_type_data("type1", "test:type1", ["entity1", "entity2"])
+        self.testcoll.add_type("type2", dict(self.type2_add, **{ANNAL.CURIE.uri: "test:type2"}))
+        journal = (
+            { 'old_type_id': "type1", 'new_type_id': "type2"
+            , 'old_type_uri': "test:type1", 'new_type_uri': "test:type2"
+            })
+        with open(self.testcoll._type_rename_journal(), "w") as f:
+            json.dump(journal, f)
+        d2 = RecordTypeData(self.testcoll, "type2")
+        os.rename(d1._entitydir, d2._entitydir)
+        e1 = EntityData.load(d2, "entity1")
+        e1[ANNAL.CURIE.type_id] = "type2"
+        e1["@type"]             = ["annal:EntityData", "test:type2"]
+        e1._save()
+        # Rename is completed when the collection is next accessed
+        with SuppressLogging(logging.WARNING):
+            self.testcoll = Collection(self.testsite, "testcoll")
+        self._check_renamed_type_data(["entity1", "entity2"])
+        return
+
+    def test_entity_remove_update_lock(self):
+        # Entity removal waits for the collection entity update lock
+        d1 = self._create_type_data("type1", "test:type1", ["entity1"])
+        remover = threading.Thread(target=lambda: EntityData.remove(d1, "entity1"))
+        with self.testcoll.entity_update_lock():
+            remover.start()
+            remover.join(0.5)
+            self.assertTrue(remover.is_alive())
+            self.assertTrue(EntityData.exists(d1, "entity1"))
+        remover.join(10)
+        self.assertFalse(EntityData.exists(d1, "entity1"))
+        return
+
+    def test_rename_type_resume_locked(self):
+        # Collection access does not wait for a rename in progress
+        d1 = self._create_type_data("type1", "test:type1", ["entity1"])
+        self.testcoll.add_type("type2", dict(self.type2_add, **{ANNAL.CURIE.uri: "test:type2"}))
+        journal = (
+            { 'old_type_id': "type1", 'new_type_id': "type2"
+            , 'old_type_uri': "test:type1", 'new_type_uri': "test:type2"
+            })
+        with open(self.testcoll._type_rename_journal(), "w") as f:
+            json.dump(journal, f)
+        locked  = threading.Event()
+        release = threading.Event()
+        def hold_lock():
+            with self.testcoll.entity_update_lock():
+                locked.set()
+                release.wait(10)
+            return
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        try:
+            locked.wait(10)
+            Collection(self.testsite, "testcoll")
+            self.assertTrue(os.path.exists(self.testcoll._type_rename_journal()))
+            self.assertTrue(RecordTypeData.exists(self.testcoll, "type1"))
+        finally:
+            release.set()
+            holder.join()
+        with SuppressLogging(logging.WARNING):
+            self.testcoll = Collection(self.testsite, "testcoll")
+        self._check_renamed_type_data(["entity1"])
+        return
+
     # Record views
 
     def test_add_view(self):
@@ -16,7 +16,10 @@ from django.conf                import settings
 from django.contrib.auth.models import User
 from django.test                import TestCase # cf. https://docs.djangoproject.com/en/dev/topics/testing/tools/#assertions
 from django.test.client         import Client
+from django.test.utils          import override_settings
 
+from annalist                   import util
+from annalist                   import layout
 from annalist.identifiers       import ANNAL
 from annalist.models.entity     import EntityRoot, Entity
 
@@ -197,6 +200,27 @@ class EntityRootTest(TestCase):
         self.assertEqual(v2, test_values_returned)
         return
 
+    def test_entityroot_save_replace(self):
+        e = TestEntityRootType(TestBaseUri, TestBaseDir)
+        e.set_id("testId")
+        for durability in ("none", "file", "dir"):
+            with override_settings(ENTITY_WRITE_DURABILITY=durability):
+                e.set_values({ 'title': durability })
+                e._save()
+            self.assertEqual(e._load_values()['title'], durability)
+        # Failed write leaves original file unchanged
+        def write_partial(f):
+            f.write('{ "title": "partial')
+            raise IOError("write failed")
+        body_file = e._exists_path()
+        with self.assertRaises(IOError):
+            util.replace_file(body_file, write_partial)
+        self.assertEqual(e._load_values()['title'], "dir")
+        # No temporary files left behind
+        body_dir  = os.path.dirname(body_file)
+        self.assertEqual([ f for f in os.listdir(body_dir) if f.endswith(".tmp") ], [])
+        return
+
     def test_entityroot_exists(self):
         test_values = (
             { 'type':   'annal:EntityRoot'
@@ -436,6 +460,22 @@ class EntityTest(AnnalistTestCase):
         self.assertDictionaryMatch(v2, test_values2_returned)
         return
 
+    def test_entity_load_many(self):
+        r   = EntityRoot(TestBaseUri, TestBaseDir)
+        b   = TestEntityType.create(r, "testbase", {})
+        ids = [ "testid%02d"%i for i in range(20) ]
+        for eid in ids:
+            test_values = self.values_created(entity_type='test:EntityType', entity_title=eid)
+            TestEntityType.create(b, eid, test_values)
+        load_ids = list(reversed(ids))
+        load_ids.insert(5, "notexists")
+        es = list(TestEntityType.load_many(b, load_ids))
+        self.assertEqual(len(es), 21)
+        self.assertIsNone(es[5])
+        self.assertEqual([ e.get_id() for e in es if e ], list(reversed(ids)))
+        self.assertEqual([ e['title'] for e in es if e ], list(reversed(ids)))
+        return
+
     def test_entity_create_remove(self):
         test_values = self.values_created(entity_type='test:EntityType', entity_title='Name entity test')
         r = EntityRoot(TestBaseUri, TestBaseDir)
@@ -508,12 +548,40 @@ class EntityTest(AnnalistTestCase):
         eid = TestEntityType.allocate_new_id(r)
         self.assertEqual(eid, "00000001")
         self.assertFalse(TestEntityType.exists(r, eid))
-        eid = TestEntityType.allocate_new_id(r)
-        self.assertEqual(eid, "00000001")
         e = TestEntityType.create(r, eid, test_values)
         self.assertTrue(TestEntityType.exists(r, eid))
         eid = TestEntityType.allocate_new_id(r)
         self.assertEqual(eid, "00000002")
+        # Allocated identifier is not re-used if no entity is created
+        eid = TestEntityType.allocate_new_id(r)
+        self.assertEqual(eid, "00000003")
+        # Existing entity identifiers are skipped
+        e = TestEntityType.create(r, "00000004", test_values)
+        eid = TestEntityType.allocate_new_id(r)
+        self.assertEqual(eid, "00000005")
+        # Without counter file, continue from highest existing identifier
+        (d, _) = r._child_dirs(TestEntityType, None)
+        os.remove(os.path.join(d, layout.ENTITY_ID_COUNTER_FILE))
+        eid = TestEntityType.allocate_new_id(r)
+        self.assertEqual(eid, "00000005")
+        return
+
+    def test_entity_allocate_id_no_dir(self):
+        # Nothing is created when there is no entity directory
+        r = EntityRoot(TestBaseUri, TestBaseDir)
+        (d, _) = r._child_dirs(TestEntityTypeSub, None)
+        self.assertFalse(os.path.exists(d))
+        eid = TestEntityTypeSub.allocate_new_id(r)
+        self.assertEqual(eid, "00000001")
+        self.assertFalse(os.path.exists(d))
+        eid = TestEntityTypeSub.allocate_new_id(r)
+        self.assertEqual(eid, "00000001")
+        self.assertFalse(os.path.exists(d))
+        # Allocation continues when an entity has been created
+        test_values = self.values_created(entity_type='test:EntityType', entity_title='Name entity test')
+        e = TestEntityTypeSub.create(r, eid, test_values)
+        eid = TestEntityTypeSub.allocate_new_id(r)
+        self.assertEqual(eid, "00000002")
         return
 
 # End.
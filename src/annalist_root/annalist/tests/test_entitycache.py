@@ -0,0 +1,155 @@
+"""
+Tests for in-process entity value cache
+"""
+
+__author__      = "Graham Klyne (GK@ACM.ORG)"
+__copyright__   = "Copyright 2014, G. Klyne"
+__license__     = "MIT (http://opensource.org/licenses/MIT)"
+
+import os
+import json
+import unittest
+
+import logging
+log = logging.getLogger(__name__)
+
+from django.conf                    import settings
+from django.test                    import TestCase # cf. https://docs.djangoproject.com/en/dev/topics/testing/tools/#assertions
+
+from annalist.identifiers           import RDF, RDFS, ANNAL
+from annalist.models.site           import Site
+from annalist.models.collection     import Collection
+from annalist.models.recordtype     import RecordType
+from annalist.models.recordtypedata import RecordTypeData
+from annalist.models.entitydata     import EntityData
+from annalist.models.entitycache    import EntityValueCache, entity_value_cache, file_status
+from annalist.models.entitycache    import EntityDirCache, DIR_SETTLE
+
+from tests                          import TestHost, TestHostUri, TestBasePath, TestBaseUri, TestBaseDir
+from tests                          import init_annalist_test_site
+from AnnalistTestCase               import AnnalistTestCase
+from entity_testtypedata            import recordtype_create_values
+from entity_testentitydata          import entitydata_create_values
+
+#   -----------------------------------------------------------------------------
+#
+#   Entity value cache tests
+#
+#   -----------------------------------------------------------------------------
+
+class EntityCacheTest(AnnalistTestCase):
+    """
+    Tests for in-process entity value cache
+    """
+
+    def setUp(self):
+        init_annalist_test_site()
+        self.testsite  = Site(TestBaseUri, TestBaseDir)
+        self.testcoll  = Collection(self.testsite, "testcoll")
+        self.testtype  = RecordType.create(self.testcoll, "testtype", recordtype_create_values("testcoll", "testtype"))
+        self.testdata  = RecordTypeData.create(self.testcoll, "testtype", {})
+        self.entity    = EntityData.create(self.testdata, "entity1", entitydata_create_values("entity1"))
+        entity_value_cache.clear()
+        return
+
+    def tearDown(self):
+        return
+
+    def load_label(self):
+        return EntityData.load(self.testdata, "entity1")[RDFS.CURIE.label]
+
+    def test_cache_hit_and_miss(self):
+        l1 = self.load_label()
+        self.assertEqual(entity_value_cache.stats()['misses'], 1)
+        self.assertEqual(entity_value_cache.stats()['hits'],   0)
+        l2 = self.load_label()
+        self.assertEqual(l1, l2)
+        self.assertEqual(entity_value_cache.stats()['misses'], 1)
+        self.assertEqual(entity_value_cache.stats()['hits'],   1)
+        return
+
+    def test_cache_values_not_shared(self):
+        e1 = EntityData.load(self.testdata, "entity1")
+        e1[RDFS.CURIE.label] = "Changed label"
+        e1["@type"].append("changed")
+        e2 = EntityData.load(self.testdata, "entity1")
+        self.assertEqual(e2[RDFS.CURIE.label], "Entity testcoll/testtype/entity1")
+        self.assertNotIn("changed", e2["@type"])
+        return
+
+    def test_cache_invalidated_on_save(self):
+        self.load_label()
+        e = EntityData.load(self.testdata, "entity1")
+        e[RDFS.CURIE.label] = "Updated label"
+        e._save()
+        self.assertEqual(self.load_label(), "Updated label")
+        return
+
+    def test_cache_invalidated_on_remove(self):
+        self.load_label()
+        EntityData.remove(self.testdata, "entity1")
+        self.assertIsNone(EntityData.load(self.testdata, "entity1"))
+        self.assertEqual(entity_value_cache.stats()['size'], 0)
+        return
+
+    def test_cache_external_change(self):
+        self.load_label()
+        # Update entity file without going through Annalist
+        p = self.entity._exists_path()
+        with open(p, "r") as f:
+            v = json.load(f)
+        v[RDFS.CURIE.label] = "Label updated externally"
+        with open(p, "w") as f:
+            json.dump(v, f)
+        self.assertEqual(self.load_label(), "Label updated externally")
+        return
+
+    def test_cache_size_limit(self):
+        p = self.entity._exists_path()
+        s = file_status(p)
+        cache = EntityValueCache(2)
+        cache.put("/a", s, {"a": 1})
+        cache.put("/b", s, {"b": 2})
+        self.assertEqual(cache.get("/a", s), {"a": 1})
+        cache.put("/c", s, {"c": 3})
+        self.assertIsNone(cache.get("/b", s))
+        self.assertEqual(cache.get("/a", s), {"a": 1})
+        self.assertEqual(cache.get("/c", s), {"c": 3})
+        self.assertEqual(cache.stats()['size'], 2)
+        return
+
+    def test_dir_cache_scan(self):
+        d     = self.testdata._entitydir
+        f     = EntityData._entityfile
+        cache = EntityDirCache(10)
+        os.mkdir(os.path.join(d, "nobody"))
+        with open(os.path.join(d, "notdir"), "w") as fil:
+            fil.write("\n")
+        entries = sorted(cache.scan(d, f))
+        self.assertIn(("entity1", True, True), entries)
+        self.assertIn(("nobody",  True, False), entries)
+        self.assertIn(("notdir",  False, False), entries)
+        self.assertEqual(cache.scan(os.path.join(d, "missing"), f), [])
+        return
+
+    def test_dir_cache_reused_until_changed(self):
+        d     = self.testdata._entitydir
+        f     = EntityData._entityfile
+        cache = EntityDirCache(10)
+        t     = os.stat(d).st_mtime - 2*DIR_SETTLE
+        os.utime(d, (t, t))
+        e1 = cache.scan(d, f)
+        self.assertIs(cache.scan(d, f), e1)
+        # Entity created in this process
+        EntityData.create(self.testdata, "entity2", entitydata_create_values("entity2"))
+        e2 = cache.scan(d, f)
+        self.assertIn(("entity2", True, True), e2)
+        # Entity directory created without going through Annalist
+        os.utime(d, (t, t))
+        e3 = cache.scan(d, f)
+        self.assertIs(cache.scan(d, f), e3)
+        os.mkdir(os.path.join(d, "entity3"))
+        self.assertIn(("entity3", True, False), cache.scan(d, f))
+        return
+
+# End.
@@ -312,6 +312,37 @@ class EntityDefaultListViewTest(AnnalistTestCase):
                 self.assertEqual(item_field['field_value'], field_val[fid]%(eid+1))
         return
 
+    def test_get_list_not_modified(self):
+        u = entitydata_list_type_url("testcoll", "testtype")
+        r = self.client.get(u)
+        self.assertEqual(r.status_code,   200)
+        etag = r['ETag']
+        generation = int(r['Annalist-Generation'])
+        r = self.client.get(u, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code,   304)
+        self.assertEqual(r['ETag'],       etag)
+        self.assertEqual(int(r['Annalist-Generation']), generation)
+        # Entity of another type updated
+        EntityData.create(self.testdata2, "entity4", 
+            entitydata_create_values("entity4", type_id="testtype2", update="Updated")
+            )
+        r = self.client.get(u, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code,   200)
+        self.assertGreater(int(r['Annalist-Generation']), generation)
+        etag = r['ETag']
+        # Entity directory added without going through Annalist
+        os.mkdir(os.path.join(self.testdata._entitydir, "entity5"))
+        r = self.client.get(u, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code,   200)
+        self.assertNotEqual(r['ETag'],    etag)
+        # Different user
+        etag = r['ETag']
+        create_test_user(self.testcoll, "testuser2", "testpassword")
+        self.client.login(username="testuser2", password="testpassword")
+        r = self.client.get(u, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code,   200)
+        return
+
     #   -----------------------------------------------------------------------------
     #   Form response tests
     #   -----------------------------------------------------------------------------
@@ -18,11 +18,13 @@ from django.http                    import QueryDict
 from django.contrib.auth.models     import User
 from django.test                    import TestCase # cf. https://docs.djangoproject.com/en/dev/topics/testing/tools/#assertions
 from django.test.client             import Client
+from django.test.client             import RequestFactory
 
 from utils.SuppressLoggingContext   import SuppressLogging
 
 from annalist.identifiers           import RDF, RDFS, ANNAL
 from annalist                       import layout
+from annalist                       import message
 
 from annalist.models.entitytypeinfo import EntityTypeInfo
 from annalist.models.site           import Site
@@ -35,6 +37,7 @@ from annalist.models.recordtypedata import RecordTypeData
 from annalist.models.entitydata     import EntityData
 
 from annalist.views.entityedit      import GenericEntityEditView
+from annalist.views.generic         import get_render_cache
 
 from tests                          import TestHost, TestHostUri, TestBasePath, TestBaseUri, TestBaseDir
 from tests                          import init_annalist_test_site
@@ -524,6 +527,88 @@ class GenericEntityEditViewTest(AnnalistTestCase):
         self.assertEqual(r.context['fields'][5]['options'], self.list_options)
         return
 
+    def test_get_edit_not_modified(self):
+        u = entitydata_edit_url("edit", "testcoll", "testtype", entity_id="entity1", view_id="Type_view")
+        r = self.client.get(u)
+        self.assertEqual(r.status_code,   200)
+        etag = r['ETag']
+        r = self.client.get(u, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code,   304)
+        self.assertEqual(r['ETag'],       etag)
+        self.assertEqual(r.content,       "")
+        # Update entity
+        self._create_entity_data("entity1", update="Updated entity")
+        r = self.client.get(u, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code,   200)
+        self.assertNotEqual(r['ETag'],    etag)
+        # Different view of same entity
+        v = entitydata_edit_url("edit", "testcoll", "testtype", entity_id="entity1", view_id="Default_view")
+        r = self.client.get(v, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code,   200)
+        # New entity form is never re-used
+        n = entitydata_edit_url("new", "testcoll", "testtype", view_id="Type_view")
+        r = self.client.get(n)
+        self.assertEqual(r.status_code,   200)
+        self.assertFalse(r.has_header("ETag"))
+        return
+
+    def test_get_edit_rendered_fields(self):
+        get_render_cache().clear()
+        self._create_entity_data("entity1")
+        u = entitydata_edit_url("edit", "testcoll", "testtype", entity_id="entity1", view_id="Default_view")
+        r = self.client.get(u)
+        self.assertEqual(r.status_code,   200)
+        self.assertIn('fields', r.context)
+        self.assertNotIn('rendered_fields', r.context)
+        self.assertContains(r, "Entity testcoll/testtype/entity1")
+        # Edit form is not served from saved rendering of fields
+        r = self.client.get(u)
+        self.assertEqual(r.status_code,   200)
+        self.assertIn('fields', r.context)
+        self.assertNotIn('rendered_fields', r.context)
+        self.assertContains(r, "Entity testcoll/testtype/entity1")
+        return
+
+    def test_get_view_rendered_fields(self):
+        get_render_cache().clear()
+        self._create_entity_data("entity1")
+        user     = User.objects.get(username="testuser")
+        rendered = []
+        class RenderCountView(GenericEntityEditView):
+            def render_fragment(self, cache_key, resultdata, template_name):
+                rendered.append(cache_key)
+                return super(RenderCountView, self).render_fragment(
+                    cache_key, resultdata, template_name
+                    )
+        def get_view(u):
+            request      = RequestFactory().get(u, HTTP_HOST=TestHost)
+            request.user = user
+            return RenderCountView.as_view()(request,
+                coll_id="testcoll", type_id="testtype", entity_id="entity1", 
+                view_id="Default_view", action="view"
+                )
+        u = entitydata_edit_url("edit", "testcoll", "testtype", entity_id="entity1", view_id="Default_view")
+        r = get_view(u)
+        self.assertEqual(r.status_code,   200)
+        self.assertContains(r, "Entity testcoll/testtype/entity1")
+        self.assertEqual(len(rendered), 1)
+        # Saved rendering of fields is used
+        r = get_view(u)
+        self.assertEqual(r.status_code,   200)
+        self.assertContains(r, "Entity testcoll/testtype/entity1")
+        self.assertEqual(len(rendered), 1)
+        # Different continuation URL
+        r = get_view(u+"?continuation_url=/xyzzy/")
+        self.assertEqual(r.status_code,   200)
+        self.assertEqual(len(rendered), 2)
+        # Update entity
+        self._create_entity_data("entity1", update="Updated entity")
+        r = get_view(u)
+        self.assertEqual(r.status_code,   200)
+        self.assertContains(r, "Updated entity testcoll/testtype/entity1")
+        self.assertEqual(len(rendered), 3)
+        return
+
     def test_get_view_no_collection(self):
         u = entitydata_edit_url("edit", "no_collection", "_field", entity_id="entity1", view_id="Type_view")
         r = self.client.get(u)
@@ -1113,6 +1198,33 @@ class GenericEntityEditViewTest(AnnalistTestCase):
         self._check_entity_data_values("entityedit", update="Updated entity")
         return
 
+    def test_post_edit_entity_conflict(self):
+        self._create_entity_data("entityedit")
+        u  = entitydata_edit_url("edit", "testcoll", "testtype", entity_id="entityedit", view_id="Type_view")
+        r  = self.client.get(u)
+        self.assertEqual(r.status_code,   200)
+        version = r.context['orig_version']
+        self.assertTrue(version)
+        self.assertContains(r, 'name="orig_version"     value="%s"'%version)
+        # Entity updated by another user after form is displayed
+        self._create_entity_data("entityedit", update="Other update")
+        f  = entitydata_recordtype_view_form_data(entity_id="entityedit", action="edit", update="Updated entity")
+        f['orig_version'] = version
+        with SuppressLogging(logging.WARNING):
+            r  = self.client.post(u, f)
+        self.assertEqual(r.status_code,   200)
+        self.assertContains(r, "<h3>%s</h3>"%message.ENTITY_CHANGED)
+        self.assertContains(r, message.ENTITY_UPDATE_CONFLICT%("testtype", "entityedit"))
+        self._check_entity_data_values("entityedit", update="Other update")
+        # Saving again with re-displayed version replaces the other update
+        current = r.context['orig_version']
+        self.assertNotEqual(current, version)
+        f['orig_version'] = current
+        r  = self.client.post(u, f)
+        self.assertEqual(r.status_code,   302)
+        self._check_entity_data_values("entityedit", update="Updated entity")
+        return
+
     def test_post_edit_entity_blank_label_comment(self):
         self._create_entity_data("entityedit")
         e1 = self._check_entity_data_values("entityedit")
@@ -211,6 +211,28 @@ class EntityGenericListViewTest(AnnalistTestCase):
                 self.assertEqual(item_field['entity_type_id'], entity_fields[eid]['entity_type_id'])
         return
 
+    def test_get_default_all_list_paged(self):
+        # List all entities in current collection, a page at a time
+        u = entitydata_list_all_url("testcoll", list_id="Default_list_all") + "?offset=1&limit=3"
+        r = self.client.get(u)
+        self.assertEqual(r.status_code,   200)
+        entities = context_list_entities(r.context)
+        self.assertEqual(
+            [ (e['entity_type_id'], e['entity_id']) for e in entities ],
+            [ ("_type", "testtype2"), ("testtype", "entity1"), ("testtype", "entity2") ]
+            )
+        self.assertIn("offset=4", r.context['list_next_url'])
+        self.assertIn("offset=0", r.context['list_prev_url'])
+        u = entitydata_list_all_url("testcoll", list_id="Default_list_all") + "?offset=4&limit=3"
+        r = self.client.get(u)
+        entities = context_list_entities(r.context)
+        self.assertEqual(
+            [ (e['entity_type_id'], e['entity_id']) for e in entities ],
+            [ ("testtype", "entity3"), ("testtype2", "entity4") ]
+            )
+        self.assertEqual(r.context['list_next_url'], None)
+        return
+
     def test_get_default_all_scope_all_list(self):
         # List all entities in current collection and site-wiude
         # This repeats parts of the previous test but with scope='all'
@@ -539,6 +561,47 @@ class EntityGenericListViewTest(AnnalistTestCase):
                 self.fail("Field %s not found in context"%f[0])
         return
 
+    def test_get_fields_list_paged(self):
+        u = entitydata_list_type_url(
+            "testcoll", "_field", list_id="Field_list", scope="all"
+            ) + "?search=Bib_&offset=0&limit=10"
+        r = self.client.get(u)
+        self.assertEqual(r.status_code,   200)
+        entities = context_list_entities(r.context)
+        self.assertEqual(len(entities), 10)
+        self.assertEqual(r.context['list_prev_url'], None)
+        next_url = r.context['list_next_url']
+        self.assertIn("offset=10", next_url)
+        self.assertIn("limit=10",  next_url)
+        self.assertIn("search=Bib_", next_url)
+        self.assertContains(r, 'title="Show next page of entities"')
+        # Last page
+        u = entitydata_list_type_url(
+            "testcoll", "_field", list_id="Field_list", scope="all"
+            ) + "?search=Bib_&offset=30&limit=10"
+        r = self.client.get(u)
+        self.assertEqual(r.status_code,   200)
+        entities = context_list_entities(r.context)
+        self.assertEqual(len(entities), 6)
+        self.assertEqual(r.context['list_next_url'], None)
+        self.assertIn("offset=20", r.context['list_prev_url'])
+        return
+
+    def test_get_fields_list_stream(self):
+        u = entitydata_list_type_url(
+            "testcoll", "_field", list_id="Field_list", scope="all"
+            ) + "?search=Bib_&continuation_url=/xyzzy/"
+        with self.settings(LIST_STREAM_ROWS=True):
+            r = self.client.get(u)
+        self.assertEqual(r.status_code,   200)
+        self.assertTrue(r.streaming)
+        content = "".join(r.streaming_content)
+        self.assertIn('value="_field/Bib_address"', content)
+        self.assertIn('value="_field/Bib_year"',    content)
+        self.assertIn('name="continuation_url"',    content)
+        self.assertNotIn("@@stream:",               content)
+        return
+
     def test_get_list_select_by_type(self):
         u = entitydata_list_type_url("testcoll", "_field", list_id=None)
         r = self.client.get(u)
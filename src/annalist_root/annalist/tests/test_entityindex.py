@@ -0,0 +1,352 @@
+"""
+Tests for collection entity index
+"""
+
+__author__      = "Graham Klyne (GK@ACM.ORG)"
+__copyright__   = "Copyright 2014, G. Klyne"
+__license__     = "MIT (http://opensource.org/licenses/MIT)"
+
+import os
+import json
+import shutil
+import sqlite3
+import unittest
+
+import logging
+log = logging.getLogger(__name__)
+
+from django.conf                    import settings
+from django.test                    import TestCase # cf. https://docs.djangoproject.com/en/dev/topics/testing/tools/#assertions
+
+from annalist.identifiers           import RDF, RDFS, ANNAL
+from annalist                       import layout
+from annalist.models.site           import Site
+from annalist.models.collection     import Collection
+from annalist.models.recordtype     import RecordType
+from annalist.models.recordtypedata import RecordTypeData
+from annalist.models.entitydata     import EntityData
+from annalist.models.entitytypeinfo import EntityTypeInfo
+from annalist.models.entityfinder   import EntityFinder, EntitySelector
+
+from tests                          import TestHost, TestHostUri, TestBasePath, TestBaseUri, TestBaseDir
+from tests                          import init_annalist_test_site
+from AnnalistTestCase               import AnnalistTestCase
+from entity_testtypedata            import recordtype_create_values
+from entity_testentitydata          import entitydata_create_values
+
+#   -----------------------------------------------------------------------------
+#
+#   Entity index tests
+#
+#   -----------------------------------------------------------------------------
+
+class EntityIndexTest(AnnalistTestCase):
+    """
+    Tests for collection entity index
+    """
+
+    def setUp(self):
+        init_annalist_test_site()
+        self.testsite  = Site(TestBaseUri, TestBaseDir)
+        self.testcoll  = Collection(self.testsite, "testcoll")
+        self.testtype  = RecordType.create(self.testcoll, "testtype", recordtype_create_values("testcoll", "testtype"))
+        self.testdata  = RecordTypeData.create(self.testcoll, "testtype", {})
+        self.indexpath = os.path.join(self.testcoll._entitydir, layout.COLL_INDEX_FILE)
+        return
+
+    def tearDown(self):
+        return
+
+    def create_entity(self, entity_id, label):
+        e = EntityData.create(self.testdata, entity_id, entitydata_create_values(entity_id))
+        e.set_values(dict(e.get_values(), **{RDFS.CURIE.label: label}))
+        e._save()
+        return e
+
+    def child_labels(self):
+        return dict(
+            (e.get_id(), e[RDFS.CURIE.label])
+            for e in self.testdata.child_entities(EntityData)
+            )
+
+    def test_index_child_entities(self):
+        self.create_entity("entity1", "Entity 1")
+        self.create_entity("entity2", "Entity 2")
+        self.assertEqual(self.child_labels(), {"entity1": "Entity 1", "entity2": "Entity 2"})
+        self.assertTrue(os.path.isfile(self.indexpath))
+        self.assertEqual(sorted(self.testdata.child_entity_ids(EntityData)), ["entity1", "entity2"])
+        return
+
+    def test_index_values_match_files(self):
+        self.create_entity("entity1", "Entity 1")
+        e1 = list(self.testdata.child_entities(EntityData))[0]
+        e2 = EntityData.load(self.testdata, "entity1")
+        self.assertEqual(e1.get_values(), e2.get_values())
+        self.assertEqual(e1.get_url(), e2.get_url())
+        self.assertEqual(e1.get_view_url(), e2.get_view_url())
+        return
+
+    def test_index_updated_on_save(self):
+        self.create_entity("entity1", "Entity 1")
+        self.assertEqual(self.child_labels(), {"entity1": "Entity 1"})
+        self.create_entity("entity1", "Entity 1 updated")
+        self.create_entity("entity2", "Entity 2")
+        self.assertEqual(self.child_labels(), {"entity1": "Entity 1 updated", "entity2": "Entity 2"})
+        return
+
+    def test_index_updated_on_remove(self):
+        self.create_entity("entity1", "Entity 1")
+        self.create_entity("entity2", "Entity 2")
+        self.assertEqual(len(self.child_labels()), 2)
+        EntityData.remove(self.testdata, "entity1")
+        self.assertEqual(self.child_labels(), {"entity2": "Entity 2"})
+        RecordTypeData.remove(self.testcoll, "testtype")
+        self.assertEqual(self.child_labels(), {})
+        return
+
+    def test_index_external_changes(self):
+        self.create_entity("entity1", "Entity 1")
+        self.create_entity("entity2", "Entity 2")
+        self.assertEqual(len(self.child_labels()), 2)
+        # Add and remove entities without going through Annalist
+        shutil.copytree(
+            os.path.join(self.testdata._entitydir, "entity1"),
+            os.path.join(self.testdata._entitydir, "entity3")
+            )
+        shutil.rmtree(os.path.join(self.testdata._entitydir, "entity2"))
+        self.assertEqual(self.child_labels(), {"entity1": "Entity 1", "entity3": "Entity 1"})
+        return
+
+    def edit_entity_file(self, entity_id, label):
+        # Update entity file without going through Annalist
+        path = EntityData.path(self.testdata, entity_id)
+        with open(path, "r") as f:
+            values = json.load(f)
+        values[RDFS.CURIE.label] = label
+        with open(path+".new", "w") as f:
+            json.dump(values, f)
+        os.rename(path+".new", path)
+        return
+
+    def test_index_external_updates(self):
+        self.create_entity("entity1", "Entity 1")
+        self.create_entity("entity2", "Entity 2")
+        self.assertEqual(len(self.child_labels()), 2)
+        # Entity files are not checked again until the directory is updated
+        self.edit_entity_file("entity1", "Entity 1 edited")
+        self.assertEqual(self.child_labels(), {"entity1": "Entity 1", "entity2": "Entity 2"})
+        # Directory updated by another process
+        gen  = self.testcoll.get_generation()
+        conn = sqlite3.connect(self.indexpath)
+        with conn:
+            conn.execute("UPDATE generations SET generation = generation + 1")
+        conn.close()
+        self.assertEqual(self.child_labels(), {"entity1": "Entity 1 edited", "entity2": "Entity 2"})
+        self.assertEqual(
+            [ e.get_id() for e in self.testdata.child_entities(EntityData, terms=["edited"]) ],
+            ["entity1"]
+            )
+        self.assertGreater(self.testcoll.get_generation(), gen+1)
+        # Updates by the current process do not cause files to be checked again
+        self.create_entity("entity2", "Entity 2 updated")
+        self.edit_entity_file("entity1", "Entity 1 edited again")
+        self.assertEqual(
+            self.child_labels(), {"entity1": "Entity 1 edited", "entity2": "Entity 2 updated"}
+            )
+        # Files are checked when the index is rebuilt
+        self.testcoll.rebuild_index()
+        self.assertEqual(
+            self.child_labels(), {"entity1": "Entity 1 edited again", "entity2": "Entity 2 updated"}
+            )
+        return
+
+    def test_index_rebuild(self):
+        self.create_entity("entity1", "Entity 1")
+        self.assertEqual(self.child_labels(), {"entity1": "Entity 1"})
+        self.testcoll.rebuild_index()
+        self.assertFalse(os.path.exists(self.indexpath))
+        self.assertEqual(self.child_labels(), {"entity1": "Entity 1"})
+        self.assertTrue(os.path.isfile(self.indexpath))
+        return
+
+    def test_index_enum_site_entities(self):
+        # Site-wide types are included alongside collection types
+        typeinfo = EntityTypeInfo(self.testsite, self.testcoll, "_type")
+        type_ids = [ e.get_id() for e in typeinfo.enum_entities(usealtparent=True) ]
+        self.assertIn("testtype", type_ids)
+        self.assertIn("_type", type_ids)
+        self.assertEqual(len(type_ids), len(set(type_ids)))
+        coll_ids = [ e.get_id() for e in typeinfo.enum_entities(usealtparent=False) ]
+        self.assertIn("testtype", coll_ids)
+        self.assertNotIn("_type", coll_ids)
+        return
+
+    def test_index_generations(self):
+        testdir  = self.testdata._entitydir
+        typeinfo = EntityTypeInfo(self.testsite, self.testcoll, "testtype")
+        viewinfo = EntityTypeInfo(self.testsite, self.testcoll, "_view")
+        g_coll   = self.testcoll.get_generation()
+        g_type   = typeinfo.get_generation()
+        g_meta   = self.testcoll.get_metadata_generation()
+        g_view   = viewinfo.get_generation()
+        self.assertEqual(g_type, self.testcoll.get_generation(testdir))
+        # Entity created
+        self.create_entity("entity1", "Entity 1")
+        self.assertGreater(self.testcoll.get_generation(), g_coll)
+        self.assertGreater(typeinfo.get_generation(), g_type)
+        self.assertEqual(self.testcoll.get_metadata_generation(), g_meta)
+        self.assertEqual(viewinfo.get_generation(), g_view)
+        # Type definition updated
+        g_type = typeinfo.get_generation()
+        self.testtype._save()
+        self.assertGreater(self.testcoll.get_metadata_generation(), g_meta)
+        self.assertEqual(typeinfo.get_generation(), g_type)
+        self.assertEqual(viewinfo.get_generation(), g_view)
+        # Collection metadata updated
+        g_meta = self.testcoll.get_metadata_generation()
+        Collection.load(self.testsite, "testcoll")._save()
+        self.assertGreater(self.testcoll.get_metadata_generation(), g_meta)
+        # Entity removed
+        g_coll = self.testcoll.get_generation()
+        EntityData.remove(self.testdata, "entity1")
+        self.assertGreater(self.testcoll.get_generation(), g_coll)
+        self.assertGreater(typeinfo.get_generation(), g_type)
+        # Entity type data removed
+        g_type = typeinfo.get_generation()
+        RecordTypeData.remove(self.testcoll, "testtype")
+        self.assertGreater(typeinfo.get_generation(), g_type)
+        # Generations continue to increase when the index is rebuilt
+        g_coll = self.testcoll.get_generation()
+        self.testcoll.rebuild_index()
+        self.assertGreater(self.testcoll.get_generation(), g_coll)
+        return
+
+    def test_index_generation_external_changes(self):
+        self.create_entity("entity1", "Entity 1")
+        self.assertEqual(len(self.child_labels()), 1)
+        g_type = self.testcoll.get_generation(self.testdata._entitydir)
+        shutil.copytree(
+            os.path.join(self.testdata._entitydir, "entity1"),
+            os.path.join(self.testdata._entitydir, "entity2")
+            )
+        self.assertEqual(len(self.child_labels()), 2)
+        self.assertGreater(self.testcoll.get_generation(self.testdata._entitydir), g_type)
+        return
+
+    def found_ids(self, search, search_substring=False):
+        finder = EntityFinder(self.testcoll, search_substring=search_substring)
+        return sorted(e.get_id() for e in finder.get_entities(type_id="testtype", search=search))
+
+    def test_index_search_terms(self):
+        self.create_entity("entity1", "Alpha beta")
+        self.create_entity("entity2", "Alpha gamma")
+        self.create_entity("entity3", "Delta")
+        self.assertEqual(self.found_ids("alpha"),       ["entity1", "entity2"])
+        self.assertEqual(self.found_ids("ALP gam"),     ["entity2"])
+        self.assertEqual(self.found_ids("delta alpha"), [])
+        self.assertEqual(self.found_ids("pha"),         [])
+        self.assertEqual(self.found_ids("entity3"),     ["entity3"])
+        return
+
+    def test_index_search_updated(self):
+        self.create_entity("entity1", "Alpha beta")
+        self.assertEqual(self.found_ids("beta"),        ["entity1"])
+        self.create_entity("entity1", "Alpha gamma")
+        self.assertEqual(self.found_ids("beta"),        [])
+        self.assertEqual(self.found_ids("gamma"),       ["entity1"])
+        EntityData.remove(self.testdata, "entity1")
+        self.assertEqual(self.found_ids("gamma"),       [])
+        return
+
+    def test_index_search_substring(self):
+        self.create_entity("entity1", "Alpha beta")
+        self.create_entity("entity2", "Alpha gamma")
+        self.assertEqual(self.found_ids("pha b", search_substring=True), ["entity1"])
+        self.assertEqual(self.found_ids("alpha", search_substring=True), [])
+        self.assertEqual(self.found_ids("pha b", search_substring=False), [])
+        return
+
+    def test_index_search_default(self):
+        # Search strings are matched as substrings unless SEARCH_SUBSTRING is False
+        self.create_entity("entity1", "Alpha beta")
+        self.create_entity("entity2", "Alpha gamma")
+        self.assertEqual(self.found_ids("pha b", search_substring=None), ["entity1"])
+        self.assertEqual(self.found_ids("alpha", search_substring=None), [])
+        with self.settings(SEARCH_SUBSTRING=False):
+            self.assertEqual(self.found_ids("pha b", search_substring=None), [])
+            self.assertEqual(self.found_ids("alpha", search_substring=None), ["entity1", "entity2"])
+        return
+
+    def index_ids(self, conditions):
+        evals = self.testcoll._child_index().entity_values(
+            self.testdata, EntityData, conditions=conditions
+            )
+        return sorted(eid for (eid, _) in evals)
+
+    def selected_ids(self, selector, context):
+        finder = EntityFinder(self.testcoll, selector=selector)
+        return sorted(e.get_id() for e in finder.get_entities(type_id="testtype", context=context))
+
+    def test_index_field_conditions(self):
+        self.create_entity("entity1", "Alpha")
+        self.create_entity("entity2", "Beta")
+        e3 = self.create_entity("entity3", "Gamma")
+        e3.set_values(dict(e3.get_values(), **{RDFS.CURIE.label: ["Alpha", "Gamma"]}))
+        e3._save()
+        e4 = self.create_entity("entity4", "")
+        self.assertEqual(self.index_ids([(RDFS.CURIE.label, "in", ["Alpha"])]), ["entity1", "entity3"])
+        self.assertEqual(self.index_ids([(RDFS.CURIE.label, "in", ["Beta", "Delta"])]), ["entity2"])
+        self.assertEqual(self.index_ids([(RDFS.CURIE.label, "in", [])]), [])
+        self.assertEqual(self.index_ids([(RDFS.CURIE.label, "in_or_missing", ["Beta"])]), ["entity2", "entity3", "entity4"])
+        self.assertEqual(self.index_ids([("test:missing", "in_or_missing", [])]), ["entity1", "entity2", "entity3", "entity4"])
+        return
+
+    def test_index_selector_conditions(self):
+        self.create_entity("entity1", "Alpha")
+        self.create_entity("entity2", "Beta")
+        self.create_entity("entity3", "")
+        context  = {'view': {'test:labels': ["Alpha", "Gamma"], 'test:label': "Beta"}}
+        selector = "[rdfs:label] in view[test:labels]"
+        self.assertEqual(
+            EntitySelector(selector).index_conditions(context), 
+            [(RDFS.CURIE.label, "in_or_missing", ["Alpha", "Gamma"])]
+            )
+        self.assertEqual(self.selected_ids(selector, context), ["entity1", "entity3"])
+        self.assertEqual(self.selected_ids("[rdfs:label] == view[test:label]", context), ["entity2"])
+        self.assertEqual(self.selected_ids("[annal:id] == 'entity3'", context), ["entity3"])
+        return
+
+    def test_index_range_conditions(self):
+        self.create_entity("entity1", "2015-01-10")
+        self.create_entity("entity2", "2015-02-20")
+        self.create_entity("entity3", "9")
+        self.create_entity("entity4", "10")
+        self.assertEqual(self.index_ids([(RDFS.CURIE.label, ">=", "2015-02")]), ["entity2"])
+        self.assertEqual(self.index_ids([(RDFS.CURIE.label, "<", 10.0)]), ["entity3"])
+        self.assertEqual(self.index_ids([(RDFS.CURIE.label, ">", 9.0)]), ["entity4"])
+        self.assertEqual(self.index_ids([(RDFS.CURIE.label, "startswith", "2015-0")]), ["entity1", "entity2"])
+        self.assertEqual(self.selected_ids("[rdfs:label] < '2015-02-01'", {}), ["entity1"])
+        self.assertEqual(self.selected_ids("[rdfs:label] <= 10", {}), ["entity3", "entity4"])
+        self.assertEqual(self.selected_ids("[rdfs:label] > '9'", {}), ["entity4"])
+        self.assertEqual(self.selected_ids("[rdfs:label] startswith '2015-'", {}), ["entity1", "entity2"])
+        return
+
+    def test_index_boolean_selectors(self):
+        self.create_entity("entity1", "Alpha")
+        self.create_entity("entity2", "Beta")
+        self.create_entity("entity3", "Gamma")
+        self.assertEqual(
+            self.selected_ids("[rdfs:label] == 'Alpha' or [rdfs:label] == 'Gamma'", {}), 
+            ["entity1", "entity3"]
+            )
+        self.assertEqual(
+            self.selected_ids("[rdfs:label] != 'Alpha' and not [annal:id] == 'entity3'", {}), 
+            ["entity2"]
+            )
+        self.assertEqual(
+            self.selected_ids("[annal:id] startswith 'entity' and ([rdfs:label] > 'B')", {}), 
+            ["entity2", "entity3"]
+            )
+        return
+
+# End.
@@ -0,0 +1,103 @@
+"""
+Tests for entity reference module, and its use to select and order entities
+"""
+
+__author__      = "Graham Klyne (GK@ACM.ORG)"
+__copyright__   = "Copyright 2014, G. Klyne"
+__license__     = "MIT (http://opensource.org/licenses/MIT)"
+
+import os
+import unittest
+
+import logging
+log = logging.getLogger(__name__)
+
+from django.conf                    import settings
+from django.test                    import TestCase # cf. https://docs.djangoproject.com/en/dev/topics/testing/tools/#assertions
+
+from annalist.identifiers           import RDF, RDFS, ANNAL
+from annalist.models.site           import Site
+from annalist.models.collection     import Collection
+from annalist.models.recordtype     import RecordType
+from annalist.models.recordtypedata import RecordTypeData
+from annalist.models.entitydata     import EntityData
+from annalist.models.entitytypeinfo import EntityTypeInfo
+from annalist.models.entityref      import EntityRef
+from annalist.models.entityfinder   import EntityFinder
+
+from tests                          import TestHost, TestHostUri, TestBasePath, TestBaseUri, TestBaseDir
+from tests                          import init_annalist_test_site
+from AnnalistTestCase               import AnnalistTestCase
+from entity_testtypedata            import recordtype_create_values
+from entity_testentitydata          import entitydata_create_values
+
+#   -----------------------------------------------------------------------------
+#
+#   Entity reference tests
+#
+#   -----------------------------------------------------------------------------
+
+class EntityRefTest(AnnalistTestCase):
+    """
+    Tests for entity references
+    """
+
+    def setUp(self):
+        init_annalist_test_site()
+        self.testsite = Site(TestBaseUri, TestBaseDir)
+        self.testcoll = Collection(self.testsite, "testcoll")
+        self.testtype = RecordType.create(self.testcoll, "testtype", recordtype_create_values("testcoll", "testtype"))
+        self.testdata = RecordTypeData.create(self.testcoll, "testtype", {})
+        for eid in ("entity1", "entity2", "entity3"):
+            EntityData.create(self.testdata, eid, entitydata_create_values(eid))
+        self.typeinfo = EntityTypeInfo(self.testsite, self.testcoll, "testtype")
+        return
+
+    def tearDown(self):
+        return
+
+    def test_entityref_ids(self):
+        ref = EntityRef(self.typeinfo, "entity1")
+        self.assertEqual(ref.get_id(),              "entity1")
+        self.assertEqual(ref.get_type_id(),         "testtype")
+        self.assertEqual(ref[ANNAL.CURIE.id],       "entity1")
+        self.assertEqual(ref[ANNAL.CURIE.type_id],  "testtype")
+        self.assertEqual(ref.get_path(), EntityData.path(self.testdata, "entity1"))
+        self.assertFalse(ref.is_loaded())
+        return
+
+    def test_entityref_values(self):
+        ref = EntityRef(self.typeinfo, "entity2")
+        self.assertEqual(ref[RDFS.CURIE.label], "Entity testcoll/testtype/entity2")
+        self.assertTrue(ref.is_loaded())
+        self.assertIn(RDFS.CURIE.label, ref)
+        self.assertNotIn("nokey", ref)
+        self.assertEqual(ref.get_entity().get_id(), "entity2")
+        return
+
+    def test_entityref_missing(self):
+        ref = EntityRef(self.typeinfo, "noentity")
+        self.assertEqual(ref.get(RDFS.CURIE.label, "none"), "none")
+        self.assertEqual(ref.get_entity(), None)
+        return
+
+    def test_entityref_select_by_id(self):
+        finder = EntityFinder(self.testcoll, selector="'entity2' == [annal:id]")
+        refs   = list(
+            finder._selector.filter(finder.get_base_entity_refs(type_id="testtype"))
+            )
+        self.assertEqual([ r.get_id() for r in refs ], ["entity2"])
+        self.assertFalse(refs[0].is_loaded())
+        entities = finder.get_entities_sorted(type_id="testtype", limit=5)
+        self.assertEqual([ e.get_id() for e in entities ], ["entity2"])
+        self.assertEqual(entities[0][RDFS.CURIE.label], "Entity testcoll/testtype/entity2")
+        return
+
+    def test_entityref_sorted_page(self):
+        finder   = EntityFinder(self.testcoll)
+        entities = finder.get_entities_sorted(type_id="testtype", offset=1, limit=1)
+        self.assertEqual([ e.get_id() for e in entities ], ["entity2"])
+        self.assertEqual(entities[0][RDFS.CURIE.label], "Entity testcoll/testtype/entity2")
+        return
+
+# End.
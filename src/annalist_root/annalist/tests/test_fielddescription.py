@@ -7,6 +7,8 @@ __copyright__   = "Copyright 2014, G. Klyne"
 __license__     = "MIT (http://opensource.org/licenses/MIT)"
 
 import os
+import json
+import sqlite3
 import unittest
 from collections import OrderedDict
 
@@ -17,10 +19,13 @@ from django.conf                        import settings
 from django.test                        import TestCase # cf. https://docs.djangoproject.com/en/dev/topics/testing/tools/#assertions
 
 from annalist.identifiers               import RDF, RDFS, ANNAL
+from annalist                           import layout
 from annalist.models.site               import Site
 from annalist.models.collection         import Collection
+from annalist.models.recordfield        import RecordField
 
 from annalist.views.fielddescription    import FieldDescription, field_description_from_view_field
+from annalist.views.fieldplancache      import field_plan_cache
 
 from annalist.views.fields.render_placement     import Placement
 from annalist.views.fields.render_repeatgroup   import RenderRepeatGroup
@@ -253,6 +258,109 @@ class FieldDescriptionTest(AnnalistTestCase):
         self.assertDictionaryMatch(fd['group_field_descs'][2], expect_field2_desc)
         return
 
+    def test_Field_cached_copies(self):
+        field_plan_cache.clear()
+        fd1 = field_description_from_view_field(
+            self.testcoll, { ANNAL.CURIE.field_id: "View_fields" }, {}
+            )
+        fd1['field_label'] = "Updated"
+        fd1['group_field_descs'][0]['field_label'] = "Updated"
+        fd2 = field_description_from_view_field(
+            self.testcoll, { ANNAL.CURIE.field_id: "View_fields" }, {}
+            )
+        self.assertEqual(fd2['field_label'], "Fields")
+        self.assertEqual(fd2['group_field_descs'][0]['field_label'], "Field id")
+        self.assertEqual(fd2['group_field_descs'][0]['field_render_edit'], fd1['group_field_descs'][0]['field_render_edit'])
+        # Enumerated value choices are evaluated for each description returned
+        self.assertIn("Entity_id", fd2['group_field_descs'][0]['field_choice_labels'])
+        self.assertIsNot(
+            fd2['group_field_descs'][0]['field_choice_labels'], 
+            fd1['group_field_descs'][0]['field_choice_labels']
+            )
+        return
+
+    def test_Field_cache_invalidated(self):
+        fd = field_description_from_view_field(
+            self.testcoll, { ANNAL.CURIE.field_id: "View_fields" }, {}
+            )
+        self.assertEqual(fd['field_label'], "Fields")
+        self.assertEqual(fd['group_field_descs'][2]['field_label'], "Position/size")
+        # Define collection field that overrides site field
+        site_field = RecordField.load(self.testcoll, "View_fields", self.testsite)
+        field_values = site_field.get_values().copy()
+        field_values[RDFS.CURIE.label] = "Collection field label"
+        RecordField.create(self.testcoll, "View_fields", field_values)
+        fd = field_description_from_view_field(
+            self.testcoll, { ANNAL.CURIE.field_id: "View_fields" }, {}
+            )
+        self.assertEqual(fd['field_label'], "Collection field label")
+        # Define collection field that overrides site field referenced by group
+        site_field = RecordField.load(self.testcoll, "Group_field_placement", self.testsite)
+        field_values = site_field.get_values().copy()
+        field_values[RDFS.CURIE.label] = "Collection field label"
+        RecordField.create(self.testcoll, "Group_field_placement", field_values)
+        fd = field_description_from_view_field(
+            self.testcoll, { ANNAL.CURIE.field_id: "View_fields" }, {}
+            )
+        self.assertEqual(fd['group_field_descs'][2]['field_label'], "Collection field label")
+        return
+
+    def field_sel_choices(self, record_type=None):
+        view_context = {}
+        if record_type:
+            view_context = {'entity': {ANNAL.CURIE.record_type: record_type}}
+        fd = field_description_from_view_field(
+            self.testcoll, { ANNAL.CURIE.field_id: "Group_field_sel" }, view_context
+            )
+        return list(fd['field_choice_labels'])
+
+    def test_Field_choices_context(self):
+        type_choices = self.field_sel_choices("annal:Type")
+        view_choices = self.field_sel_choices("annal:View")
+        self.assertIn("Type_label", type_choices)
+        self.assertNotIn("View_label", type_choices)
+        self.assertIn("View_label", view_choices)
+        self.assertNotIn("Type_label", view_choices)
+        self.assertEqual(self.field_sel_choices("annal:Type"), type_choices)
+        return
+
+    def test_Field_choices_invalidated(self):
+        self.assertNotIn("Entity_new", self.field_sel_choices("annal:Type"))
+        # Create new field
+        field_values = RecordField.load(self.testcoll, "Type_label", self.testsite).get_values().copy()
+        RecordField.create(self.testcoll, "Entity_new", field_values)
+        self.assertIn("Entity_new", self.field_sel_choices("annal:Type"))
+        # Update field entity type
+        field_values[ANNAL.CURIE.field_entity_type] = "annal:View"
+        RecordField.create(self.testcoll, "Entity_new", field_values)
+        self.assertNotIn("Entity_new", self.field_sel_choices("annal:Type"))
+        self.assertIn("Entity_new", self.field_sel_choices("annal:View"))
+        # Remove field
+        RecordField.remove(self.testcoll, "Entity_new")
+        self.assertNotIn("Entity_new", self.field_sel_choices("annal:View"))
+        return
+
+    def test_Field_choices_other_process(self):
+        field_values = RecordField.load(self.testcoll, "Type_label", self.testsite).get_values().copy()
+        RecordField.create(self.testcoll, "Entity_new", field_values)
+        self.assertIn("Entity_new", self.field_sel_choices("annal:Type"))
+        # Update field file without going through Annalist
+        field_values[ANNAL.CURIE.field_entity_type] = "annal:View"
+        path = RecordField.path(self.testcoll, "Entity_new")
+        with open(path+".new", "w") as f:
+            json.dump(field_values, f)
+        os.rename(path+".new", path)
+        self.assertIn("Entity_new", self.field_sel_choices("annal:Type"))
+        # Collection generation counters increased by another process
+        indexpath = os.path.join(self.testcoll._entitydir, layout.COLL_INDEX_FILE)
+        conn = sqlite3.connect(indexpath)
+        with conn:
+            conn.execute("UPDATE generations SET generation = generation + 1")
+        conn.close()
+        self.assertNotIn("Entity_new", self.field_sel_choices("annal:Type"))
+        self.assertIn("Entity_new", self.field_sel_choices("annal:View"))
+        return
+
 # End.
 
 if __name__ == "__main__":
@@ -35,6 +35,8 @@ from annalist.views.fields.render_tokenset      import get_field_tokenset_render
 from annalist.views.fields.render_placement     import get_field_placement_renderer
 from annalist.views.fields                      import render_repeatgroup
 from annalist.views.fields.render_repeatgroup   import RenderRepeatGroup
+from annalist.views.fields.render_listrow       import compile_listrow, _listrow_values
+from annalist.views.fields.render_utils         import _field_view_files
 from annalist.views.fields.render_fieldvalue    import RenderFieldValue, get_template
 
 from tests                  import init_annalist_test_site
@@ -166,6 +168,58 @@ class FieldDescriptionTest(AnnalistTestCase):
             })
         return repeatgroup_context
 
+    def get_listrow_context(self):
+        # context['field'] is essentially a bound_field value, combining the list 
+        # column descriptions with a list of entity values to be formatted.
+        listrow_context = Context(
+            { 'field':
+                { 'field_value':
+                  [ { 'entity_id':              "entity1"
+                    , 'entity_type_id':         "testtype"
+                    , 'entity_link':            "/testsite/c/testcoll/d/testtype/entity1/"
+                    , "annal:id":               "entity1"
+                    , "annal:type_id":          "testtype"
+                    , "rdfs:label":             "Entity <1> & label"
+                    }
+                  , { 'entity_id':              "entity2"
+                    , 'entity_type_id':         "_type"
+                    , 'entity_link':            "/testsite/c/testcoll/d/_type/entity2/"
+                    , "annal:id":               "entity2"
+                    , "annal:type_id":          "_type"
+                    , "rdfs:label":             ""
+                    }
+                  ]
+                , 'field_id':                   'List_fields'
+                , 'field_placement':            get_placement_classes("small:0,12")
+                , 'group_id':                   'List_fields'
+                , 'group_field_descs':
+                    [ field_description_from_view_field(
+                        self.testcoll, 
+                        { ANNAL.CURIE.field_id:         "Entity_id"
+                        , ANNAL.CURIE.field_placement:  "small:0,3"
+                        }, {}
+                        )
+                    , field_description_from_view_field(
+                        self.testcoll, 
+                        { ANNAL.CURIE.field_id:         "Entity_type"
+                        , ANNAL.CURIE.field_placement:  "small:3,3"
+                        }, {}
+                        )
+                    , field_description_from_view_field(
+                        self.testcoll, 
+                        { ANNAL.CURIE.field_id:         "Entity_label"
+                        , ANNAL.CURIE.field_placement:  "small:6,6"
+                        }, {}
+                        )
+                    ]
+                , 'context_extra_values':
+                    { 'request_url':            "/testsite/c/testcoll/l/"
+                    , 'continuation_url':       "/testsite/c/testcoll/"
+                    }
+                }
+            })
+        return listrow_context
+
     # Tests
 
     def test_TokenSetValueMapperTest(self):
@@ -248,6 +302,124 @@ class FieldDescriptionTest(AnnalistTestCase):
             )
         return
 
+    def test_RenderRepeatGroupListRow(self):
+        # Rendering using compiled list rows must be the same as using the templates
+        fieldrender   = RenderRepeatGroup(render_repeatgroup.view_listrow)
+        expect_text   = fieldrender.render(self.get_listrow_context())
+        rowcompiler   = lambda descs, extras: compile_listrow(descs, _field_view_files, extras)
+        fieldrender   = RenderRepeatGroup(render_repeatgroup.view_listrow, row_compiler=rowcompiler)
+        rendered_text = fieldrender.render(self.get_listrow_context())
+        self.assertEqual(rendered_text, expect_text)
+        expect_elements = (
+            [ '''value="testtype/entity1"'''
+            , '''<a href="/testsite/c/testcoll/d/testtype/entity1/'''+
+              '''?continuation_url=/testsite/c/testcoll/l/'''+
+              '''%3Fcontinuation_url=/testsite/c/testcoll/">entity1</a>'''
+            , '''Entity &lt;1&gt; &amp; label'''
+            , '''&nbsp;'''
+            ])
+        for e in expect_elements:
+            self.assertIn(e, rendered_text)
+        return
+
+    def get_listrow_types_context(self):
+        # List columns using each render type handled by compiled list rows, with
+        # entity values that have links, values without links, empty values and
+        # missing values.
+        def column(field_id, placement):
+            return field_description_from_view_field(
+                self.testcoll, 
+                { ANNAL.CURIE.field_id:         field_id
+                , ANNAL.CURIE.field_placement:  placement
+                }, {}
+                )
+        listrow_context = Context(
+            { 'field':
+                { 'field_value':
+                  [ { 'entity_id':              "entity1"
+                    , 'entity_type_id':         "_type"
+                    , 'entity_link':            "/testsite/c/testcoll/d/_type/entity1/"
+                    , "annal:id":               "entity1"
+                    , "annal:type_id":          "_type"
+                    , "annal:field_entity_type": "annal:Field"
+                    , "rdfs:label":             "Entity <1> & label"
+                    , "rdfs:comment":           "Entity 1\n<b>comment</b> & more"
+                    , "annal:default_type":     "Default_type"
+                    , "annal:field_render_type": "Text"
+                    }
+                  , { 'entity_id':              "entity2"
+                    , 'entity_type_id':         "testtype"
+                    , 'entity_link':            "/testsite/c/testcoll/d/testtype/entity2/"
+                    , "annal:id":               "entity2"
+                    , "annal:type_id":          "testtype"
+                    , "annal:field_entity_type": "test:type"
+                    , "rdfs:label":             "Entity 2"
+                    , "rdfs:comment":           "Entity 2 comment"
+                    , "annal:default_type":     "no_type"
+                    , "annal:field_render_type": "NoRenderType"
+                    }
+                  , { 'entity_id':              "entity3"
+                    , 'entity_type_id':         "testtype"
+                    , 'entity_link':            "/testsite/c/testcoll/d/testtype/entity3/"
+                    , "annal:id":               ""
+                    , "annal:type_id":          ""
+                    , "annal:field_entity_type": ""
+                    , "rdfs:label":             ""
+                    , "rdfs:comment":           ""
+                    , "annal:default_type":     ""
+                    , "annal:field_render_type": ""
+                    }
+                  , { 'entity_id':              "entity4"
+                    , 'entity_type_id':         "testtype"
+                    }
+                  ]
+                , 'field_id':                   'List_fields'
+                , 'field_placement':            get_placement_classes("small:0,12")
+                , 'group_id':                   'List_fields'
+                , 'group_field_descs':
+                    [ column("Entity_id",           "small:0,2")    # EntityId
+                    , column("Entity_type",         "small:2,2")    # EntityTypeId (select)
+                    , column("List_id",             "small:4,2")    # Slug
+                    , column("Field_entity_type",   "small:6,2")    # Identifier
+                    , column("Entity_label",        "small:8,2")    # Text
+                    , column("Entity_comment",      "small:10,2")   # Textarea
+                    , column("List_default_type",   "small:0,6")    # Type (select)
+                    , column("Field_render",        "small:6,6")    # Enum_choice (choice)
+                    ]
+                , 'context_extra_values':
+                    { 'request_url':            "/testsite/c/testcoll/l/"
+                    , 'continuation_url':       "/testsite/c/testcoll/"
+                    }
+                }
+            })
+        return listrow_context
+
+    def test_RenderRepeatGroupListRowTypes(self):
+        # Rendering using compiled list rows must be the same as using the templates
+        # for every render type handled, including empty and missing values, and
+        # values without links
+        field_descs   = self.get_listrow_types_context()['field']['group_field_descs']
+        view_files    = [ _field_view_files[f['field_render_type']] for f in field_descs ]
+        for v in _listrow_values:
+            self.assertIn(v, view_files)
+        fieldrender   = RenderRepeatGroup(render_repeatgroup.view_listrow)
+        expect_text   = fieldrender.render(self.get_listrow_types_context())
+        rowcompiler   = lambda descs, extras: compile_listrow(descs, _field_view_files, extras)
+        self.assertIsNotNone(rowcompiler(field_descs, {}))
+        fieldrender   = RenderRepeatGroup(render_repeatgroup.view_listrow, row_compiler=rowcompiler)
+        rendered_text = fieldrender.render(self.get_listrow_types_context())
+        self.assertEqual(rendered_text, expect_text)
+        expect_elements = (
+            [ '''<a href="/testsite/c/testcoll/d/_type/Default_type/'''+
+              '''?continuation_url=/testsite/c/testcoll/l/'''+
+              '''%3Fcontinuation_url=/testsite/c/testcoll/">Default_type</a>'''
+            , '''<a href="">no_type</a>'''
+            , '''Entity 1\n&lt;b&gt;comment&lt;/b&gt; &amp; more'''
+            ])
+        for e in expect_elements:
+            self.assertIn(e, rendered_text)
+        return
+
     def test_RenderRepeatGroupEdit(self):
         fieldrender   = RenderRepeatGroup(render_repeatgroup.edit_group)
         rendered_text = fieldrender.render(self.get_repeatgroup_context())
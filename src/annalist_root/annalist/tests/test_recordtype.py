@@ -35,6 +35,7 @@ from annalist.models.recordview         import RecordView
 from annalist.models.recordlist         import RecordList
 
 from annalist.views.recordtypedelete    import RecordTypeDeleteConfirmedView
+from annalist.views.displayinfo         import collection_type_info
 
 from tests                              import TestHost, TestHostUri, TestBasePath, TestBaseUri, TestBaseDir
 from tests                              import init_annalist_test_site
@@ -147,6 +148,26 @@ class RecordTypeTest(AnnalistTestCase):
         self.assertDictionaryMatch(td, v)
         return
 
+    def test_recordtype_type_info_cache(self):
+        ti1 = collection_type_info(self.testsite, self.testcoll, "type1")
+        self.assertIsNone(ti1.recordtype)
+        RecordType.create(self.testcoll, "type1", recordtype_create_values(type_id="type1"))
+        ti2 = collection_type_info(self.testsite, self.testcoll, "type1")
+        self.assertIsNot(ti2, ti1)
+        self.assertEqual(ti2.recordtype.get_id(), "type1")
+        self.assertIs(collection_type_info(self.testsite, self.testcoll, "type1"), ti2)
+        # Update type definition
+        t = RecordType.load(self.testcoll, "type1")
+        t[RDFS.CURIE.label] = "Updated type label"
+        t._save()
+        ti3 = collection_type_info(self.testsite, self.testcoll, "type1")
+        self.assertIsNot(ti3, ti2)
+        self.assertEqual(ti3.recordtype[RDFS.CURIE.label], "Updated type label")
+        # Site-wide type
+        ti4 = collection_type_info(self.testsite, self.testcoll, "_type")
+        self.assertIs(collection_type_info(self.testsite, self.testcoll, "_type"), ti4)
+        return
+
 #   -----------------------------------------------------------------------------
 #
 #   RecordTypeEditView tests
@@ -20,6 +20,11 @@ from django.conf import settings
 import annalist.util
 import annalist.views.fields.render_utils
 import annalist.views.fields.render_placement
+import annalist.views.requesttrace
+import annalist.models.entityindex
+import annalist.models.entitycache
+import annalist.models.entityloader
+import annalist.views.form_utils.fielddescription
 
 from annalist.layout import Layout
 
@@ -76,6 +81,11 @@ def load_tests(loader, tests, ignore):
         tests.addTests(doctest.DocTestSuite(annalist.views.fields.bound_field))
         tests.addTests(doctest.DocTestSuite(annalist.views.fields.render_placement))
         tests.addTests(doctest.DocTestSuite(annalist.models.entityfinder))
+        tests.addTests(doctest.DocTestSuite(annalist.models.entityindex))
+        tests.addTests(doctest.DocTestSuite(annalist.models.entitycache))
+        tests.addTests(doctest.DocTestSuite(annalist.models.entityloader))
+        tests.addTests(doctest.DocTestSuite(annalist.views.form_utils.fielddescription))
+        tests.addTests(doctest.DocTestSuite(annalist.views.requesttrace))
     else:
         log.warning("Skipping doctests for non-posix system")
     return tests
@@ -19,6 +19,17 @@ import urlparse
 import json
 import shutil
 import StringIO
+import uuid
+import contextlib
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None                # e.g. Windows
+
+#   Lock files held by the current thread (see `file_lock`)
+_file_locks_held = threading.local()
 
 from django.conf import settings
 
@@ -241,6 +252,106 @@ def strip_comments(f):
     fnc.seek(sof)
     return fnc
 
+def replace_file(path, write_f, durability="none"):
+    """
+    Write a file such that a concurrent reader sees either the original content 
+    of the file or the complete new content, and never a partly written file.
+
+    The new content is written to a temporary file in the same directory, which 
+    then replaces (is renamed to) the indicated file.  (On Windows, where a file
+    cannot be renamed to replace an existing file, the original file is removed 
+    first, so a reader may briefly find no file.)
+
+    path        is the name of the file to be written.
+    write_f     is a function that is called with a file object opened for 
+                writing, and which writes the new file content.
+    durability  is one of:
+                "none"  the file content is written to disk by the operating
+                        system in due course.
+                "file"  the new file content is written to disk before it 
+                        replaces the original file.
+                "dir"   as "file", and the directory containing the file is 
+                        also written to disk before returning, so the change 
+                        persists if the system then crashes.
+    """
+    tmppath = "%s.%s.tmp"%(path, uuid.uuid4().hex)
+    fd = os.open(tmppath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0666)
+    try:
+        with os.fdopen(fd, "wt") as f:
+            write_f(f)
+            if durability in ("file", "dir"):
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            os.rename(tmppath, path)
+        except OSError as e:
+            if not (os.name == "nt" and e.errno == errno.EEXIST):
+                raise
+            os.remove(path)
+            os.rename(tmppath, path)
+    except:
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+        raise
+    if durability == "dir" and hasattr(os, "O_DIRECTORY"):
+        dirfd = os.open(os.path.dirname(path) or ".", os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dirfd)
+        finally:
+            os.close(dirfd)
+    return
+
+@contextlib.contextmanager
+def file_lock(path, blocking=True):
+    """
+    Context manager that holds an exclusive lock on the indicated file, which
+    is created if needed, while the body of a `with` statement is executed.
+
+    The lock is advisory: it excludes only other threads and processes that 
+    lock the same file.  A thread that already holds the lock may lock the file
+    again (e.g. in a nested function call) without waiting.  Where file locking 
+    is not available (e.g. Windows), no lock is held.
+
+    The value of the `with` statement's `as` target is True if the lock is held,
+    or False if `blocking` is False and the lock is held by another thread or
+    process, in which case the body is executed without waiting for the lock.
+
+    path        is the name of the lock file.
+    blocking    is False if the lock is to be taken only if it is immediately
+                available.
+    """
+    path = os.path.abspath(path)
+    held = _file_locks_held.__dict__.setdefault("paths", set())
+    if fcntl is None or path in held:
+        yield True
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0666)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError, e:
+            if blocking or e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            yield False
+            return
+        held.add(path)
+        try:
+            yield True
+        finally:
+            held.discard(path)
+    finally:
+        os.close(fd)            # Also releases the lock
+    return
+
+@contextlib.contextmanager
+def no_lock():
+    """
+    Context manager that holds no lock, used where no lock is needed in place of
+    `file_lock`.
+    """
+    yield True
+    return
+
 def renametree_temp(src):
     """
     Rename tree to temporary name, and return that name, or 
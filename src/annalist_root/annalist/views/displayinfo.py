@@ -11,6 +11,8 @@ __author__      = "Graham Klyne (GK@ACM.ORG)"
 __copyright__   = "Copyright 2014, G. Klyne"
 __license__     = "MIT (http://opensource.org/licenses/MIT)"
 
+import hashlib
+
 import logging
 log = logging.getLogger(__name__)
 
@@ -18,10 +20,14 @@ from django.conf                    import settings
 from django.http                    import HttpResponse
 from django.http                    import HttpResponseRedirect
 from django.core.urlresolvers       import resolve, reverse
+from django.middleware.csrf         import get_token
 
+import annalist
 from annalist.identifiers           import RDF, RDFS, ANNAL
 from annalist                       import message
 
+from annalist.models.entitycache    import file_status
+
 from annalist.models.entitytypeinfo import EntityTypeInfo
 from annalist.models.collection     import Collection
 from annalist.models.recordtype     import RecordType
@@ -30,6 +36,8 @@ from annalist.models.recordlist     import RecordList
 from annalist.models.recordview     import RecordView
 
 from annalist.views.uri_builder     import uri_with_params
+from annalist.views.form_utils.fieldplancache import type_info_cache, entity_type_dependencies
+from annalist.views.form_utils.fieldplancache import entity_file_dependencies
 
 #   -------------------------------------------------------------------------------------------
 #
@@ -47,6 +55,30 @@ authorization_map = (
     , "auth_delete_coll":   ["DELETE_COLLECTION", "ADMIN"]
     })
 
+#   -------------------------------------------------------------------------------------------
+#
+#   Collection-scoped type information
+#
+#   -------------------------------------------------------------------------------------------
+
+def collection_type_info(site, coll, type_id):
+    """
+    Returns a type information object for the indicated type in the indicated 
+    collection.  The object returned may be shared with other requests, and is 
+    re-used until the collection metadata or the type definition is changed.
+
+    site        is the current site object.
+    coll        is the collection object in which the type is used.
+    type_id     is the type identifier.
+    """
+    key      = (type_id, coll.get_url())
+    typeinfo = type_info_cache.get(coll, key)
+    if typeinfo is None:
+        deps     = entity_type_dependencies(site, coll, type_id)
+        typeinfo = EntityTypeInfo(site, coll, type_id)
+        type_info_cache.put(coll, key, typeinfo, deps)
+    return typeinfo
+
 #   -------------------------------------------------------------------------------------------
 #
 #   Display information class
@@ -88,6 +120,8 @@ class DisplayInfo(object):
         self.entity_id      = None
         # self.entitydata     = None
         self.http_response  = None
+        self._typeinfos     = {}
+        self._generation    = None
         return
 
     def get_site_info(self, reqhost):
@@ -122,7 +156,7 @@ class DisplayInfo(object):
             assert ((self.site and self.collection) is not None)
             if type_id:
                 self.type_id        = type_id
-                self.entitytypeinfo = EntityTypeInfo(self.site, self.collection, type_id)
+                self.entitytypeinfo = self.entity_type_info(type_id)
                 if not self.entitytypeinfo.recordtype:
                     # log.warning("DisplayInfo.get_type_data: RecordType %s not found"%type_id)
                     self.http_response = self.view.error(
@@ -133,6 +167,17 @@ class DisplayInfo(object):
                         )
         return self.http_response
 
+    def entity_type_info(self, type_id):
+        """
+        Returns a type information object for the indicated type in the current
+        collection, which is shared by all uses within the current request.
+        """
+        assert ((self.site and self.collection) is not None)
+        key = (self.collection.get_id(), type_id)
+        if key not in self._typeinfos:
+            self._typeinfos[key] = collection_type_info(self.site, self.collection, type_id)
+        return self._typeinfos[key]
+
     def get_list_info(self, list_id):
         """
         Retrieve list definition to use for display
@@ -283,7 +328,7 @@ class DisplayInfo(object):
         redirect_uri = None
         typeinfo     = (
             self.entitytypeinfo or 
-            EntityTypeInfo(self.site, self.collection, entity_type)
+            self.entity_type_info(entity_type)
             )
         if not typeinfo.entityclass.exists(typeinfo.entityparent, entity_id):
             redirect_uri = (
@@ -406,6 +451,104 @@ class DisplayInfo(object):
                 })
         return context
 
+    def get_generation(self):
+        """
+        Returns the generation counter of the current collection (see
+        `Collection.get_generation`), or None.  The value is obtained at most once
+        for each request, so that a response is described consistently.
+        """
+        if self._generation is None and self.collection:
+            self._generation = self.collection.get_generation()
+        return self._generation
+
+    def get_etag(self, *values):
+        """
+        Returns a strong entity tag (ETag) value for the display described by the 
+        current object, or None if no entity tag can be determined.
+
+        The entity tag changes whenever anything on which the display may depend is
+        changed:  the collection generation, which is increased by any change to 
+        an entity in the collection (including view, list, field and type
+        definitions, and entities used to populate enumerated value options), the 
+        site and collection metadata, the list or view definition (including a 
+        site-wide definition), the directories of entities of a listed type, and 
+        the identity and permissions of the requesting user.  The request URI is
+        not included, as an entity tag applies only to the resource from which it 
+        was obtained.
+
+        values      are any additional values on which the display depends; e.g. 
+                    the status of the file of an entity displayed.
+        """
+        generation = self.get_generation()
+        if self.http_response or generation is None:
+            return None
+        user_id, user_uri = self.view.get_user_identity()
+        perms      = self.get_permission_list()
+        deps       = self.get_definition_dependencies()
+        if self.recordlist and self.entitytypeinfo:
+            # Entities may be added or removed without going through Annalist
+            typeinfo = self.entitytypeinfo
+            deps += (
+                [ (d, file_status(d)) 
+                  for d in typeinfo.entityparent._child_dirs(
+                        typeinfo.entityclass, typeinfo.entityaltparent
+                        )
+                  if d
+                ])
+        tag = repr(
+            ( annalist.__version__, self.action
+            , user_id, user_uri, perms, get_token(self.view.request)
+            , generation, deps, values
+            ))
+        return '"%s"'%(hashlib.sha1(tag).hexdigest(),)
+
+    def get_render_key(self, *values):
+        """
+        Returns a key for saving rendered content of the display described by the 
+        current object (see `AnnalistGenericView.render_fragment`), or None if the
+        content should not be saved.
+
+        The key changes whenever the collection generation, the site or collection
+        metadata or the view definition are changed, and depends on the permissions 
+        of the requesting user, but not their identity, so that content may be 
+        rendered once for all users with the same permissions.
+
+        values      are any additional values on which the content depends; e.g. 
+                    the entity displayed and its version.
+        """
+        generation = self.get_generation()
+        if self.http_response or generation is None:
+            return None
+        key = repr(
+            ( annalist.__version__, self.action
+            , self.coll_id, self.type_id, self.view_id
+            , self.get_permission_list()
+            , generation, self.get_definition_dependencies(), values
+            ))
+        return "annalist:render:%s"%(hashlib.sha1(key).hexdigest(),)
+
+    def get_permission_list(self):
+        """
+        Returns a sorted list of the permissions of the requesting user for the 
+        current collection.
+        """
+        user_perms = self.view.get_permissions(self.collection)
+        return sorted(user_perms[ANNAL.CURIE.user_permissions]) if user_perms else []
+
+    def get_definition_dependencies(self):
+        """
+        Returns a list of (path, status) pairs for the site and collection metadata
+        and list or view definition files on which the current display depends.
+        """
+        deps = (
+            entity_file_dependencies(self.site) + 
+            entity_file_dependencies(self.collection)
+            )
+        for e in (self.recordlist, self.recordview):
+            if e:
+                deps += entity_file_dependencies(e)
+        return deps
+
     def __str__(self):
         attrs = (
             [ "view"
@@ -27,10 +27,12 @@ from annalist.models.recordview         import RecordView
 from annalist.models.recordfield        import RecordField
 from annalist.models.recordtypedata     import RecordTypeData
 from annalist.models.entitydata         import EntityData
+from annalist.models.entitycache        import file_status
 
 from annalist.views.uri_builder         import uri_base, uri_with_params
 from annalist.views.displayinfo         import DisplayInfo
 from annalist.views.generic             import AnnalistGenericView
+from annalist.views.requesttrace        import request_trace, trace_phase, trace_detail
 
 from annalist.views.fielddescription    import FieldDescription, field_description_from_view_field
 from annalist.views.entityvaluemap      import EntityValueMap
@@ -76,6 +78,7 @@ baseentityvaluemap  = (
         , SimpleValueMap(c='view_id',          e=None,                    f='view_id'          )
         , SimpleValueMap(c='orig_id',          e=None,                    f='orig_id'          )
         , SimpleValueMap(c='orig_type',        e=None,                    f='orig_type'        )
+        , SimpleValueMap(c='orig_version',     e=None,                    f='orig_version'     )
         , SimpleValueMap(c='action',           e=None,                    f='action'           )
         , SimpleValueMap(c='continuation_url', e=None,                    f='continuation_url' )
         # Field data is handled separately during processing of the form description
@@ -98,6 +101,7 @@ class GenericEntityEditView(AnnalistGenericView):
     """
 
     _entityformtemplate = 'annalist_entity_edit.html'
+    _entityfieldstemplate = 'annalist_entity_edit_fields.html'
 
     def __init__(self):
         super(GenericEntityEditView, self).__init__()
@@ -105,31 +109,23 @@ class GenericEntityEditView(AnnalistGenericView):
 
     # GET
 
+    @request_trace("entityedit.get", "coll_id", "type_id", "entity_id", "view_id", "action")
     def get(self, request, 
             coll_id=None, type_id=None, entity_id=None, 
             view_id=None, action=None):
         """
         Create a form for editing an entity.
         """
-        log.info(
-            "views.entityedit.get:  coll_id %s, type_id %s, entity_id %s, view_id %s, action %s"%
-              (coll_id, type_id, entity_id, view_id, action)
-            )
-        # log.log(settings.TRACE_FIELD_VALUE,
-        #     "views.entityedit.get %s"%(self.get_request_path())
-        #     )
-        # log.log(settings.TRACE_FIELD_VALUE,
-        #     "    coll_id %s, type_id %s, entity_id %s, view_id %s, action %s"%
-        #       (coll_id, type_id, entity_id, view_id, action)
-        #     )
         action   = action or "edit"     # Default action (@@TODO: 'view' when read-only views defined)
         viewinfo = self.view_setup(action, coll_id, type_id, view_id, entity_id)
         if viewinfo.http_response:
             return viewinfo.http_response
+        trace_phase("setup")
 
         # Create local entity object or load values from existing
         typeinfo = viewinfo.entitytypeinfo
         entity   = self.get_entity(viewinfo.entity_id, typeinfo, action)
+        trace_phase("load")
         if entity is None:
             entity_label = (message.ENTITY_MESSAGE_LABEL%
                 { 'coll_id':    viewinfo.coll_id
@@ -141,37 +137,40 @@ class GenericEntityEditView(AnnalistGenericView):
                     message=message.DOES_NOT_EXIST%{'id': entity_label}
                     )
                 )
+        # Respond without rendering if the client has a current copy of the form.
+        # A new entity Id is allocated for each "new" form, so it is never re-used.
+        etag = None
+        body = entity._exists_path()
+        if body and (action != "new"):
+            etag = viewinfo.get_etag(entity.get_id(), body, file_status(body))
+            not_modified = self.not_modified(etag)
+            if not_modified:
+                return self.set_etag(not_modified, etag, viewinfo.get_generation())
         # @@TODO: build context_extra_values here and pass into form_render.
         #         eventually, form_render will ideally be used for both GET and POST 
         #         handlers that respond with a rendered form.
         add_field        = request.GET.get('add_field', None)
         continuation_url = request.GET.get('continuation_url', "")
-        return self.form_render(viewinfo, entity, add_field, continuation_url)
+        return self.set_etag(
+            self.form_render(viewinfo, entity, add_field, continuation_url), 
+            etag, viewinfo.get_generation()
+            )
 
     # POST
 
+    @request_trace("entityedit.post", "coll_id", "type_id", "entity_id", "view_id", "action")
     def post(self, request,
             coll_id=None, type_id=None, entity_id=None, 
             view_id=None, action=None):
         """
         Handle response from generic entity editing form.
         """
-        log.info(
-            "views.entityedit.post: coll_id %s, type_id %s, entity_id %s, view_id %s, action %s"%
-              (coll_id, type_id, entity_id, view_id, action)
-            )
-        log.log(settings.TRACE_FIELD_VALUE,
-            "views.entityedit.post %s"%(self.get_request_path())
-            )
-        log.log(settings.TRACE_FIELD_VALUE,
-            "    coll_id %s, type_id %s, entity_id %s, view_id %s, action %s"%
-              (coll_id, type_id, entity_id, view_id, action)
-            )
-        log.debug("  form data %r"%(request.POST))
+        trace_detail("form data %r", request.POST)
         action               = request.POST.get('action', action)
         viewinfo = self.view_setup(action, coll_id, type_id, view_id, entity_id)
         if viewinfo.http_response:
             return viewinfo.http_response
+        trace_phase("setup")
         # Get key form data values
         # Except for entity_id, use values from URI when form does not supply a value
         entity_id            = request.POST.get('entity_id', None)
@@ -201,6 +200,7 @@ class GenericEntityEditView(AnnalistGenericView):
             , 'view_choices':     self.get_view_choices_field(viewinfo)
             , 'orig_id':          orig_entity_id
             , 'orig_type':        orig_entity_type_id
+            , 'orig_version':     request.POST.get('orig_version', "")
             , 'view_id':          view_id
             })
         message_vals = {'id': entity_id, 'type_id': type_id, 'coll_id': coll_id}
@@ -316,9 +316,23 @@ class GenericEntityEditView(AnnalistGenericView):
         type_id   = viewinfo.type_id
         entity_id = entity.get_id()
         coll      = viewinfo.collection
+        # Use saved rendering of the form fields if the stored entity is displayed
+        # read-only.  Edit forms are always rendered afresh.
+        fields_key      = None
+        rendered_fields = None
+        if (viewinfo.action == "view") and not add_field and entity.get_version():
+            fields_key = viewinfo.get_render_key(
+                "entity_fields", entity_id, entity.get_version(), 
+                continuation_url, self.get_request_path()
+                )
+            rendered_fields = self.get_rendered_fragment(fields_key)
         # Set up initial view context
         # @@TODO: entity needed here?
-        entityvaluemap = self.get_view_entityvaluemap(viewinfo, entity)
+        if rendered_fields is None:
+            entityvaluemap = self.get_view_entityvaluemap(viewinfo, entity)
+        else:
+            # Form field values are not needed
+            entityvaluemap = EntityValueMap(baseentityvaluemap)
         if add_field:
             add_field_desc = self.find_repeat_id(entityvaluemap, add_field)
             if add_field_desc:
@@ -336,6 +350,7 @@ class GenericEntityEditView(AnnalistGenericView):
             , 'view_choices':       self.get_view_choices_field(viewinfo)
             , 'orig_id':            entity_id
             , 'orig_type':          type_id
+            , 'orig_version':       entity.get_version() or ""
             , 'view_id':            viewinfo.view_id
             })
         viewcontext = entityvaluemap.map_value_to_context(entityvals, 
@@ -343,11 +358,20 @@ class GenericEntityEditView(AnnalistGenericView):
             )
         # log.info("form_render: viewcontext %r"%(viewcontext,)) #@@
         viewcontext.update(viewinfo.context_data())
+        trace_phase("map")
+        if fields_key and (rendered_fields is None):
+            rendered_fields = self.render_fragment(
+                fields_key, viewcontext, self._entityfieldstemplate
+                )
+        if rendered_fields is not None:
+            viewcontext['rendered_fields'] = rendered_fields
         # Generate and return form data
-        return (
+        response = (
             self.render_html(viewcontext, self._entityformtemplate) or 
             self.error(self.error406values())
             )
+        trace_phase("render")
+        return response
 
     def form_re_render(self, 
             viewinfo, entityvaluemap, form_data, context_extra_values={}, 
@@ -378,8 +402,9 @@ class GenericEntityEditView(AnnalistGenericView):
         """
         Handle POST response from entity edit form.
         """
-        log.info("form_response entity_id %s, orig_entity_id %s, entity_type_id %s, orig_entity_type_id %s"%
-            (entity_id, orig_entity_id, entity_type_id, orig_entity_type_id)
+        trace_detail(
+            "form_response entity_id %s, orig_entity_id %s, entity_type_id %s, orig_entity_type_id %s",
+            entity_id, orig_entity_id, entity_type_id, orig_entity_type_id
             )
         form_data        = self.request.POST    
         continuation_url = context_extra_values['continuation_url']
@@ -639,37 +664,57 @@ class GenericEntityEditView(AnnalistGenericView):
                     error_message=messages['entity_not_exists']
                     )
 
-        # Assemble updated values for storage
-        #
-        # Note: form data is applied as update to original entity data so that
-        # values not in view are preserved.  Use original entity values without 
-        # field aliases as basis for new value.
-        orig_entity   = typeinfo.get_entity(entity_id, action)
-        orig_values   = orig_entity.get_values() if orig_entity else {}
-        entity_values = orig_values.copy()
-        # log.info("orig entity_values %r"%(entity_values,))
-        if action == "copy":
-            entity_values.pop(ANNAL.CURIE.uri, None)      # Force new URI on copy
-        entity_values.update(entityvaluemap.map_form_data_to_values(form_data))
-        entity_values[ANNAL.CURIE.type_id] = entity_type_id
-        entity_values[ANNAL.CURIE.type]    = new_typeinfo.entityclass._entitytype
-        # log.info("save entity_values%r"%(entity_values))
-
-        # Create/update stored data now
-        if not entity_id_changed:
-            # Normal (non-type) entity create or update, no renaming
-            err_vals = self.create_update_entity(new_typeinfo, entity_id, entity_values)
-        elif "_type" not in [entity_type_id, orig_entity_type_id]:
-            # Non-type record rename
-            err_vals = self.rename_entity(
-                typeinfo, orig_entity_id, new_typeinfo, entity_id, entity_values
-                )
-        else:
-            err_vals = self.rename_entity_type(
-                viewinfo, 
-                typeinfo, orig_entity_id, 
-                new_typeinfo, entity_id, entity_values
-                )
+        # Hold update lock while checking, reading and updating the stored entity,
+        # so that concurrent edits of the same entity cannot be lost.
+        with viewinfo.collection.entity_update_lock():
+
+            # Check entity being edited is unchanged since it was displayed
+            if action == "edit":
+                conflict_vals = self.check_entity_version(
+                    typeinfo, orig_entity_id, form_data.get('orig_version', None)
+                    )
+                if conflict_vals:
+                    (err_head, err_message, current_version) = conflict_vals
+                    context_extra_values = dict(context_extra_values,
+                        orig_version=current_version or ""
+                        )
+                    return self.form_re_render(
+                        viewinfo, entityvaluemap, form_data, context_extra_values,
+                        error_head=err_head,
+                        error_message=err_message
+                        )
+
+            # Assemble updated values for storage
+            #
+            # Note: form data is applied as update to original entity data so that
+            # values not in view are preserved.  Use original entity values without 
+            # field aliases as basis for new value.
+            orig_entity   = typeinfo.get_entity(entity_id, action)
+            orig_values   = orig_entity.get_values() if orig_entity else {}
+            entity_values = orig_values.copy()
+            # log.info("orig entity_values %r"%(entity_values,))
+            if action == "copy":
+                entity_values.pop(ANNAL.CURIE.uri, None)      # Force new URI on copy
+            entity_values.update(entityvaluemap.map_form_data_to_values(form_data))
+            entity_values[ANNAL.CURIE.type_id] = entity_type_id
+            entity_values[ANNAL.CURIE.type]    = new_typeinfo.entityclass._entitytype
+            # log.info("save entity_values%r"%(entity_values))
+
+            # Create/update stored data now
+            if not entity_id_changed:
+                # Normal (non-type) entity create or update, no renaming
+                err_vals = self.create_update_entity(new_typeinfo, entity_id, entity_values)
+            elif "_type" not in [entity_type_id, orig_entity_type_id]:
+                # Non-type record rename
+                err_vals = self.rename_entity(
+                    typeinfo, orig_entity_id, new_typeinfo, entity_id, entity_values
+                    )
+            else:
+                err_vals = self.rename_entity_type(
+                    viewinfo, 
+                    typeinfo, orig_entity_id, 
+                    new_typeinfo, entity_id, entity_values
+                    )
         if err_vals:
             return self.form_re_render(
                 viewinfo, entityvaluemap, form_data, context_extra_values,
@@ -679,6 +724,40 @@ class GenericEntityEditView(AnnalistGenericView):
 
         return None
 
+    def check_entity_version(self, typeinfo, entity_id, entity_version):
+        """
+        Check that an entity being edited has not been updated or removed since
+        it was displayed for editing.  This is called while holding the collection 
+        entity update lock, so the entity cannot then be changed by another request 
+        before it is saved.
+
+        typeinfo        EntityTypeInfo object for the entity
+        entity_id       id of the entity being edited
+        entity_version  version of the entity data displayed for editing (see 
+                        `EntityRoot.get_version`), or None or an empty string if 
+                        no version is available, in which case no check is made.
+
+        Returns None if the entity is unchanged, otherwise a tuple of message
+        heading, message body and the current version of the entity (None if 
+        the entity has been removed).  Re-displaying the form with the current 
+        version allows the user to confirm their changes by saving again.
+        """
+        if not entity_version:
+            return None
+        entity  = typeinfo.get_entity(entity_id)
+        current = entity.get_version() if entity else None
+        if current == entity_version:
+            return None
+        log.warning(
+            "EntityEdit.check_entity_version: %s/%s changed, version %s, expected %s"%
+                (typeinfo.type_id, entity_id, current, entity_version)
+            )
+        return (
+            message.ENTITY_CHANGED, 
+            message.ENTITY_UPDATE_CONFLICT%(typeinfo.type_id, entity_id),
+            current
+            )
+
     def rename_entity_type(self,
             viewinfo,
             old_typeinfo, old_type_id, 
@@ -694,8 +773,6 @@ class GenericEntityEditView(AnnalistGenericView):
         details to be displayed as a pair of values for the message 
         heading and the message body.
         """
-        # NOTE: old RecordData instance is not removed.
-
         # Don't allow type-rename to or from a type value
         if old_typeinfo.type_id != new_typeinfo.type_id:
             log.warning(
@@ -713,31 +790,25 @@ class GenericEntityEditView(AnnalistGenericView):
         # Create new type record
         new_typeinfo.create_entity(new_type_id, type_data)
 
-        # Update instances of type
-        src_typeinfo = EntityTypeInfo(
-            viewinfo.site, viewinfo.collection, old_type_id
-            )
-        dst_typeinfo = EntityTypeInfo(
-            viewinfo.site, viewinfo.collection, new_type_id, 
-            create_typedata=True
-            )
         if new_typeinfo.entity_exists(new_type_id):
-            # Enumerate type instance records and move to new type
-            remove_OK = True
-            for d in src_typeinfo.enum_entities():
-                data_id   = d.get_id()
-                data_vals = d.get_values()
-                data_vals[ANNAL.CURIE.type_id] = new_type_id
-                data_vals[ANNAL.CURIE.type]    = dst_typeinfo.entityclass._entitytype
-                if self.rename_entity(
-                    src_typeinfo, data_id, 
-                    dst_typeinfo, data_id, data_vals
-                    ):
-                    remove_OK = False
-            # Finally, remove old type record:
-            if remove_OK:       # Precautionary
-                new_typeinfo.remove_entity(old_type_id)
-                RecordTypeData.remove(new_typeinfo.entitycoll, old_type_id)
+            # Move instances of type to new type, then remove old type record
+            try:
+                not_moved = viewinfo.collection.rename_type(old_type_id, new_type_id)
+            except (IOError, OSError), e:
+                log.error(
+                    "EntityEdit.rename_entity_type: %s to %s, %s"%
+                    (old_type_id, new_type_id, e)
+                    )
+                return (
+                    message.SYSTEM_ERROR, 
+                    message.RENAME_TYPE_FAILED%(old_type_id, new_type_id)
+                    )
+            if not_moved:
+                return (
+                    message.RENAME_TYPE_INCOMPLETE%(old_type_id, new_type_id),
+                    message.RENAME_TYPE_ENTITIES_EXIST%
+                        (new_type_id, ", ".join(sorted(not_moved)), old_type_id)
+                    )
         else:
             log.warning(
                 "Failed to rename type %s to type %s"%
@@ -994,9 +1065,9 @@ class GenericEntityEditView(AnnalistGenericView):
                 log.debug("find_fields: field_desc %r"%(field_desc))
                 if filter_f(field_desc):
                     field_desc['group_list'] = group_list
-                    log.info(
-                        "entityedit.find_fields: field name %s, prefixes %r"%
-                        (field_desc.get_field_name(), group_list)
+                    trace_detail(
+                        "entityedit.find_fields: field name %s, prefixes %r",
+                        field_desc.get_field_name(), group_list
                         )
                     yield field_desc
                 if field_desc.has_field_group_ref():
@@ -1008,9 +1079,9 @@ class GenericEntityEditView(AnnalistGenericView):
                             (groupref, field_desc['field_id'])
                             )
                     else:
-                        log.info(
-                            "entityedit.find_fields: Group field desc %s: %s"%
-                            (groupref, field_desc['field_id'])
+                        trace_detail(
+                            "entityedit.find_fields: Group field desc %s: %s",
+                            groupref, field_desc['field_id']
                             )
                         group_fields   = field_desc['group_field_descs']
                         new_group_list = group_list + [field_desc['group_id']]
@@ -1034,7 +1105,7 @@ class GenericEntityEditView(AnnalistGenericView):
 
         Returns the full name of the field found, or None.
         """
-        log.info("form_data_contains: field_desc %r"%field_desc)
+        trace_detail("form_data_contains: field_desc %r", field_desc)
         field_name         = field_desc.get_field_name()
         field_name_postfix = "new"
         def _scan_groups(prefix, group_list):
@@ -1047,7 +1118,7 @@ class GenericEntityEditView(AnnalistGenericView):
             stop_all   = True
             if group_list == []:
                 try_field = prefix + field_name
-                log.info("form_data_contains: try_field %s"%try_field)
+                trace_detail("form_data_contains: try_field %s", try_field)
                 if try_field in form_data:
                     try_postfix = try_field + "__" + field_name_postfix
                     return (try_postfix in form_data, try_postfix)
@@ -24,10 +24,11 @@ from annalist.models.recordtypedata     import RecordTypeData
 from annalist.models.entitytypeinfo     import EntityTypeInfo, CONFIG_PERMISSIONS
 from annalist.models.entityfinder       import EntityFinder
 
-from annalist.views.uri_builder         import uri_with_params
+from annalist.views.uri_builder         import uri_with_params, continuation_params
 from annalist.views.displayinfo         import DisplayInfo
 from annalist.views.confirm             import ConfirmView, dict_querydict
 from annalist.views.generic             import AnnalistGenericView
+from annalist.views.requesttrace        import request_trace, trace_phase
 
 from annalist.views.fielddescription    import FieldDescription, field_description_from_view_field
 from annalist.views.entityvaluemap      import EntityValueMap
@@ -60,6 +61,8 @@ listentityvaluemap  = (
         , SimpleValueMap(c='default_view_enable',   e=None,                  f=None                  )
         , SimpleValueMap(c='search_for',            e=None,                  f='search_for'          )
         , SimpleValueMap(c='continuation_url',      e=None,                  f='continuation_url'    )
+        , SimpleValueMap(c='list_prev_url',         e=None,                  f=None                  )
+        , SimpleValueMap(c='list_next_url',         e=None,                  f=None                  )
         # Field data is handled separately during processing of the form description
         # Form and interaction control (hidden fields)
         ])
@@ -96,6 +99,41 @@ class EntityGenericListView(AnnalistGenericView):
         listinfo.check_authorization("list")
         return listinfo
 
+    def get_list_page(self, request):
+        """
+        Returns (offset, limit) values for the page of entities to be listed, 
+        based on request parameters `offset` and `limit`, and the `LIST_PAGE_SIZE`
+        setting.  A limit of None means that all entities are listed.
+        """
+        def int_param(name, default):
+            try:
+                val = int(request.GET.get(name, default))
+            except (TypeError, ValueError):
+                val = default
+            return val if (val is None or val >= 0) else default
+        limit = int_param('limit', getattr(settings, "LIST_PAGE_SIZE", None))
+        return (int_param('offset', 0) or 0, limit or None)
+
+    def get_list_page_urls(self, request, offset, limit, more):
+        """
+        Returns URLs for the previous and next pages of a paginated list, or None
+        where there is no such page.
+        """
+        prev_url = None
+        next_url = None
+        if limit:
+            params   = continuation_params(request.GET.dict())
+            base_url = self.get_request_path()
+            if offset > 0:
+                prev_url = uri_with_params(base_url, params, 
+                    offset=str(max(0, offset-limit)), limit=str(limit)
+                    )
+            if more:
+                next_url = uri_with_params(base_url, params, 
+                    offset=str(offset+limit), limit=str(limit)
+                    )
+        return (prev_url, next_url)
+
     def get_list_entityvaluemap(self, listinfo, context_extra_values):
         """
         Creates an entity/value map table in the current object incorporating
@@ -144,30 +182,43 @@ class EntityGenericListView(AnnalistGenericView):
 
     # GET
 
+    @request_trace("entitylist.get", "coll_id", "type_id", "list_id", "scope")
     def get(self, request, coll_id=None, type_id=None, list_id=None, scope=None):
         """
         Create a form for listing entities.
         """
-        log.info(
-            "views.entitylist.get:  coll_id %s, type_id %s, list_id %s, scope %s"%
-            (coll_id, type_id, list_id, scope)
-            )
         listinfo = self.list_setup(coll_id, type_id, list_id)
         if listinfo.http_response:
             return listinfo.http_response
-        log.debug("list_id %s"%listinfo.list_id)
+        etag     = listinfo.get_etag(scope)
+        not_modified = self.not_modified(etag)
+        trace_phase("setup")
+        if not_modified:
+            return self.set_etag(not_modified, etag, listinfo.get_generation())
         # Prepare list and entity IDs for rendering form
         selector    = listinfo.recordlist.get_values().get(ANNAL.CURIE.list_entity_selector, "")
         search_for  = request.GET.get('search', "")
         user_perms  = self.get_permissions(listinfo.collection)
+        offset, limit = self.get_list_page(request)
+        # Request one more entity than is displayed to see if there is a next page
         entity_list = (
             EntityFinder(listinfo.collection, selector=selector)
                 .get_entities_sorted(
                     user_perms, type_id=type_id, scope=scope,
-                    context=listinfo.recordlist, search=search_for
+                    context=listinfo.recordlist, search=search_for,
+                    offset=offset, limit=(limit+1 if limit else None)
                     )
             )
-        entityvallist = { '_list_entities_': [ get_entity_values(listinfo, e) for e in entity_list ] }
+        more        = bool(limit) and (len(entity_list) > limit)
+        entity_list = entity_list[:limit]
+        stream_rows = getattr(settings, "LIST_STREAM_ROWS", False)
+        if stream_rows:
+            entity_vals = ( get_entity_values(listinfo, e) for e in entity_list )
+        else:
+            entity_vals = [ get_entity_values(listinfo, e) for e in entity_list ]
+        trace_phase("load")
+        entityvallist = { '_list_entities_': entity_vals }
+        prev_url, next_url = self.get_list_page_urls(request, offset, limit, more)
         # Set up initial view context
         context_extra_values = (
             { 'continuation_url':       request.GET.get('continuation_url', "")
@@ -180,6 +231,8 @@ class EntityGenericListView(AnnalistGenericView):
             , 'collection_view':        self.view_uri("AnnalistCollectionView", coll_id=coll_id)
             , 'default_view_id':        listinfo.recordlist[ANNAL.CURIE.default_view]
             , 'default_view_enable':    ("" if list_id else 'disabled="disabled"')
+            , 'list_prev_url':          prev_url
+            , 'list_next_url':          next_url
             })
         entityvaluemap = self.get_list_entityvaluemap(listinfo, context_extra_values)
         listcontext = entityvaluemap.map_value_to_context(
@@ -188,11 +241,23 @@ class EntityGenericListView(AnnalistGenericView):
             )
         listcontext.update(listinfo.context_data())
         # log.debug("EntityGenericListView.get listcontext %r"%(listcontext))
+        trace_phase("map")
         # Generate and return form data
-        return (
-            self.render_html(listcontext, self._entityformtemplate) or 
+        if stream_rows:
+            # List rows are rendered, and the trace ended, as the response is sent
+            return self.set_etag(
+                self.render_html_stream(listcontext, self._entityformtemplate, "List_rows"),
+                etag, listinfo.get_generation()
+                )
+        response = (
+            self.set_etag(
+                self.render_html(listcontext, self._entityformtemplate), 
+                etag, listinfo.get_generation()
+                ) or 
             self.error(self.error406values())
             )
+        trace_phase("render")
+        return response
 
     # POST
 
@@ -200,7 +265,7 @@ class EntityGenericListView(AnnalistGenericView):
         """
         Handle response from dynamically generated list display form.
         """
-        log.info("views.entitylist.post: coll_id %s, type_id %s, list_id %s"%(coll_id, type_id, list_id))
+        log.debug("views.entitylist.post: coll_id %s, type_id %s, list_id %s", coll_id, type_id, list_id)
         # log.info("  %s"%(self.get_request_path()))
         # log.info("  form data %r"%(request.POST))
         continuation_next, continuation_here = self.continuation_urls(
@@ -303,7 +368,7 @@ class EntityGenericListView(AnnalistGenericView):
                     message_vals = {'id': entity_id, 'type_id': entity_type, 'coll_id': coll_id}
                     typeinfo = listinfo.entitytypeinfo
                     if typeinfo is None:
-                        typeinfo = EntityTypeInfo(listinfo.site, listinfo.collection, entity_type)
+                        typeinfo = listinfo.entity_type_info(entity_type)
                     return (
                         self.form_action_auth(
                             "delete", listinfo.collection, typeinfo.permissions_map
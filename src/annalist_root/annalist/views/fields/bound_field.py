@@ -16,7 +16,6 @@ from django.conf                    import settings
 
 from annalist.identifiers           import RDFS, ANNAL
 
-from annalist.models.entitytypeinfo import EntityTypeInfo
 from annalist.models.entity         import EntityRoot
 
 from annalist.views.uri_builder     import uri_params, uri_with_params, continuation_params
@@ -76,7 +75,11 @@ class bound_field(object):
     "<ul><li>key: def</li><li>val: default</li><li>field_description: {'field_property_uri': 'def', 'field_id': 'def_id', 'field_type': 'def_type'}</li></ul>"
     """
 
-    __slots__ = ("_field_description", "_entityvals", "_key", "_extras")
+    __slots__ = ( "_field_description", "_entityvals", "_key", "_extras"
+                , "_cparam"
+                # Values computed when first accessed (see `__getattr__`)
+                , "field_value", "field_value_link", "continuation_url"
+                )
 
     def __init__(self, field_description, entityvals, context_extra_values=None):
         """
@@ -95,7 +98,8 @@ class bound_field(object):
         self._entityvals        = entityvals
         self._key               = self._field_description['field_property_uri']
         self._extras            = context_extra_values
-        eid = entityvals.get('entity_id', "@@@render_utils.__init__@@@")
+        self._cparam            = None
+        # eid = entityvals.get('entity_id', "@@@render_utils.__init__@@@")
         # log.log(settings.TRACE_FIELD_VALUE,
         #     "bound_field: field_id %s, entity_id %s, value_key %s, value %s"%
         #     (field_description['field_id'], eid, self._key, self['field_value'])
@@ -107,11 +111,31 @@ class bound_field(object):
         Get a bound field description attribute.  If the attribute name is "field_value"
         then the value corresponding to the field description is retrieved from the entity,
         otherwise the named attribute is retrieved from thge field description.
+
+        The values of "field_value", "field_value_link" and "continuation_url" are 
+        saved in slots of the same name when first accessed, so that subsequent
+        accesses (which are frequent when rendering a field) do not come here.
         """
         # log.info("self._key %s, __getattr__ %s"%(self._key, name))
         # log.info("self._key %s"%self._key)
         # log.info("self._entity %r"%self._entity)
-        if name in ["entity_id", "entity_link", "entity_type_id", "entity_type_link"]:
+        if name == "field_value":
+            self.field_value = get_field_value(
+                self._field_description, self._entityvals, self._extras
+                )
+            return self.field_value
+        elif name == "field_value_link":
+            # Used to get link corresponding to a value, if such exists
+            self.field_value_link = self.get_field_link()
+            return self.field_value_link
+        elif name == "continuation_url":
+            if self._extras is None:
+                log.warning("bound_field.continuation_url - no extra context provided")
+                self.continuation_url = ""
+            else:
+                self.continuation_url = get_continuation_url(self._extras)
+            return self.continuation_url
+        elif name in _entity_value_names:
             return self._entityvals.get(name, "")
         elif name == "field_value_key":
             return self._key
@@ -119,37 +143,13 @@ class bound_field(object):
             return self._extras
         elif name == "field_placeholder":
             return self._field_description.get('field_placeholder', "@@bound_field.field_placeholder@@")
-        elif name == "continuation_url":
-            if self._extras is None:
-                log.warning("bound_field.continuation_url - no extra context provided")
-                return ""
-            cont = self._extras.get("request_url", "")
-            if cont:
-                cont = uri_with_params(cont, continuation_params(self._extras))
-            return cont
         elif name == "entity_link_continuation":
             return self.entity_link+self.get_continuation_param()
         elif name == "entity_type_link_continuation":
             return self.entity_type_link+self.get_continuation_param()
-        elif name == "field_value":
-            field_val = None
-            if self._key in self._entityvals:
-                field_val = self._entityvals[self._key]
-            elif self._extras and self._key in self._extras:
-                field_val = self._extras[self._key]
-            if field_val is None:
-                # Return default value, or empty string.
-                # Used to populate form field value when no value supplied, or provide per-field default
-                field_val = self._field_description.get('field_default_value', None)
-                if field_val is None:
-                    field_val = ""
-            return field_val
-        elif name == "field_value_link":
-            # Used to get link corresponding to a value, if such exists
-            return self.get_field_link()
         elif name == "field_value_link_continuation":
             # Used to get link corresponding to a value, if such exists
-            return self.get_field_link()+self.get_continuation_param()
+            return self.field_value_link+self.get_continuation_param()
         elif name == "field_description":
             # Used to get link corresponding to a value, if such exists
             return self._field_description
@@ -173,13 +173,18 @@ class bound_field(object):
         return options
 
     def get_continuation_param(self):
+        if self._cparam is not None:
+            return self._cparam
         cparam = self.continuation_url
         if cparam:
             cparam = uri_params({'continuation_url': cparam})
-        log.debug('bound_field.get_continuation_param %s'%(cparam,))  #@@
+        self._cparam = cparam
         return cparam
 
     def __getitem__(self, name):
+        if name in _memo_value_names:
+            # Use saved value if present
+            return getattr(self, name)
         return self.__getattr__(name)
 
     def __iter__(self):
@@ -235,6 +240,44 @@ class bound_field(object):
             "</ul>"
             )
 
+_entity_value_names = frozenset(
+    ["entity_id", "entity_link", "entity_type_id", "entity_type_link"]
+    )
+
+_memo_value_names = frozenset(
+    ["field_value", "field_value_link", "continuation_url"]
+    )
+
+def get_field_value(field_description, entityvals, extras):
+    """
+    Returns the value of a described field from the supplied entity values, or 
+    from the supplied extra context values, or the field default value, or an 
+    empty string.
+    """
+    key       = field_description['field_property_uri']
+    field_val = None
+    if key in entityvals:
+        field_val = entityvals[key]
+    elif extras and key in extras:
+        field_val = extras[key]
+    if field_val is None:
+        # Return default value, or empty string.
+        # Used to populate form field value when no value supplied, or provide per-field default
+        field_val = field_description.get('field_default_value', None)
+        if field_val is None:
+            field_val = ""
+    return field_val
+
+def get_continuation_url(extras):
+    """
+    Returns a continuation URL for links from the page being rendered, 
+    based on the request URL in the supplied extra context values.
+    """
+    cont = extras.get("request_url", "")
+    if cont:
+        cont = uri_with_params(cont, continuation_params(extras))
+    return cont
+
 def get_entity_values(displayinfo, entity, entity_id=None):
     """
     Returns an entity values dictionary for a supplied entity, suitable for
@@ -248,7 +291,7 @@ def get_entity_values(displayinfo, entity, entity_id=None):
     entityvals['entity_link']    = entity.get_view_url_path()
     # log.info("type_id %s"%(type_id))
     entityvals['entity_type_id'] = type_id
-    typeinfo   = EntityTypeInfo(displayinfo.site, displayinfo.collection, type_id)
+    typeinfo   = displayinfo.entity_type_info(type_id)
     if typeinfo.recordtype:
         entityvals['entity_type_link'] = typeinfo.recordtype.get_view_url_path()
         # @@other type-related info; e.g., aliases - populate 
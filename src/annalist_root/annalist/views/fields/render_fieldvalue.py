@@ -24,7 +24,10 @@ from django.http        import HttpResponse
 from django.template    import Template, Context
 
 import django
-django.setup()  # Needed for template loader
+from django.apps        import apps
+if not apps.models_ready:
+    # Needed for template loader, except when imported by AppConfig.ready()
+    django.setup()
 from django.template.loaders.app_directories    import Loader
  
 #   ------------------------------------------------------------
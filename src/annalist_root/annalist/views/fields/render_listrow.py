@@ -0,0 +1,174 @@
+"""
+Fast-path renderer for the rows of an entity list.
+
+Rendering a list row using the `view_listrow` repeat group template involves
+constructing a `bound_field` value and including a field value template for
+each column of each row.  For a list whose columns all use simple render types
+(text, identifiers and links), this module compiles the column descriptions
+into a single function that generates the HTML for a row directly, producing
+the same output as the templates.  Lists that have a column with any other
+render type are rendered using the templates.
+"""
+
+__author__      = "Graham Klyne (GK@ACM.ORG)"
+__copyright__   = "Copyright 2014, G. Klyne"
+__license__     = "MIT (http://opensource.org/licenses/MIT)"
+
+import logging
+log = logging.getLogger(__name__)
+
+from django.template.base               import render_value_in_context
+
+from annalist.views.uri_builder         import uri_params
+from annalist.views.fields.bound_field  import get_field_value, get_continuation_url
+
+#   ------------------------------------------------------------
+#   Row and column HTML
+#   ------------------------------------------------------------
+
+#   These correspond to the body of `render_repeatgroup.view_listrow`, with each
+#   column wrapped as by `render_fieldvalue.value_wrapper_template`.
+
+listrow_head = (
+    """\n"""+
+    """        <div class="trow row select-row">\n"""+
+    """          <div class="small-1 columns">\n"""+
+    """            <input type="checkbox" class="select-box right" name="entity_select" \n"""+
+    """                   value="%s/%s" />\n"""+
+    """          </div>\n"""+
+    """          <div class="small-11 columns">\n"""+
+    """            <div class="row">\n"""+
+    """              """
+    )
+
+listrow_column = (
+    """\n"""+
+    """              <div class="%s">  %s</div>\n"""+
+    """              """
+    )
+
+listrow_tail = (
+    """\n"""+
+    """            </div>\n"""+
+    """          </div>\n"""+
+    """        </div>\n"""+
+    """        """
+    )
+
+#   ------------------------------------------------------------
+#   Column value renderers
+#   ------------------------------------------------------------
+
+#   Each of these corresponds to a field value view template file, and is called
+#   as `render_value(field_desc, entityvals, field_val, cparam, context)` to return
+#   the HTML for a field value, where `cparam` is the continuation URI parameter
+#   for links from the list.
+
+def render_text(field_desc, entityvals, field_val, cparam, context):
+    # {{ field.field_value|default:"&nbsp;" }}
+    return render_value_in_context(field_val, context) if field_val else "&nbsp;"
+
+def render_textarea(field_desc, entityvals, field_val, cparam, context):
+    # {{field.field_value}}
+    return render_value_in_context(field_val, context)
+
+def render_entity_link(field_desc, entityvals, field_val, cparam, context):
+    # <a href="{{field.entity_link_continuation}}">{{field.field_value}}</a>
+    return '<a href="%s">%s</a>'%(
+        render_value_in_context(entityvals.get('entity_link', "")+cparam, context),
+        render_value_in_context(field_val, context)
+        )
+
+def render_value_link(field_desc, entityvals, field_val, cparam, context):
+    # <a href="{{field.field_value_link_continuation}}">{{field.field_value}}</a>
+    #
+    # If there is no link for the value, the template variable is not resolved
+    # and is rendered as an empty string.
+    links = field_desc.get('field_choice_links', None)
+    try:
+        link = links[field_val] if links and field_val in links else None
+    except TypeError:
+        link = None             # Unhashable value
+    return '<a href="%s">%s</a>'%(
+        render_value_in_context(link+cparam, context) if link is not None else "",
+        render_value_in_context(field_val, context)
+        )
+
+_listrow_values = (
+    { "field/annalist_view_text.html":
+        ( "<!-- field/annalist_view_text.html -->\n"
+        , render_text
+        )
+    , "field/annalist_view_slug.html":
+        ( "<!-- field/annalist_view_slug.html -->\n"
+        , render_text
+        )
+    , "field/annalist_view_identifier.html":
+        ( "<!-- field/annalist_view_identifier.html -->\n"
+        , render_text
+        )
+    , "field/annalist_view_textarea.html":
+        ( "<!-- field/annalist_view_textarea.html -->\n"+
+          "<!-- consider using http://pythonhosted.org//Markdown/reference.html here -->\n"
+        , render_textarea
+        )
+    , "field/annalist_view_entityid.html":
+        ( "<!-- field/annalist_view_entityid.html -->\n"
+        , render_entity_link
+        )
+    , "field/annalist_view_select.html":
+        ( "<!-- field/annalist_view_select.html -->\n"
+        , render_value_link
+        )
+    , "field/annalist_view_choice.html":
+        ( "<!-- field/annalist_view_choice.html -->\n"
+        , render_value_link
+        )
+    })
+
+#   ------------------------------------------------------------
+#   Row renderer
+#   ------------------------------------------------------------
+
+def compile_listrow(field_descs, view_files, extras):
+    """
+    Returns a function that renders a row of an entity list with the described
+    columns, or None if any column has a render type that is not handled here.
+
+    field_descs is a list of field descriptions for the list columns.
+    view_files  is a dictionary of field value view template file names, keyed
+                by render type (see `render_utils`).
+    extras      is a dictionary of extra context values used for rendering the
+                list, from which the continuation URI for links is obtained.
+
+    The function returned is called as `render_row(entityvals, context)`, and
+    returns the HTML for a row that displays the supplied entity values.
+    """
+    columns = []
+    for f in field_descs:
+        value_renderer = _listrow_values.get(view_files.get(f['field_render_type'], None), None)
+        if value_renderer is None:
+            log.debug("compile_listrow: no row renderer for %s"%(f['field_render_type'],))
+            return None
+        (value_comment, render_value) = value_renderer
+        columns.append((f, f['field_placement'].field, value_comment, render_value))
+    cont   = get_continuation_url(extras) if extras is not None else ""
+    cparam = uri_params({'continuation_url': cont}) if cont else ""
+    def render_row(entityvals, context):
+        parts = (
+            [ listrow_head%
+                ( render_value_in_context(entityvals.get('entity_type_id', ""), context)
+                , render_value_in_context(entityvals.get('entity_id', ""), context)
+                )
+            ])
+        for (f, field_class, value_comment, render_value) in columns:
+            field_val = get_field_value(f, entityvals, extras)
+            parts.append(listrow_column%
+                ( render_value_in_context(field_class, context)
+                , value_comment + render_value(f, entityvals, field_val, cparam, context)
+                ))
+        parts.append(listrow_tail)
+        return "".join(parts)
+    return render_row
+
+# End.
@@ -17,6 +17,7 @@ from django.http        import HttpResponse
 from django.template    import Template, Context
 
 from annalist.views.fields.bound_field  import bound_field
+from annalist.views.requesttrace        import trace_detail
 
 view_group = (      # @@TODO rationalize (see other; not currently used)
     { 'head':
@@ -299,10 +300,15 @@ class RenderRepeatGroup(object):
   Render class for repeated field group
   """
 
-  def __init__(self, templates=None):
+  def __init__(self, templates=None, row_compiler=None):
     # Later, may introduce a template_file= option to read from templates directory
     """
     Creates a renderer object for a simple text field
+
+    If `row_compiler` is supplied, it is called as 
+    `row_compiler(group_field_descs, extras)` when a group is rendered, and may 
+    return a function `render_row(entityvals, context)` that is used in place of
+    the body template to render each repeated value (see `render_listrow`).
     """
     # log.info("RenderRepeatGroup: __init__ %r"%(templates))
     super(RenderRepeatGroup, self).__init__()
@@ -310,6 +316,7 @@ class RenderRepeatGroup(object):
     self._template_head = Template(templates.get('head', ""))
     self._template_body = Template(templates.get('body', "@@missing body@@"))
     self._template_tail = Template(templates.get('tail', ""))
+    self._row_compiler  = row_compiler
     return
 
   def __str__(self):
@@ -331,41 +338,79 @@ class RenderRepeatGroup(object):
     being rendered, or a list of repeated values that are each formatted
     using the supplied body template.
     """
-    log.info("RenderRepeatGroup.render")
+    trace_detail("RenderRepeatGroup.render")
     try:
-        # log.info("RenderRepeatGroup.render field: %r"%(context['field'],))
-        # log.info("RenderRepeatGroup.render descs: %r"%(context['field']['group_field_descs'],))
-        response_parts = [self._template_head.render(context)]
-        repeat_index = 0
-        extras       = context['field']['context_extra_values']
-        for g in context['field']['field_value']:
-            log.debug("RenderRepeatGroup.render field_val: %r"%(g))
-            r = [ bound_field(f, g, context_extra_values=extras) 
-                  for f in context['field']['group_field_descs'] ]
-            repeat_id = context.get('repeat_prefix', "") + context['field']['group_id']
-            repeat_dict = (
-                { 'repeat_id':            repeat_id
-                , 'repeat_index':         str(repeat_index)
-                , 'repeat_prefix':        repeat_id+("__%d__"%repeat_index)
-                , 'repeat_bound_fields':  r
-                , 'repeat_entity':        g
-                })
-            # log.info("RenderRepeatGroup.render repeat_dict: %r"%(repeat_dict))
-            with context.push(repeat_dict):
-                response_parts.append(self._template_body.render(context))
-            repeat_index += 1
-        response_parts.append(self._template_tail.render(context))
+        response_parts = list(self._render_parts(context))
     except Exception as e:
-        log.exception("Exception in RenderRepeatGroup.render")
-        ex_type, ex, tb = sys.exc_info()
-        traceback.print_tb(tb)
-        response_parts = (
-            ["Exception in RenderRepeatGroup.render"]+
-            [repr(e)]+
-            traceback.format_exception(ex_type, ex, tb)+
-            ["***RenderRepeatGroup.render***"]
-            )
-        del tb
+        response_parts = self._render_exception(e)
     return "".join(response_parts)
 
+  def render_parts(self, context):
+    """
+    Renders a repeating field group as a sequence of strings, each of which is 
+    generated as it is required.  The group values (`context['field']['field_value']`)
+    may be supplied by an iterator, in which case each value is obtained only when 
+    it is needed to render the corresponding part.
+
+    This is used to stream the rendered content of long lists.
+    """
+    trace_detail("RenderRepeatGroup.render_parts")
+    try:
+        for part in self._render_parts(context):
+            yield part
+    except Exception as e:
+        for part in self._render_exception(e):
+            yield part
+    return
+
+  def _render_parts(self, context):
+    """
+    Iterate over the rendered parts of a repeating field group.
+    """
+    # log.info("RenderRepeatGroup.render field: %r"%(context['field'],))
+    # log.info("RenderRepeatGroup.render descs: %r"%(context['field']['group_field_descs'],))
+    yield self._template_head.render(context)
+    repeat_index = 0
+    extras       = context['field']['context_extra_values']
+    row_renderer = None
+    if self._row_compiler:
+        row_renderer = self._row_compiler(context['field']['group_field_descs'], extras)
+    for g in context['field']['field_value']:
+        if row_renderer:
+            yield row_renderer(g, context)
+            repeat_index += 1
+            continue
+        r = [ bound_field(f, g, context_extra_values=extras) 
+              for f in context['field']['group_field_descs'] ]
+        repeat_id = context.get('repeat_prefix', "") + context['field']['group_id']
+        repeat_dict = (
+            { 'repeat_id':            repeat_id
+            , 'repeat_index':         str(repeat_index)
+            , 'repeat_prefix':        repeat_id+("__%d__"%repeat_index)
+            , 'repeat_bound_fields':  r
+            , 'repeat_entity':        g
+            })
+        # log.info("RenderRepeatGroup.render repeat_dict: %r"%(repeat_dict))
+        with context.push(repeat_dict):
+            yield self._template_body.render(context)
+        repeat_index += 1
+    yield self._template_tail.render(context)
+    return
+
+  def _render_exception(self, e):
+    """
+    Returns list of strings describing an exception raised while rendering.
+    """
+    log.exception("Exception in RenderRepeatGroup.render")
+    ex_type, ex, tb = sys.exc_info()
+    traceback.print_tb(tb)
+    response_parts = (
+        ["Exception in RenderRepeatGroup.render"]+
+        [repr(e)]+
+        traceback.format_exception(ex_type, ex, tb)+
+        ["***RenderRepeatGroup.render***"]
+        )
+    del tb
+    return response_parts
+
 # End.
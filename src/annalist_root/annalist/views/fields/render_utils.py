@@ -19,6 +19,7 @@ from render_fieldvalue              import RenderFieldValue
 from render_placement               import get_field_placement_renderer
 from render_tokenset                import get_field_tokenset_renderer, TokenSetValueMapper
 from render_repeatgroup             import RenderRepeatGroup
+from render_listrow                 import compile_listrow
 import render_repeatgroup
 
 _field_renderers = {}
@@ -64,6 +65,25 @@ _field_get_renderer_functions = (
     , "TokenSet":       get_field_tokenset_renderer
     })
 
+_repeat_view_renderers = {}
+
+_repeat_edit_renderers = {}
+
+_repeat_view_templates = (
+    { "RepeatGroup":    render_repeatgroup.view_group
+    , "RepeatListRow":  render_repeatgroup.view_listrow
+    , "RepeatGroupRow": render_repeatgroup.view_grouprow
+    })
+
+_repeat_edit_templates = (
+    { "RepeatGroup":    render_repeatgroup.edit_group
+    , "RepeatGroupRow": render_repeatgroup.edit_grouprow
+    })
+
+_repeat_view_row_compilers = (
+    { "RepeatListRow":  lambda descs, extras: compile_listrow(descs, _field_view_files, extras)
+    })
+
 def get_field_renderer(renderid):
     if renderid not in _field_renderers:
         # Create and cache renderer
@@ -78,6 +98,27 @@ def get_field_renderer(renderid):
             _field_renderers[renderid] = _field_get_renderer_functions[renderid]()
     return _field_renderers.get(renderid, None)
 
+def get_repeat_renderer(renderers, templates, renderid, row_compilers=None):
+    """
+    Returns a repeat group renderer for the indicated render type, or None if 
+    the render type is not a repeat group.  Renderers are created when first 
+    requested, and shared by all subsequent requests.
+
+    renderers   is a dictionary of repeat group renderers already created.
+    templates   is a dictionary of templates for each repeat group render type.
+    renderid    is the render type for which a renderer is returned.
+    row_compilers
+                is a dictionary of functions, keyed by render type, that may be
+                used to compile a faster renderer for the rows of a repeat group
+                (see `render_listrow`).
+    """
+    if (renderid not in renderers) and (renderid in templates):
+        # Create and cache renderer
+        renderers[renderid] = RenderRepeatGroup(
+            templates[renderid], row_compiler=(row_compilers or {}).get(renderid, None)
+            )
+    return renderers.get(renderid, None)
+
 def get_edit_renderer(renderid):
     """
     Returns an field edit renderer object that can be referenced in a 
@@ -91,10 +132,9 @@ def get_edit_renderer(renderid):
         a context. This allows you to reference a compiled Template in your context.
         - https://docs.djangoproject.com/en/dev/ref/templates/builtins/#include
     """
-    if renderid == "RepeatGroup":
-        return RenderRepeatGroup(render_repeatgroup.edit_group)
-    if renderid == "RepeatGroupRow":
-        return RenderRepeatGroup(render_repeatgroup.edit_grouprow)
+    renderer = get_repeat_renderer(_repeat_edit_renderers, _repeat_edit_templates, renderid)
+    if renderer:
+        return renderer
     renderer = get_field_renderer(renderid)
     if renderer:
         return renderer.label_edit()
@@ -116,13 +156,20 @@ def get_view_renderer(renderid):
         The variable may also be any object with a render() method that accepts 
         a context. This allows you to reference a compiled Template in your context.
         - https://docs.djangoproject.com/en/dev/ref/templates/builtins/#include
+
+    Renderers are shared, so the same renderer object is returned each time:
+
+    >>> get_view_renderer("RepeatGroup") is get_view_renderer("RepeatGroup")
+    True
+    >>> get_view_renderer("RepeatGroup") is get_edit_renderer("RepeatGroup")
+    False
     """
-    if renderid == "RepeatGroup":
-        return RenderRepeatGroup(render_repeatgroup.view_group)
-    if renderid == "RepeatListRow":
-        return RenderRepeatGroup(render_repeatgroup.view_listrow)
-    if renderid == "RepeatGroupRow":
-        return RenderRepeatGroup(render_repeatgroup.view_grouprow)
+    renderer = get_repeat_renderer(
+        _repeat_view_renderers, _repeat_view_templates, renderid, 
+        row_compilers=_repeat_view_row_compilers
+        )
+    if renderer:
+        return renderer
     renderer = get_field_renderer(renderid)
     if renderer:
         return renderer.label_view()
@@ -176,6 +223,33 @@ def get_value_mapper(renderid):
     else:
         return RenderText()
 
+def warm_up_renderers():
+    """
+    Creates all of the field renderers, and compiles their templates, so that 
+    the first page rendered after the application starts does not incur the
+    cost of compiling them.  This is called when the application is loaded 
+    (see `annalist.apps`).
+    """
+    for renderid in _repeat_view_templates:
+        get_repeat_renderer(
+            _repeat_view_renderers, _repeat_view_templates, renderid, 
+            row_compilers=_repeat_view_row_compilers
+            )
+    for renderid in _repeat_edit_templates:
+        get_repeat_renderer(_repeat_edit_renderers, _repeat_edit_templates, renderid)
+    renderids = (
+        set(_field_view_files) | set(_field_edit_files) | set(_field_get_renderer_functions)
+        )
+    for renderid in renderids:
+        renderer = get_field_renderer(renderid)
+        renderer.label_view()
+        renderer.label_edit()
+        renderer.col_head()
+        renderer.col_edit()
+        renderer.view()
+    log.debug("warm_up_renderers: %d field renderers"%(len(renderids),))
+    return
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
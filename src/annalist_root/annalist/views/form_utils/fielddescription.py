@@ -7,6 +7,7 @@ __copyright__   = "Copyright 2014, G. Klyne"
 __license__     = "MIT (http://opensource.org/licenses/MIT)"
 
 import collections
+import copy
 
 import logging
 log = logging.getLogger(__name__)
@@ -17,7 +18,7 @@ from annalist.exceptions                import EntityNotFound_Error
 from annalist.models.recordgroup        import RecordGroup
 from annalist.models.recordfield        import RecordField
 from annalist.models.entitytypeinfo     import EntityTypeInfo
-from annalist.models.entityfinder       import EntityFinder
+from annalist.models.entityfinder       import EntityFinder, EntitySelector
 
 from annalist.views.fields.render_utils import (
     get_view_renderer,
@@ -31,6 +32,13 @@ from annalist.views.fields.render_placement import (
     get_placement_classes
     )
 
+from annalist.views.form_utils.fieldplancache import (
+    field_plan_cache, 
+    field_choice_cache, 
+    entity_file_dependencies,
+    entity_dir_dependencies
+    )
+
 class FieldDescription(object):
     """
     Describes an entity view field, and methods to perform 
@@ -99,31 +107,9 @@ class FieldDescription(object):
             })
         self._field_suffix_index = 0    # No dup
         self._field_suffix       = ""
+        self._field_deps         = []   # Definition files used (see field_description_from_view_field)
         # If field references type, pull in copy of type id and link values
-        type_ref = self._field_desc['field_options_typeref']
-        if type_ref:
-            restrict_values = self._field_desc['field_restrict_values']
-            entity_finder   = EntityFinder(collection, selector=restrict_values)
-            entities        = entity_finder.get_entities_sorted(
-                type_id=type_ref, context=view_context, scope="all"
-                )
-            # Note: the options list may be used more than once, so the id generator
-            # returned must be materialized as a list
-            # Uses collections.OrderedfDict to preserve entity ordering
-            # 'Enum_optional' adds a blank entry at the start of the list
-            self._field_desc['field_choice_labels'] = collections.OrderedDict()
-            self._field_desc['field_choice_links']  = collections.OrderedDict()
-            if field_render_type == "Enum_optional":
-                self._field_desc['field_choice_labels'][''] = ""
-                self._field_desc['field_choice_links']['']  = None
-            for e in entities:
-                eid = e.get_id()
-                if eid != "_initial_values":
-                    self._field_desc['field_choice_labels'][eid] = eid   # @@TODO: be smarter about label?
-                    self._field_desc['field_choice_links'][eid]  = e.get_view_url_path()
-            # log.info("typeref %s: %r"%
-            #     (self._field_desc['field_options_typeref'], list(self._field_desc['field_choices']))
-            #     )
+        self._set_field_choices(collection, view_context)
         # If field references group, pull in field details
         if group_view:
             group_label = (field_label or 
@@ -146,6 +132,53 @@ class FieldDescription(object):
         # log.info("FieldDescription.field_placement %r"%(self._field_desc['field_placement'],))
         return
 
+    def _set_field_choices(self, collection, view_context):
+        """
+        If the field references a type of entity, assemble lists of enumerated
+        value choices and links for the field.
+        """
+        type_ref = self._field_desc['field_options_typeref']
+        if type_ref:
+            field_render_type = self._field_desc['field_render_type']
+            restrict_values   = self._field_desc['field_restrict_values']
+            choices           = field_entity_choices(
+                collection, type_ref, restrict_values, view_context
+                )
+            # Uses collections.OrderedfDict to preserve entity ordering
+            # 'Enum_optional' adds a blank entry at the start of the list
+            self._field_desc['field_choice_labels'] = collections.OrderedDict()
+            self._field_desc['field_choice_links']  = collections.OrderedDict()
+            if field_render_type == "Enum_optional":
+                self._field_desc['field_choice_labels'][''] = ""
+                self._field_desc['field_choice_links']['']  = None
+            for (eid, link) in choices:
+                self._field_desc['field_choice_labels'][eid] = eid   # @@TODO: be smarter about label?
+                self._field_desc['field_choice_links'][eid]  = link
+            # log.info("typeref %s: %r"%
+            #     (self._field_desc['field_options_typeref'], list(self._field_desc['field_choices']))
+            #     )
+        return
+
+    def copy(self, collection=None, view_context=None):
+        """
+        Returns a copy of the current field description, which can be updated 
+        without affecting the original.  
+
+        If a collection is supplied, any enumerated value choices (including those 
+        of fields in a referenced field group) are re-evaluated using the supplied 
+        collection and view context.  Otherwise, the choices are shared with the
+        original field description.
+        """
+        field_desc = copy.copy(self)
+        field_desc._field_desc = self._field_desc.copy()
+        if collection:
+            field_desc._set_field_choices(collection, view_context)
+        if self._field_desc['group_field_descs'] is not None:
+            field_desc._field_desc['group_field_descs'] = (
+                [ f.copy(collection, view_context) for f in self._field_desc['group_field_descs'] ]
+                )
+        return field_desc
+
     def resolve_duplicates(self, properties):
         """
         Resolve duplicate property URIs that appear in a common context corresponding to
@@ -308,6 +341,59 @@ class FieldDescription(object):
             yield k
         return
 
+def field_entity_choices(collection, type_ref, restrict_values, view_context):
+    """
+    Returns a list of (entity_id, view_url_path) pairs for entities of the 
+    indicated type that may be chosen as values of an enumerated value field.
+
+    collection      is a collection from which data is being rendered.
+    type_ref        is the type id of the entities that may be chosen.
+    restrict_values is a selector (see `EntitySelector`) that restricts the 
+                    entities that may be chosen.
+    view_context    is a dictionary of context values that may be referenced by
+                    the selector.
+
+    Choice lists are cached for each collection, type, selector and values of
+    any context fields referenced by the selector, and are re-evaluated when
+    an entity of the referenced type is created, updated, renamed or removed.
+    """
+    context_values = []
+    for (name, field_id) in EntitySelector.selector_context_fields(restrict_values):
+        value = None
+        if view_context and view_context.get(name, None):
+            value = view_context[name].get(field_id, None)
+        context_values.append((name, field_id, frozen_value(value)))
+    choice_key = (type_ref, restrict_values, tuple(context_values))
+    choices    = field_choice_cache.get(collection, choice_key)
+    if choices is None:
+        typeinfo      = EntityTypeInfo(collection.get_site(), collection, type_ref)
+        choice_deps   = entity_dir_dependencies(typeinfo)
+        entity_finder = EntityFinder(collection, selector=restrict_values)
+        entities      = entity_finder.get_entities_sorted(
+            type_id=type_ref, context=view_context, scope="all"
+            )
+        # Note: the options list may be used more than once, so the id generator
+        # returned must be materialized as a list
+        choices = (
+            [ (e.get_id(), e.get_view_url_path()) for e in entities
+                if e.get_id() != "_initial_values"
+            ])
+        field_choice_cache.put(collection, choice_key, choices, choice_deps)
+    return choices
+
+def frozen_value(value):
+    """
+    Returns a hashable equivalent of a JSON-style value, used in cache keys.
+
+    >>> frozen_value({'a': [1, 2], 'b': "s"})
+    (('a', (1, 2)), ('b', 's'))
+    """
+    if isinstance(value, dict):
+        return tuple( (k, frozen_value(value[k])) for k in sorted(value) )
+    if isinstance(value, list):
+        return tuple( frozen_value(v) for v in value )
+    return value
+
 def field_description_from_view_field(collection, field, view_context=None):
     """
     Returns a field description value created using information from
@@ -323,14 +409,33 @@ def field_description_from_view_field(collection, field, view_context=None):
                     values to be used when rendering the field.  In particular, a copy 
                     of the view description record provides context for some enumeration 
                     type selections.
+
+    Field descriptions are saved in a cache for each collection, and re-used while
+    the definitions from which they are constructed are unchanged.  Enumerated value 
+    choices are evaluated afresh for each call.
     """
     #@@TODO: for resilience, revert this when all tests pass?
     # field_id    = field.get(ANNAL.CURIE.field_id, "Field_id_missing")  # Field ID slug in URI
     #@@
     field_id    = field[ANNAL.CURIE.field_id]
+    plan_key    = (
+        field_id, 
+        field.get(ANNAL.CURIE.property_uri, None), 
+        field.get(ANNAL.CURIE.field_placement, None)
+        )
+    field_desc  = field_plan_cache.get(collection, plan_key)
+    if field_desc:
+        return field_desc.copy(collection, view_context)
+    # Note definition files used, including alternative locations, before reading them
+    field_deps  = entity_file_dependencies(
+        RecordField(collection, field_id, collection._parentsite)
+        )
     recordfield = RecordField.load(collection, field_id, collection._parentsite)
     if recordfield is None:
         log.warning("Can't retrieve definition for field %s"%(field_id))
+        field_deps += entity_file_dependencies(
+            RecordField(collection, "Field_missing", collection._parentsite)
+            )
         recordfield = RecordField.load(collection, "Field_missing", collection._parentsite)
     field_property  = (
         field.get(ANNAL.CURIE.property_uri, None) or 
@@ -343,16 +448,24 @@ def field_description_from_view_field(collection, field, view_context=None):
     # If field references group, pull in field details
     group_ref = recordfield.get(ANNAL.CURIE.group_ref, None)
     if group_ref:
+        field_deps += entity_file_dependencies(
+            RecordGroup(collection, group_ref, collection._parentsite)
+            )
         group_view = RecordGroup.load(collection, group_ref, collection._parentsite)
         if not group_view:
             raise EntityNotFound_Error("Group %s used in field %s"%(group_ref, field_id))
     else:
         group_view = None
-    return FieldDescription(
+    field_desc = FieldDescription(
         collection, recordfield, view_context=view_context, 
         field_property=field.get(ANNAL.CURIE.property_uri, None),
         field_placement=field.get(ANNAL.CURIE.field_placement, None), 
         group_view=group_view
         )
+    for f in field_desc.group_field_descs() or []:
+        field_deps += f._field_deps
+    field_desc._field_deps = field_deps
+    field_plan_cache.put(collection, plan_key, field_desc, field_deps)
+    return field_desc.copy()
 
 # End.
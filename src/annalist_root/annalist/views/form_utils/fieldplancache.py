@@ -0,0 +1,214 @@
+"""
+Cache of compiled field descriptions used to render entity views and lists.
+
+Constructing a field description for a view or list field involves reading
+the field definition, any field group definition it references, and the
+definitions of fields in that group.  This module provides a cache of the
+resulting field descriptions (including renderers and value mappers) for
+each collection, so that rendering a form does not need to re-read and
+re-process the view definition metadata each time.
+
+Each cached description is saved with a list of the definition files used
+to construct it, including the alternative locations at which a definition
+might be found, and is discarded if any of these files are created, updated
+or removed.
+
+Descriptions are cached for each field reference (field id, property URI and
+placement) rather than for each view or list.  The view or list definition is
+read anyway for each request, as it is needed to select the view and for the
+entity values it supplies to enumerated value choices, so a view or list plan
+is assembled from the saved descriptions of its fields.  Field references
+are commonly shared between views and lists, and a change to one field or
+group definition discards only the descriptions that use it.
+
+A second cache holds lists of enumerated value choices for fields that refer 
+to entities of some type.  Each choice list is saved with the state of the 
+directories containing entities of the referenced type, including the collection
+generation counter for each directory, and is discarded when an entity of that 
+type is created, updated, renamed or removed (by any Annalist process).
+
+A third cache holds type information objects for each collection, which are 
+discarded when the collection metadata or type definition is changed.
+"""
+
+__author__      = "Graham Klyne (GK@ACM.ORG)"
+__copyright__   = "Copyright 2014, G. Klyne"
+__license__     = "MIT (http://opensource.org/licenses/MIT)"
+
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+from django.conf                    import settings
+
+from annalist.models.entitycache    import file_status, entity_dir_changes
+from annalist.models.recordtype     import RecordType
+
+#   -------------------------------------------------------------------------------------------
+#
+#   Helper functions
+#
+#   -------------------------------------------------------------------------------------------
+
+def entity_file_dependencies(entity):
+    """
+    Returns a list of (path, status) pairs for the files at which the body of
+    the supplied entity may be stored, including the alternative (site-wide)
+    location, if any.  This should be called before the entity is read.
+
+    The entity does not need to exist.  A dictionary value (e.g. a locally
+    constructed field description) has no file dependencies.
+    """
+    if not hasattr(entity, "_dir_path"):
+        return []
+    return (
+        [ (p, file_status(p)) 
+          for (d, p) in (entity._dir_path(), entity._alt_dir_path()) if p 
+        ])
+
+def entity_dir_state(dirpath, coll=None):
+    """
+    Returns a value that changes whenever an entity in the indicated directory
+    is created, renamed or removed, or is updated by the current process or, 
+    if a collection is supplied, by any Annalist process.
+
+    dirpath     is a directory containing entities.
+    coll        is the collection containing the directory, whose generation 
+                counter for the directory (see `Collection.get_generation`) is 
+                included in the returned value, or None.
+    """
+    generation = coll.get_generation(dirpath) if coll else None
+    return (file_status(dirpath), entity_dir_changes.change_count(dirpath), generation)
+
+def entity_dir_dependencies(typeinfo):
+    """
+    Returns a list of (path, state) pairs for the directories containing entities
+    of the type described by the supplied EntityTypeInfo object, including any 
+    alternative (site-wide) directory.  This should be called before the 
+    entities are read.
+    """
+    return (
+        [ (d, entity_dir_state(d, typeinfo.entitycoll)) 
+          for d in typeinfo.entityparent._child_dirs(typeinfo.entityclass, typeinfo.entityaltparent) 
+          if d
+        ])
+
+def entity_type_dependencies(site, coll, type_id):
+    """
+    Returns a list of (path, status) pairs for the files from which type 
+    information for the indicated type in the indicated collection is obtained,
+    which are the collection metadata and the type definition, including its
+    alternative (site-wide) location.  This should be called before the type
+    definition is read.
+    """
+    return (
+        entity_file_dependencies(coll) + 
+        entity_file_dependencies(RecordType(coll, type_id, altparent=site))
+        )
+
+#   -------------------------------------------------------------------------------------------
+#
+#   FieldPlanCache
+#
+#   -------------------------------------------------------------------------------------------
+
+class FieldPlanCache(object):
+    """
+    Cache of compiled field descriptions, keyed by collection and field reference,
+    or of other values derived from collection data.
+    """
+
+    def __init__(self, size, state=None):
+        """
+        Initialize a new cache.
+
+        size        is the maximum number of descriptions held for each collection.
+                    Zero disables caching.
+        state       is a function that returns the current state of a dependency
+                    path, called with the path and the collection for which the 
+                    value is cached, used to detect changes to the values from 
+                    which a cached value is derived.  The default uses the file 
+                    status.
+        """
+        self._size   = size
+        self._state  = state or (lambda path, coll: file_status(path))
+        self._lock   = threading.Lock()
+        self._plans  = {}
+        return
+
+    def get(self, collection, key):
+        """
+        Returns a field description saved for the indicated collection and key, or
+        None if there is no saved description, or if any of the files from which
+        it was constructed have since changed.
+
+        The value returned is shared, and must be copied before it is updated.
+        """
+        if not self._size:
+            return None
+        with self._lock:
+            entry = self._plans.get(collection._entitydir, {}).get(key, None)
+        if entry is None:
+            return None
+        (dependencies, plan) = entry
+        for (path, status) in dependencies:
+            if self._state(path, collection) != status:
+                log.debug("FieldPlanCache.get: %s changed"%(path,))
+                self.invalidate(collection, key)
+                return None
+        return plan
+
+    def put(self, collection, key, plan, dependencies):
+        """
+        Save a field description for the indicated collection and key.
+
+        collection  is the collection for which the description is saved.
+        key         is a key for the field reference described.
+        plan        is the field description to be saved.
+        dependencies is a list of (path, status) values for the definition files 
+                    from which the description is constructed, with file status 
+                    values obtained before the files were read.
+        """
+        if not self._size:
+            return
+        with self._lock:
+            plans = self._plans.setdefault(collection._entitydir, {})
+            if len(plans) >= self._size:
+                plans.clear()
+            plans[key] = (dependencies, plan)
+        return
+
+    def invalidate(self, collection, key=None):
+        """
+        Discard the indicated saved field description, or all saved descriptions
+        for the indicated collection.
+        """
+        with self._lock:
+            plans = self._plans.get(collection._entitydir, {})
+            if key is None:
+                plans.clear()
+            else:
+                plans.pop(key, None)
+        return
+
+    def clear(self):
+        """
+        Discard all saved field descriptions.
+        """
+        with self._lock:
+            self._plans.clear()
+        return
+
+#   Cache used for all field descriptions constructed by this process
+field_plan_cache = FieldPlanCache(getattr(settings, "FIELD_PLAN_CACHE_SIZE", 1000))
+
+#   Cache used for all enumerated value choice lists assembled by this process
+field_choice_cache = FieldPlanCache(
+    getattr(settings, "FIELD_CHOICE_CACHE_SIZE", 1000), state=entity_dir_state
+    )
+
+#   Cache used for all type information objects constructed by this process
+type_info_cache = FieldPlanCache(getattr(settings, "TYPE_INFO_CACHE_SIZE", 1000))
+
+# End.
@@ -19,8 +19,13 @@ import logging
 log = logging.getLogger(__name__)
 
 from django.http                    import HttpResponse
+from django.http                    import StreamingHttpResponse
 from django.http                    import HttpResponseRedirect
+from django.http                    import HttpResponseNotModified
+from django.utils.http              import parse_etags
 from django.template                import RequestContext, loader
+from django.core.cache              import caches
+from django.utils.safestring        import mark_safe
 from django.views                   import generic
 from django.views.decorators.csrf   import csrf_exempt
 from django.core.urlresolvers       import resolve, reverse
@@ -38,6 +43,7 @@ from annalist                       import util
 from annalist.identifiers           import RDF, RDFS, ANNAL
 from annalist.models.site           import Site
 from annalist.models.annalistuser   import AnnalistUser
+from annalist.models.annalistuser   import user_permissions_cache, user_file_dependencies
 
 from annalist.views.uri_builder     import uri_with_params, continuation_params
 
@@ -49,6 +55,18 @@ from annalist.views.uri_builder     import uri_with_params, continuation_params
 
 LOGIN_URIS = None   # Populated by first call of `authenticate`
 
+GENERATION_HEADER = "Annalist-Generation"
+
+def get_render_cache():
+    """
+    Returns the Django cache used to save rendered page content (see 
+    `settings.RENDER_CACHE`), or None if rendered content is not cached.
+    """
+    cache_name = getattr(settings, "RENDER_CACHE", None)
+    if not cache_name:
+        return None
+    return caches[cache_name]
+
 #   -------------------------------------------------------------------------------------------
 #
 #   Generic Annalist view (contains logic applicable to all pages)
@@ -264,7 +282,8 @@ class AnnalistGenericView(ContentNegotiationView):
         This function returns default permissions if the user details supplied cannot be matched.
 
         Permissions are cached in the view object so that tghe prmissions ecord is read at 
-        most once for any HTTP request. 
+        most once for any HTTP request, and in a process-wide cache that is used until a
+        user record is changed.  The permissions in a returned record are a frozenset.
 
         collection      the collection for which permissions are required.
         user_id         local identifier for the type to retrieve.
@@ -280,11 +299,22 @@ class AnnalistGenericView(ContentNegotiationView):
             #     log.info("user_id %s (%s), coll_id %s, %r"%
             #         (user_id, user_uri, collection.get_id(), collection.get_user_permissions(user_id, user_uri))
             #         )
-            user_perms = (
-                (collection and collection.get_user_permissions(user_id, user_uri)) or
-                self.site().get_user_permissions(user_id, user_uri) or
-                self.site().get_user_permissions("_default_user_perms", "annal:User/_default_user_perms")
-                )
+            perms_key  = (collection and collection._entitydir, user_id, user_uri)
+            user_perms = user_permissions_cache.get(perms_key)
+            if user_perms is None:
+                perms_deps = user_file_dependencies(
+                    self.site(), collection, [user_id, "_default_user_perms"]
+                    )
+                user_perms = (
+                    (collection and collection.get_user_permissions(user_id, user_uri)) or
+                    self.site().get_user_permissions(user_id, user_uri) or
+                    self.site().get_user_permissions("_default_user_perms", "annal:User/_default_user_perms")
+                    )
+                if user_perms:
+                    user_perms[ANNAL.CURIE.user_permissions] = frozenset(
+                        user_perms[ANNAL.CURIE.user_permissions]
+                        )
+                    user_permissions_cache.put(perms_key, user_perms, perms_deps)
             self._user_perms = user_perms
             log.debug("get_user_permissions %r"%(self._user_perms,))
         return self._user_perms
@@ -366,6 +396,36 @@ class AnnalistGenericView(ContentNegotiationView):
         # return self.authorize(auth_scope, auth_resource)
         return self.authorize(auth_scope, auth_collection)
 
+    def not_modified(self, etag):
+        """
+        Returns a 304 Not Modified response if the current request is conditional on
+        an entity tag (If-None-Match) that matches the supplied entity tag, otherwise 
+        None.  This is used to avoid rendering a page that is cached by the client.
+
+        etag        is an entity tag value for the requested resource in its current
+                    state, or None.
+        """
+        if etag:
+            if_none_match = self.request.META.get("HTTP_IF_NONE_MATCH", None)
+            if if_none_match:
+                etags = parse_etags(if_none_match)
+                if etag[1:-1] in etags or "*" in etags:
+                    return HttpResponseNotModified()
+        return None
+
+    def set_etag(self, response, etag, generation=None):
+        """
+        Add supplied entity tag and collection generation (see 
+        `Collection.get_generation`) to a successful response, and return the 
+        response.  The generation is returned in an `Annalist-Generation` header.
+        """
+        if response and response.status_code in (200, 304):
+            if etag:
+                response["ETag"] = etag
+            if generation is not None:
+                response[GENERATION_HEADER] = str(generation)
+        return response
+
     @ContentNegotiationView.accept_types(["text/html", "application/html", "*/*"])
     def render_html(self, resultdata, template_name):
         """
@@ -400,6 +460,65 @@ class AnnalistGenericView(ContentNegotiationView):
         # log.debug("render_html - data: %r"%(resultdata))
         return HttpResponse(template.render(context))
 
+    def get_rendered_fragment(self, cache_key):
+        """
+        Returns page content saved by `render_fragment` with the supplied key, or 
+        None if there is no such content.
+
+        cache_key   is a key that identifies the rendered content and everything on 
+                    which it depends (e.g. from `DisplayInfo.get_render_key`), or 
+                    None if the content cannot be saved.
+        """
+        cache = get_render_cache()
+        if (cache is None) or (cache_key is None):
+            return None
+        fragment = cache.get(cache_key)
+        if fragment is None:
+            return None
+        log.debug("get_rendered_fragment: %s"%(cache_key,))
+        return mark_safe(fragment)
+
+    def render_fragment(self, cache_key, resultdata, template_name):
+        """
+        Renders part of a page using the supplied data and template name, and saves
+        the result with the supplied cache key (see `get_rendered_fragment`).  The
+        rendered content is returned as a safe string that can be included in a 
+        page template.
+        """
+        template = loader.get_template(template_name)
+        fragment = template.render(RequestContext(self.request, resultdata))
+        cache    = get_render_cache()
+        if (cache is not None) and (cache_key is not None):
+            cache.set(cache_key, fragment)
+        return mark_safe(fragment)
+
+    def render_html_stream(self, resultdata, template_name, stream_field):
+        """
+        Construct a streamed HTML response based on supplied data and template name,
+        in which the content of an indicated repeat group field is rendered and sent
+        as it is generated, so the complete page is never held in memory.
+
+        The template is rendered with the context variable `<stream_field>_stream` 
+        set to a marker value, which the template is expected to output in place of 
+        the indicated field.  The template content before and after the marker is 
+        sent before and after the streamed field content, which is generated using
+        the repeat group renderer's `render_parts` method.
+        """
+        marker = "<!-- @@stream:%s@@ -->"%(stream_field,)
+        resultdata[stream_field+"_stream"] = marker
+        response  = self.render_html(resultdata, template_name)
+        page_head, page_tail = response.content.split(marker, 1)
+        field     = resultdata[stream_field]
+        context   = RequestContext(self.request, resultdata)
+        def stream_content():
+            yield page_head
+            with context.push(field=field):
+                for part in field.field_render_view.render_parts(context):
+                    yield part
+            yield page_tail
+            return
+        return StreamingHttpResponse(stream_content())
+
     # Default view methods return 405 Forbidden
 
     def get(self, request):
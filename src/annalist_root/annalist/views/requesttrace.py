@@ -0,0 +1,246 @@
+"""
+Sampled tracing of request handling.
+
+Request handlers call `start_trace` when a request is received, `trace_phase`
+as each phase of handling the request (e.g. setup, load, map, render) is
+completed, and `end_trace` with the response.  For a sample of requests
+(see `settings.REQUEST_TRACE_SAMPLE`), a single summary record is then logged,
+at INFO level, giving the time taken by each phase.  A request handler method
+is normally decorated with `request_trace`, which starts the trace and ends it 
+when the handler returns or raises an exception, or, for a streaming response,
+when all of the response content has been generated.
+
+If this module's logger is enabled for DEBUG level, descriptions of the steps
+taken in handling the request, supplied by calls to `trace_detail` (e.g. from
+field renderers), are also logged with the summary.
+
+For requests that are not sampled, each of these calls returns after checking
+for a trace of the current request.
+
+>>> trace = RequestTrace("test", {'coll_id': "coll"}, True)
+>>> trace.phase("setup")
+>>> trace.detail("detail")
+>>> print re.sub(r"[0-9.]+ms", "#ms", trace.summary(200))
+test coll_id=coll status=200 total=#ms setup=#ms
+>>> @request_trace("test", "coll_id")
+... def handler(coll_id=None):
+...     raise ValueError("handler error")
+>>> try:
+...     handler(coll_id="coll")
+... except ValueError:
+...     pass
+>>> print getattr(_current, "trace", None)
+None
+>>> @request_trace("test")
+... def stream_handler():
+...     def content():
+...         yield "traced" if getattr(_current, "trace", None) else "not traced"
+...     return StreamingHttpResponse(content())
+>>> response = stream_handler()
+>>> print getattr(_current, "trace", None)
+None
+>>> list(response.streaming_content)
+['traced']
+"""
+
+__author__      = "Graham Klyne (GK@ACM.ORG)"
+__copyright__   = "Copyright 2014, G. Klyne"
+__license__     = "MIT (http://opensource.org/licenses/MIT)"
+
+import re
+import time
+import random
+import inspect
+import functools
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+from django.conf                    import settings
+from django.http                    import StreamingHttpResponse
+
+#   -------------------------------------------------------------------------------------------
+#
+#   RequestTrace
+#
+#   -------------------------------------------------------------------------------------------
+
+class RequestTrace(object):
+    """
+    Records the time taken by each phase of handling a request, and descriptions
+    of the steps taken.
+    """
+
+    def __init__(self, name, values, detail):
+        """
+        Initialize a new request trace.
+
+        name        is a name for the request handler.
+        values      is a dictionary of values that identify the request (e.g.
+                    collection, type and entity ids), reported in the summary.
+        detail      is True if descriptions of the steps taken are to be saved.
+        """
+        self._name    = name
+        self._values  = values
+        self._details = [] if detail else None
+        self._phases  = []
+        self._start   = time.time()
+        self._mark    = self._start
+        return
+
+    def phase(self, name):
+        """
+        Record the time taken by the named phase, which is the time since the
+        trace was started or the previous phase was completed.
+        """
+        now = time.time()
+        self._phases.append((name, now - self._mark))
+        self._mark = now
+        return
+
+    def detail(self, msg):
+        """
+        Save a description of a step taken, if details are being saved.
+        """
+        if self._details is not None:
+            self._details.append(msg)
+        return
+
+    def details(self):
+        """
+        Returns a list of saved descriptions of steps taken.
+        """
+        return self._details or []
+
+    def summary(self, status):
+        """
+        Returns a single-line summary of the request trace, consisting of
+        space-separated "name=value" items.
+
+        status      is the HTTP status code of the response, or None.
+        """
+        total = time.time() - self._start
+        items = (
+            [ self._name ] +
+            [ "%s=%s"%(k, self._values[k]) for k in sorted(self._values) ] +
+            [ "status=%s"%(status,), "total=%.1fms"%(total*1000.0) ] +
+            [ "%s=%.1fms"%(p, t*1000.0) for (p, t) in self._phases ]
+            )
+        return " ".join(items)
+
+#   -------------------------------------------------------------------------------------------
+#
+#   Trace of the request handled by the current thread
+#
+#   -------------------------------------------------------------------------------------------
+
+_current = threading.local()
+
+def start_trace(name, **values):
+    """
+    Start a trace of the request being handled by the current thread, if the
+    request is selected for tracing.
+
+    name        is a name for the request handler.
+    values      are keyword values that identify the request.
+    """
+    sample = getattr(settings, "REQUEST_TRACE_SAMPLE", 0)
+    if sample and ((sample >= 1) or (random.random() < sample)):
+        _current.trace = RequestTrace(name, values, log.isEnabledFor(logging.DEBUG))
+    else:
+        _current.trace = None
+    return
+
+def trace_phase(name):
+    """
+    Record completion of the named phase of handling the current request.
+    """
+    trace = getattr(_current, "trace", None)
+    if trace:
+        trace.phase(name)
+    return
+
+def trace_detail(msg, *args):
+    """
+    Save a description of a step taken in handling the current request, if
+    details are being saved.  The description is formatted as `msg%args` only
+    when it is saved.
+    """
+    trace = getattr(_current, "trace", None)
+    if trace and (trace._details is not None):
+        trace.detail(msg%args if args else msg)
+    return
+
+def end_trace(response):
+    """
+    Log a summary of the trace of the current request, if any, and return the
+    supplied response.
+    """
+    trace = getattr(_current, "trace", None)
+    if trace:
+        _current.trace = None
+        _log_trace(trace, getattr(response, "status_code", None))
+    return response
+
+def request_trace(name, *value_names):
+    """
+    Returns a decorator for a request handler method, which traces each request
+    handled (see `start_trace`).  The trace is ended when the handler returns 
+    or raises an exception (in which case it is logged with no response status),
+    or, for a streaming response, when all of the response content has been
+    generated.
+
+    name        is a name for the request handler.
+    value_names are the names of handler arguments whose values identify the 
+                request, and are reported in the trace summary.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def traced_handler(*args, **kwargs):
+            callargs = inspect.getcallargs(handler, *args, **kwargs)
+            start_trace(name, **dict( (n, callargs.get(n, None)) for n in value_names ))
+            try:
+                response = handler(*args, **kwargs)
+            except:
+                end_trace(None)
+                raise
+            trace = getattr(_current, "trace", None)
+            if trace and getattr(response, "streaming", False):
+                _current.trace = None
+                response.streaming_content = _traced_content(
+                    trace, response.streaming_content, response.status_code
+                    )
+                return response
+            return end_trace(response)
+        return traced_handler
+    return decorator
+
+def _traced_content(trace, content, status):
+    """
+    Generates streamed response content, with the supplied trace as the trace
+    of the current request while each part is generated, then logs the trace.
+    """
+    content = iter(content)
+    try:
+        while True:
+            _current.trace = trace
+            try:
+                part = next(content)
+            except StopIteration:
+                break
+            finally:
+                _current.trace = None
+            yield part
+        trace.phase("stream")
+    finally:
+        _log_trace(trace, status)
+    return
+
+def _log_trace(trace, status):
+    log.info("request_trace %s"%(trace.summary(status),))
+    for d in trace.details():
+        log.debug("request_trace   %s"%(d,))
+    return
+
+# End.
@@ -41,6 +41,82 @@ TEMPLATE_DEBUG = False
 # test, when trying to understand how values end up in a form.
 TRACE_FIELD_VALUE   = logging.DEBUG
 
+# List search strings are matched as exact substrings of entity values.  Set 
+# False to instead match each search word, without regard to case, against the 
+# start of words in entity values, which allows searches to use the collection 
+# entity index rather than examining every entity of the listed type(s).
+SEARCH_SUBSTRING    = True
+
+# Default number of entities displayed on each page of an entity list, or None
+# to display all entities.  Can be overridden by the "limit" URI parameter.
+LIST_PAGE_SIZE      = None
+
+# Set True to stream rows of an entity list to the client as they are rendered,
+# rather than assembling the complete page in memory before sending it.
+LIST_STREAM_ROWS    = False
+
+# Maximum number of entity files whose parsed values are cached in memory by
+# each server process.  Set to 0 to disable caching.
+ENTITY_CACHE_SIZE   = 1000
+
+# Maximum number of entity directory listings cached in memory by each server
+# process.  Set to 0 to disable caching.
+ENTITY_DIR_CACHE_SIZE = 1000
+
+# Maximum number of compiled view and list field descriptions cached in memory
+# for each collection by each server process.  Set to 0 to disable caching.
+FIELD_PLAN_CACHE_SIZE = 1000
+
+# Maximum number of enumerated value choice lists cached in memory for each
+# collection by each server process.  Set to 0 to disable caching.
+FIELD_CHOICE_CACHE_SIZE = 1000
+
+# Maximum number of type information objects cached in memory for each 
+# collection by each server process.  Set to 0 to disable caching.
+TYPE_INFO_CACHE_SIZE = 1000
+
+# Maximum number of user permissions records cached in memory by each server 
+# process.  Set to 0 to disable caching.
+USER_PERMISSIONS_CACHE_SIZE = 1000
+
+# Number of threads used by each server process to read entity files concurrently
+# when many entities are listed.  Set to 1 to read entity files sequentially.
+ENTITY_LOAD_THREADS = 8
+
+# Durability of entity updates.  An entity file is always written in full to a
+# temporary file that then replaces the original, so an incomplete file is never
+# seen.  "none" leaves the new file to be written to disk by the operating system
+# in due course, "file" (fsync) writes the new file to disk before it replaces the
+# original, and "dir" also writes the directory, so the update is not lost if 
+# the system crashes.  Each step adds latency to entity updates.
+ENTITY_WRITE_DURABILITY = "file"
+
+# Fraction of entity list and view requests for which a summary of the time taken
+# by each phase of handling the request is logged (at INFO level, by logger 
+# "annalist.views.requesttrace").  If that logger is enabled for DEBUG level, 
+# details of the steps taken are also logged.  Set to 0 to disable tracing, or 1 
+# to trace every request.
+REQUEST_TRACE_SAMPLE = 0.01
+
+# Name of the cache (see CACHES) used to save the rendered fields of entity views, 
+# which are re-used while the entity, the view and field definitions, and the
+# collection are unchanged, for users with the same permissions.  Set to None to
+# disable caching.  A file-based cache may be used to share rendered fields 
+# between server processes.
+RENDER_CACHE        = "annalist_render"
+
+CACHES = (
+    { 'default':
+        { 'BACKEND':    'django.core.cache.backends.locmem.LocMemCache'
+        }
+    , 'annalist_render':
+        { 'BACKEND':    'django.core.cache.backends.locmem.LocMemCache'
+        , 'LOCATION':   'annalist_render'
+        , 'TIMEOUT':    3600
+        , 'OPTIONS':    { 'MAX_ENTRIES': 1000 }
+        }
+    })
+
 ALLOWED_HOSTS = []
 
 # Application definition
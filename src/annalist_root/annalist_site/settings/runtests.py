@@ -13,6 +13,9 @@ log = logging.getLogger(__name__)
 
 ANNALIST_VERSION_MSG = "Annalist version %s (test configuration)"%(ANNALIST_VERSION)
 
+# Trace every request, so that tracing is exercised by the tests
+REQUEST_TRACE_SAMPLE = 1
+
 # Override authentication backend to use local database only
 AUTHENTICATION_BACKENDS = (
     'django.contrib.auth.backends.ModelBackend',